@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+audio_delivery.py
+HTTP delivery of rendered audio: strong ETags, conditional requests and byte ranges
+Full bodies are the cached bytes object itself (no copy); a range copies only its slice
+"""
+
+import hashlib
+import re
+
+from fastapi import Request, Response
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """The requested byte range lies outside the body."""
+
+
+def audio_etag(data) -> str:
+    """Strong ETag from the audio bytes (blake2b is cheap next to generation)."""
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """If-None-Match / If-Range comparison (weak comparison, as RFC 9110 allows for GET)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single "bytes=" range into an inclusive (start, end).
+    Returns None for no/unsupported ranges (the full body is served instead).
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def cache_control(max_age: float) -> str:
+    """Reproducible audio may be stored; anything else must be revalidated."""
+    if max_age > 0:
+        return f"public, max-age={int(max_age)}"
+    return "no-cache"
+
+
+def audio_response(request: Request, data, media_type: str = "audio/wav", headers: dict | None = None,
+                   max_age: float = 0) -> Response:
+    """Serve audio with ETag, 304 revalidation and single-range (206) support."""
+    etag = audio_etag(data)
+    base = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control(max_age),
+        **(headers or {}),
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=base)
+
+    # Starlette's Response only accepts bytes/str bodies on the supported versions.
+    body = data if isinstance(data, bytes) else bytes(data)
+    size = len(body)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and not etag_matches(if_range, etag):
+        range_header = None  # the client's partial copy is stale: send everything
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**base, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return Response(content=body, media_type=media_type, headers=base)
+
+    start, end = byte_range
+    return Response(
+        content=body[start:end + 1],
+        status_code=206,
+        media_type=media_type,
+        headers={**base, "Content-Range": f"bytes {start}-{end}/{size}"},
+    )
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+audio_format.py
+Output-format stage: sample-rate and channel conversion, then WAV / raw PCM / Opus encoding
+Resampling is polyphase (scipy upfirdn) with the anti-aliasing filter designed
+once per rate pair and cached
+"""
+
+import io
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import firwin, resample_poly
+
+OUTPUT_FORMATS = ("wav", "pcm", "opus")
+FORMAT_EXTENSIONS = {"wav": "wav", "pcm": "pcm", "opus": "ogg"}
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Filter quality: zero crossings per side of the sinc and Kaiser beta (~80 dB stopband).
+ZERO_CROSSINGS = 16
+KAISER_BETA = 8.0
+
+
+class EncodedAudio(bytes):
+    """Encoded audio that also carries its playback length and the silence trimmed from it (seconds)."""
+
+    duration: float | None = None
+    trimmed: float = 0.0
+
+    @classmethod
+    def wrap(cls, data: bytes, duration: float, trimmed: float = 0.0) -> "EncodedAudio":
+        audio = cls(data)
+        audio.duration = duration
+        audio.trimmed = trimmed
+        return audio
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(up: int, down: int) -> np.ndarray:
+    """Low-pass FIR for resampling by up/down (cutoff at the lower Nyquist)."""
+    factor = max(up, down)
+    # resample_poly applies the interpolation gain (x up) itself.
+    return firwin(2 * ZERO_CROSSINGS * factor + 1, 1.0 / factor, window=("kaiser", KAISER_BETA))
+
+
+def resample(audio: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Resample along the first axis (samples); no-op when the rates match."""
+    if src_rate == dst_rate:
+        return audio
+    g = gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    out = resample_poly(audio, up, down, axis=0, window=polyphase_filter(up, down))
+    return out.astype(np.float32, copy=False)
+
+
+def to_channels(audio: np.ndarray, channels: int) -> np.ndarray:
+    """Mono float audio as (samples,) for one channel or (samples, channels) otherwise."""
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if channels == 1:
+        return audio
+    return np.repeat(audio[:, None], channels, axis=1)
+
+
+def media_type(fmt: str, sample_rate: int, channels: int) -> str:
+    if fmt == "pcm":
+        return f"audio/L16; rate={sample_rate}; channels={channels}"
+    if fmt == "opus":
+        return "audio/ogg; codecs=opus"
+    return "audio/wav"
+
+
+def sniff_media_type(data) -> str:
+    """Best-effort media type of encoded audio (for cache lookups by key)."""
+    head = bytes(data[:4])
+    if head == b"RIFF":
+        return "audio/wav"
+    if head == b"OggS":
+        return "audio/ogg; codecs=opus"
+    return "audio/L16"
+
+
+def validate_output(fmt: str, sample_rate: int | None, channels: int) -> str:
+    """Normalize and check an output request; raises ValueError."""
+    fmt = (fmt or "wav").strip().lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format '{fmt}'. Supported: {list(OUTPUT_FORMATS)}")
+    if channels not in (1, 2):
+        raise ValueError("channels must be 1 or 2")
+    if fmt == "opus" and sample_rate is not None and sample_rate not in OPUS_SAMPLE_RATES:
+        raise ValueError(f"Opus supports sample rates {list(OPUS_SAMPLE_RATES)}")
+    return fmt
+
+
+def encode_audio(audio: np.ndarray, sr: int, fmt: str = "wav", sample_rate: int | None = None,
+                 channels: int = 1) -> tuple[bytes, str, int]:
+    """
+    Convert float audio to the requested rate/channels and encode it.
+    Returns (data, media_type, output_sample_rate). Opus defaults to 48 kHz.
+    """
+    fmt = validate_output(fmt, sample_rate, channels)
+    out_rate = sample_rate or (48000 if fmt == "opus" and sr not in OPUS_SAMPLE_RATES else sr)
+    audio = to_channels(np.clip(resample(np.asarray(audio, dtype=np.float32), sr, out_rate), -1.0, 1.0), channels)
+
+    if fmt == "pcm":
+        data = (audio * 32767.0).astype("<i2").tobytes()
+    else:
+        buf = io.BytesIO()
+        if fmt == "opus":
+            sf.write(buf, audio, out_rate, format="OGG", subtype="OPUS")
+        else:
+            sf.write(buf, audio, out_rate, format="WAV", subtype="PCM_16")
+        data = buf.getvalue()
+    return data, media_type(fmt, out_rate, channels), out_rate
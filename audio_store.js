@@ -0,0 +1,165 @@
+// Disk-bounded store for generated audio.
+// Files are named by content hash (repeats reuse one file), written asynchronously,
+// and evicted by age and total size (least recently used first).
+const path = require('path');
+const fsp = require('fs/promises');
+const crypto = require('crypto');
+
+const INDEX_FILE = 'index.json';
+const EXTENSIONS = { 'audio/wav': 'wav', 'audio/ogg': 'ogg', 'audio/L16': 'pcm' };
+const OWN_FILE = /^([0-9a-f]{32}\.(wav|ogg|pcm)|tts_\d+\.wav)$/;
+const TEMP_FILE = /^\.[0-9a-f]{32}\.tmp$/;
+
+function extensionFor(mediaType) {
+  const base = String(mediaType || 'audio/wav').split(';')[0].trim();
+  return EXTENSIONS[base] || 'wav';
+}
+
+class AudioStore {
+  constructor(dir, { maxBytes = 200 * 1024 * 1024, maxAgeMs = 7 * 24 * 3600 * 1000, minAgeMs = 60 * 1000 } = {}) {
+    this.dir = dir;
+    this.maxBytes = maxBytes;
+    this.maxAgeMs = maxAgeMs;
+    // Never evict files this young: an external player may still be reading them.
+    this.minAgeMs = minAgeMs;
+    this.entries = new Map(); // id -> { id, file, size, mediaType, createdAt, lastUsed, text, voice }
+    this.totalBytes = 0;
+    this.indexWrite = null;
+    this.writing = new Map(); // id -> pending put, so concurrent repeats share one write
+  }
+
+  async init() {
+    await fsp.mkdir(this.dir, { recursive: true });
+    let saved = [];
+    try {
+      saved = JSON.parse(await fsp.readFile(path.join(this.dir, INDEX_FILE), 'utf8'));
+    } catch {
+      // No index yet (or unreadable): rebuilt from the files below.
+    }
+    const names = new Set(await fsp.readdir(this.dir));
+    for (const entry of Array.isArray(saved) ? saved : []) {
+      if (entry?.id && names.has(entry.file)) {
+        this.entries.set(entry.id, entry);
+        this.totalBytes += entry.size;
+        names.delete(entry.file);
+      }
+    }
+    // Files we wrote but never indexed (legacy tts_<timestamp>.wav, interrupted runs) join
+    // the index so age/size limits apply to them; anything else in the directory is left alone.
+    for (const name of names) {
+      if (TEMP_FILE.test(name)) {
+        await fsp.rm(path.join(this.dir, name), { force: true });
+      } else if (OWN_FILE.test(name)) {
+        const stat = await fsp.stat(path.join(this.dir, name));
+        const id = name.replace(/\.[^.]+$/, '');
+        const mtime = stat.mtimeMs;
+        this.entries.set(id, { id, file: name, size: stat.size, mediaType: 'audio/wav', createdAt: mtime, lastUsed: mtime, text: '', voice: null });
+        this.totalBytes += stat.size;
+      }
+    }
+    await this.enforce();
+    return this;
+  }
+
+  pathFor(entry) {
+    return path.join(this.dir, entry.file);
+  }
+
+  get(id) {
+    const entry = this.entries.get(String(id));
+    if (entry) {
+      entry.lastUsed = Date.now();
+      this.scheduleIndexWrite();
+    }
+    return entry || null;
+  }
+
+  list() {
+    return [...this.entries.values()].sort((a, b) => b.createdAt - a.createdAt);
+  }
+
+  async put(data, { mediaType, text, voice } = {}) {
+    const buf = Buffer.isBuffer(data) ? data : Buffer.from(data);
+    const id = crypto.createHash('sha256').update(buf).digest('hex').slice(0, 32);
+    const now = Date.now();
+    const existing = this.entries.get(id);
+    if (existing) {
+      existing.lastUsed = now;
+      this.scheduleIndexWrite();
+      return existing;
+    }
+    if (this.writing.has(id)) {
+      return this.writing.get(id);
+    }
+    const pending = this.write(id, buf, { mediaType, text, voice, now });
+    this.writing.set(id, pending);
+    try {
+      return await pending;
+    } finally {
+      this.writing.delete(id);
+    }
+  }
+
+  async write(id, buf, { mediaType, text, voice, now }) {
+    const entry = {
+      id,
+      file: `${id}.${extensionFor(mediaType)}`,
+      size: buf.length,
+      mediaType: mediaType || 'audio/wav',
+      createdAt: now,
+      lastUsed: now,
+      text: String(text || '').slice(0, 200),
+      voice: voice || null
+    };
+    // Write then rename, so a reader never sees a partial file.
+    const tmp = path.join(this.dir, `.${id}.tmp`);
+    await fsp.writeFile(tmp, buf);
+    await fsp.rename(tmp, this.pathFor(entry));
+    this.entries.set(id, entry);
+    this.totalBytes += entry.size;
+    await this.enforce();
+    return entry;
+  }
+
+  async enforce() {
+    const now = Date.now();
+    const evict = [];
+    const byAge = [...this.entries.values()].sort((a, b) => a.lastUsed - b.lastUsed);
+    let total = this.totalBytes;
+    for (const entry of byAge) {
+      if (now - entry.createdAt < this.minAgeMs) continue;
+      if (now - entry.lastUsed > this.maxAgeMs || total > this.maxBytes) {
+        evict.push(entry);
+        total -= entry.size;
+      }
+    }
+    for (const entry of evict) {
+      this.entries.delete(entry.id);
+      this.totalBytes -= entry.size;
+    }
+    await Promise.all(evict.map((entry) => fsp.rm(this.pathFor(entry), { force: true })));
+    this.scheduleIndexWrite();
+    return evict.length;
+  }
+
+  scheduleIndexWrite() {
+    // Coalesce bursts of updates into one write.
+    if (this.indexWrite) return;
+    this.indexWrite = setTimeout(() => {
+      this.indexWrite = null;
+      this.flush().catch((e) => console.warn('[AudioStore] Index write failed:', e?.message || e));
+    }, 500);
+  }
+
+  async flush() {
+    const tmp = path.join(this.dir, `${INDEX_FILE}.tmp`);
+    await fsp.writeFile(tmp, JSON.stringify(this.list()));
+    await fsp.rename(tmp, path.join(this.dir, INDEX_FILE));
+  }
+
+  stats() {
+    return { entries: this.entries.size, bytes: this.totalBytes, maxBytes: this.maxBytes, maxAgeMs: this.maxAgeMs };
+  }
+}
+
+module.exports = { AudioStore, extensionFor };
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the TTS server
+Measures latency and real-time factor over a fixed prompt set, and compares
+outputs against a reference run (e.g. fp32 vs bf16/int8 CPU precision, or
+the PyTorch vs ONNX Runtime backend)
+
+Typical precision comparison:
+    TTS_CPU_PRECISION=fp32 python3 server_chatterbox_turbo_enhanced.py &
+    python3 benchmark_server.py --voice my_voice.wav --out bench/fp32
+    # restart the server with TTS_CPU_PRECISION=int8, then:
+    python3 benchmark_server.py --voice my_voice.wav --out bench/int8 --reference bench/fp32
+
+Backend comparison on CPU (PyTorch vs ONNX Runtime), same seed for both runs:
+    TTS_BACKEND=torch python3 server_chatterbox_turbo_enhanced.py &
+    python3 benchmark_server.py --voice my_voice.wav --seed 7 --out bench/torch
+    # restart with TTS_BACKEND=onnx TTS_ONNX_DIR=onnx/, then:
+    python3 benchmark_server.py --voice my_voice.wav --seed 7 --out bench/onnx --reference bench/torch
+"""
+
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+import soundfile as sf
+
+SERVER_URL = "http://localhost:5002"
+
+# Chat-shaped workload: mostly short lines, a few longer ones.
+DEFAULT_PROMPTS = [
+    ("short", "gg everyone"),
+    ("short2", "brb, grabbing a drink"),
+    ("medium", "Thanks for the raid! Welcome in, everyone, grab a seat and enjoy the stream."),
+    ("long", (
+        "Alright chat, here's the plan for tonight: we finish the last two dungeons, "
+        "then we try the new raid on normal difficulty, and if we survive that, "
+        "we'll do a few ranked matches before calling it a night."
+    )),
+]
+
+
+def long_term_spectrum(audio: np.ndarray, n_fft: int = 1024) -> np.ndarray:
+    """Average log-power spectrum (dB) over all frames."""
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if len(audio) < n_fft:
+        audio = np.pad(audio, (0, n_fft - len(audio)))
+    hop = n_fft // 2
+    frames = np.lib.stride_tricks.sliding_window_view(audio, n_fft)[::hop]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(n_fft), axis=1)) ** 2
+    return 10 * np.log10(spectrum.mean(axis=0) + 1e-10)
+
+
+def compare_audio(candidate: np.ndarray, reference: np.ndarray, sr: int, ref_sr: int) -> dict:
+    """Alignment-free similarity: duration ratio and long-term spectral distance (dB RMS)."""
+    duration_ratio = (len(candidate) / sr) / max(len(reference) / ref_sr, 1e-9)
+    distance = float(np.sqrt(np.mean((long_term_spectrum(candidate) - long_term_spectrum(reference)) ** 2)))
+    return {"duration_ratio": round(duration_ratio, 3), "spectral_distance_db": round(distance, 2)}
+
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_benchmark(args) -> dict:
+    health = requests.get(f"{args.server}/health", timeout=10).json()
+    prompts = DEFAULT_PROMPTS
+    if args.texts:
+        lines = [line.strip() for line in Path(args.texts).read_text().splitlines() if line.strip()]
+        prompts = [(f"line{i:02d}", text) for i, text in enumerate(lines)]
+
+    out_dir = Path(args.out) if args.out else None
+    if out_dir:
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    for label, text in prompts:
+        payload = {"text": text, "voice": args.voice, "language": args.language}
+        if args.seed is not None:
+            payload["seed"] = args.seed
+        latencies, rtfs, comparisons = [], [], []
+        for run in range(args.warmup + args.runs):
+            if args.seed is not None and run >= args.warmup:
+                # Identical seeded requests are cached server-side; vary the seed per run.
+                payload["seed"] = args.seed + run - args.warmup
+            start = time.perf_counter()
+            response = requests.post(f"{args.server}/api/tts", json=payload, timeout=args.timeout)
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                print(f"❌ {label}: HTTP {response.status_code} {response.text[:200]}")
+                break
+            if run < args.warmup:
+                continue
+
+            audio, sr = sf.read(io.BytesIO(response.content), dtype="float32")
+            duration = len(audio) / sr
+            latencies.append(elapsed)
+            rtfs.append(elapsed / max(duration, 1e-9))
+
+            name = f"{label}_{run - args.warmup}.wav"
+            if out_dir:
+                (out_dir / name).write_bytes(response.content)
+            if args.reference:
+                ref_path = Path(args.reference) / name
+                if ref_path.exists():
+                    reference, ref_sr = sf.read(ref_path, dtype="float32")
+                    comparisons.append(compare_audio(audio, reference, sr, ref_sr))
+
+        entry = {
+            "chars": len(text),
+            "runs": len(latencies),
+            "latency_mean_s": round(statistics.fmean(latencies), 3) if latencies else None,
+            "latency_p50_s": round(percentile(latencies, 50), 3),
+            "latency_p95_s": round(percentile(latencies, 95), 3),
+            "rtf_mean": round(statistics.fmean(rtfs), 3) if rtfs else None,
+        }
+        if comparisons:
+            entry["duration_ratio_mean"] = round(statistics.fmean(c["duration_ratio"] for c in comparisons), 3)
+            entry["spectral_distance_db_mean"] = round(
+                statistics.fmean(c["spectral_distance_db"] for c in comparisons), 2
+            )
+        results[label] = entry
+        print(f"✅ {label}: {json.dumps(entry)}")
+
+    return {
+        "server": args.server,
+        "device": health.get("device"),
+        "precision": health.get("precision"),
+        "backend": health.get("backend", "torch"),
+        "seed": args.seed,
+        "model_id": health.get("model_id"),
+        "voice": args.voice,
+        "results": results,
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"## {report['model_id']} on {report['device']} ({report['backend']}, {report['precision']})",
+        "",
+        "| prompt | chars | p50 s | p95 s | RTF | dur. ratio | spec. dist dB |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for label, r in report["results"].items():
+        lines.append(
+            f"| {label} | {r['chars']} | {r['latency_p50_s']} | {r['latency_p95_s']} | {r['rtf_mean']} "
+            f"| {r.get('duration_ratio_mean', '-')} | {r.get('spectral_distance_db_mean', '-')} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the TTS server")
+    parser.add_argument("--server", default=SERVER_URL)
+    parser.add_argument("--voice", required=True, help="Reference voice filename on the server")
+    parser.add_argument("--language", default="Auto")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Fixed seed so runs are comparable sample for sample")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--texts", default=None, help="File with one prompt per line")
+    parser.add_argument("--out", default=None, help="Directory to save generated WAVs")
+    parser.add_argument("--reference", default=None, help="Directory of a previous --out run to compare against")
+    parser.add_argument("--report", default="bench_output.txt", help="Markdown report file (appended)")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_benchmark(args)
+    except requests.RequestException as e:
+        print(f"❌ Error connecting to server: {e}")
+        return 1
+
+    text = format_report(report)
+    print()
+    print(text)
+    if args.report:
+        with open(args.report, "a", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
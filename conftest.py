@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Shared fixtures: the real server app on the fake backend (TTS_BACKEND=fake)
+"""
+
+import importlib
+import threading
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """The server module, imported once with a references directory holding alice.wav."""
+    refs = tmp_path_factory.mktemp("refs")
+    t = np.arange(24000 * 6) / 24000
+    sf.write(refs / "alice.wav", (0.3 * np.sin(2 * np.pi * 180 * t)).astype(np.float32), 24000)
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv("TTS_BACKEND", "fake")
+        env.setenv("TTS_REFERENCES_DIR", str(refs))
+        return importlib.import_module("server_chatterbox_turbo_enhanced")
+
+
+@pytest.fixture
+def hold_worker(server):
+    """
+    hold_worker() occupies the scheduler's worker so requests stay queued until
+    the returned event is set; anything still held is released after the test.
+    """
+    releases = []
+
+    def hold_worker():
+        release, started = threading.Event(), threading.Event()
+
+        def hold():
+            started.set()
+            release.wait(10)
+
+        releases.append(release)
+        server.scheduler.submit(hold)
+        assert started.wait(5)
+        return release
+
+    yield hold_worker
+    for release in releases:
+        release.set()
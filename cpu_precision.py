@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+cpu_precision.py
+Reduced-precision CPU inference for Qwen3-TTS (bf16, dynamic int8, pre-quantized int8)
+
+Export pre-quantized weights once, then load them on CPU nodes:
+    python3 cpu_precision.py export-int8 --out qwen3-tts-int8.pt
+    TTS_CPU_PRECISION=int8-prequantized TTS_QUANTIZED_WEIGHTS=qwen3-tts-int8.pt \
+        python3 server_chatterbox_turbo_enhanced.py
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import torch
+
+from tts_logging import get_logger
+
+log = get_logger("precision")
+
+CPU_PRECISIONS = ("fp32", "bf16", "int8", "int8-prequantized")
+
+# Linear layers whose names contain these are left in fp32 (small, accuracy-sensitive).
+DEFAULT_INT8_SKIP = ("speaker_encoder", "lm_head")
+
+
+def cpu_supports_bf16() -> bool:
+    """True when the CPU has native bf16 matmul support (AVX512-BF16 / AMX)."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        pass
+    try:
+        flags = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def resolve_cpu_precision(requested: str) -> str:
+    """Validate a TTS_CPU_PRECISION value, falling back to fp32 when bf16 is unsupported."""
+    mode = (requested or "fp32").strip().lower()
+    if mode not in CPU_PRECISIONS:
+        raise ValueError(f"Unsupported CPU precision '{requested}'. Supported: {list(CPU_PRECISIONS)}")
+    if mode == "bf16" and not cpu_supports_bf16():
+        log.warning("CPU has no native bf16 support; using fp32")
+        return "fp32"
+    return mode
+
+
+def cpu_load_dtype(mode: str) -> torch.dtype:
+    """Weights dtype to load with; int8 modes load fp32 and quantize afterwards."""
+    return torch.bfloat16 if mode == "bf16" else torch.float32
+
+
+def find_torch_module(model) -> torch.nn.Module | None:
+    """Return the nn.Module behind a Qwen3TTSModel wrapper (or the model itself)."""
+    if isinstance(model, torch.nn.Module):
+        return model
+    inner = getattr(model, "model", None)
+    return inner if isinstance(inner, torch.nn.Module) else None
+
+
+def quantize_linear_int8(module: torch.nn.Module, skip=DEFAULT_INT8_SKIP) -> int:
+    """
+    Dynamically quantize Linear layers to int8 in place.
+    Returns the number of layers quantized.
+    """
+    names = [
+        name for name, child in module.named_modules()
+        if isinstance(child, torch.nn.Linear) and name and not any(s in name for s in skip)
+    ]
+    if not names:
+        return 0
+    qconfig = torch.ao.quantization.default_dynamic_qconfig
+    torch.ao.quantization.quantize_dynamic(
+        module, {name: qconfig for name in names}, dtype=torch.qint8, inplace=True
+    )
+    return len(names)
+
+
+def save_quantized(module: torch.nn.Module, path: Path) -> None:
+    torch.save(module.state_dict(), str(path))
+
+
+def load_prequantized(module: torch.nn.Module, path: Path, skip=DEFAULT_INT8_SKIP) -> int:
+    """Convert Linear layers to the int8 layout and load pre-quantized weights into them."""
+    count = quantize_linear_int8(module, skip=skip)
+    # Packed int8 params are not plain tensors, so weights_only loading cannot read them.
+    state = torch.load(str(path), map_location="cpu", weights_only=False)
+    module.load_state_dict(state)
+    return count
+
+
+def module_size_mb(module: torch.nn.Module) -> float:
+    """Approximate resident weight size, counting packed int8 weights."""
+    total = sum(t.numel() * t.element_size() for t in module.state_dict().values() if torch.is_tensor(t))
+    for child in module.modules():
+        packed = getattr(child, "_packed_params", None)
+        if hasattr(packed, "_weight_bias"):
+            weight, bias = packed._weight_bias()
+            total += weight.numel() * weight.element_size()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+    return total / (1024 * 1024)
+
+
+def apply_cpu_precision(model, mode: str, weights_path: str | None = None) -> str:
+    """
+    Apply an int8 mode to a freshly loaded fp32 model (bf16 is handled at load time).
+    Returns the precision actually in effect.
+    """
+    if mode not in ("int8", "int8-prequantized"):
+        return mode
+
+    module = find_torch_module(model)
+    if module is None:
+        log.warning("Model exposes no torch module to quantize; using fp32")
+        return "fp32"
+
+    before = module_size_mb(module)
+    if mode == "int8-prequantized":
+        if not weights_path or not Path(weights_path).exists():
+            raise FileNotFoundError(f"Pre-quantized weights not found: {weights_path!r} (set TTS_QUANTIZED_WEIGHTS)")
+        count = load_prequantized(module, Path(weights_path))
+    else:
+        count = quantize_linear_int8(module)
+    module.eval()
+    log.info("Quantized %d linear layers to int8 (%.0f MB -> %.0f MB)", count, before, module_size_mb(module))
+    return mode
+
+
+def _export_int8(args) -> int:
+    from qwen_tts import Qwen3TTSModel
+
+    model_id = args.model or os.environ.get("QWEN_TTS_MODEL", "Qwen/Qwen3-TTS-12Hz-1.7B-Base").strip()
+    print(f"[INFO] Loading {model_id} (fp32, CPU)")
+    model = Qwen3TTSModel.from_pretrained(model_id, device_map="cpu", dtype=torch.float32)
+    module = find_torch_module(model)
+    if module is None:
+        print("[ERROR] Model exposes no torch module to quantize")
+        return 1
+    count = quantize_linear_int8(module)
+    save_quantized(module, Path(args.out))
+    print(f"[INFO] Saved {count} int8 layers to {args.out} ({module_size_mb(module):.0f} MB)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="CPU precision tools for Qwen3-TTS")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export-int8", help="Quantize linear layers and save the weights")
+    export.add_argument("--model", default=None, help="Model id (default: $QWEN_TTS_MODEL)")
+    export.add_argument("--out", required=True, help="Output .pt file")
+    sub.add_parser("probe", help="Report CPU precision support")
+    args = parser.parse_args(argv)
+
+    if args.command == "probe":
+        print(f"bf16 supported: {cpu_supports_bf16()}")
+        print(f"torch threads: {torch.get_num_threads()}")
+        return 0
+    return _export_int8(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
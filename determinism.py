@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+determinism.py
+Per-request seeding for reproducible Qwen3-TTS sampling
+The model samples from process-global RNGs, so seeded generations must not
+overlap with any other generation; RngGuard enforces that across workers
+"""
+
+import hashlib
+import os
+import random
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+
+MAX_SEED = 2**32 - 1
+
+
+def derive_seed(fingerprint: str) -> int:
+    """Stable 32-bit seed from a request fingerprint (used in deterministic mode)."""
+    return int.from_bytes(hashlib.sha256(fingerprint.encode("utf-8")).digest()[:4], "big")
+
+
+def seed_everything(seed: int) -> None:
+    """Seed Python, NumPy and torch (CPU and all CUDA devices)."""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def configure_deterministic_torch() -> None:
+    """Prefer deterministic kernels (cuDNN/cuBLAS); warn instead of failing on ops without one."""
+    os.environ.setdefault("CUBLAS_WORKSPACE_CONFIG", ":4096:8")
+    torch.backends.cudnn.deterministic = True
+    torch.backends.cudnn.benchmark = False
+    torch.use_deterministic_algorithms(True, warn_only=True)
+
+
+class RngGuard:
+    """
+    Shared/exclusive lock around generations.
+    Unseeded generations share the RNGs freely; a seeded one waits for them to
+    drain and runs alone, so nothing else advances the RNG between seeding and sampling.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting_exclusive = 0
+
+    @contextmanager
+    def generation(self, seed: int | None):
+        if seed is None:
+            with self._cond:
+                # Seeded requests waiting get priority so they can't starve.
+                while self._exclusive or self._waiting_exclusive:
+                    self._cond.wait()
+                self._shared += 1
+            try:
+                yield
+            finally:
+                with self._cond:
+                    self._shared -= 1
+                    self._cond.notify_all()
+            return
+
+        with self._cond:
+            self._waiting_exclusive += 1
+            while self._exclusive or self._shared:
+                self._cond.wait()
+            self._waiting_exclusive -= 1
+            self._exclusive = True
+        try:
+            seed_everything(seed)
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
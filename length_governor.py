@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+length_governor.py
+Generation length budget for the Qwen3-TTS server
+Caps the codec frames a generation may emit from the cleaned text's expected
+speaking time, and flags rows that fall into sustained silence or a repeating
+token loop so decoding can stop early instead of babbling to the hard limit.
+"""
+
+import math
+import re
+import threading
+
+import numpy as np
+
+# Qwen3-TTS-12Hz emits 12 codec frames per second of audio.
+DEFAULT_FRAME_RATE = 12.0
+
+# Typical speaking rates: syllables per second for alphabetic scripts ...
+SYLLABLES_PER_SECOND = {
+    "english": 4.0,
+    "german": 3.8,
+    "french": 4.6,
+    "spanish": 5.0,
+    "italian": 5.0,
+    "portuguese": 4.8,
+    "russian": 4.3,
+}
+DEFAULT_SYLLABLES_PER_SECOND = 4.2
+# ... and characters per second for ideographic/syllabic scripts.
+CHARS_PER_SECOND = {"chinese": 4.5, "japanese": 6.5, "korean": 5.5}
+DEFAULT_CHARS_PER_SECOND = 5.0
+
+# Digits the text frontend left unexpanded (non-English, phone numbers) are read out:
+# "7" is one or two syllables, "2024" about five.
+SYLLABLES_PER_DIGIT = 1.5
+
+SENTENCE_PAUSE_S = 0.35
+CLAUSE_PAUSE_S = 0.15
+
+# Vowel groups approximate syllables (one per spoken vowel nucleus).
+_VOWEL_GROUP_RE = re.compile(r"[aeiouyàáâãäåæèéêëìíîïòóôõöøùúûüýÿœаеёиоуыэюя]+", re.IGNORECASE)
+_SYLLABIC_CHAR_RE = re.compile(
+    "["
+    "\u3040-\u30ff"  # hiragana, katakana
+    "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"  # CJK ideographs
+    "\uac00-\ud7af"  # hangul syllables
+    "]"
+)
+_DIGIT_RE = re.compile(r"\d")
+_SENTENCE_END_RE = re.compile(r"[.!?。！？]+")
+_CLAUSE_RE = re.compile(r"[,;:、，；：]")
+
+
+def speech_seconds(text: str, language: str = "Auto") -> float:
+    """Expected speaking time of cleaned text at a typical rate."""
+    lang = (language or "auto").lower()
+    syllabic = len(_SYLLABIC_CHAR_RE.findall(text))
+    syllables = len(_VOWEL_GROUP_RE.findall(text)) + len(_DIGIT_RE.findall(text)) * SYLLABLES_PER_DIGIT
+    seconds = syllables / SYLLABLES_PER_SECOND.get(lang, DEFAULT_SYLLABLES_PER_SECOND)
+    seconds += syllabic / CHARS_PER_SECOND.get(lang, DEFAULT_CHARS_PER_SECOND)
+    seconds += len(_SENTENCE_END_RE.findall(text)) * SENTENCE_PAUSE_S
+    seconds += len(_CLAUSE_RE.findall(text)) * CLAUSE_PAUSE_S
+    return seconds
+
+
+def find_loop(tokens: np.ndarray, min_frames: int, max_period: int = 8) -> int:
+    """
+    Length of the periodic tail of a token sequence (period <= max_period),
+    or 0 when the last min_frames tokens are not periodic. A constant tail
+    (period 1) is sustained silence or a held sound.
+    """
+    tokens = np.asarray(tokens).reshape(-1)
+    if min_frames <= 0 or len(tokens) < min_frames:
+        return 0
+    for period in range(1, max_period + 1):
+        if min_frames <= period:
+            break
+        tail = tokens[-min_frames:]
+        if np.array_equal(tail[period:], tail[:-period]):
+            # Extend backwards while the pattern holds.
+            matches = tokens[period:] == tokens[:-period]
+            broken = np.flatnonzero(~matches)
+            start = broken[-1] + 1 if len(broken) else 0
+            return len(tokens) - start
+    return 0
+
+
+class LoopDetector:
+    """
+    Per-row loop tracking for one generation call, fed the running token
+    matrix once per decode step. Rows stay flagged once a loop is found;
+    loops[row] is the looped length in frames (to trim from the output).
+    """
+
+    def __init__(self, min_frames: int, max_period: int = 8, check_every: int = 4):
+        self.min_frames = min_frames
+        self.max_period = max_period
+        self.check_every = max(1, check_every)
+        self.window = 4 * min_frames
+        self.loops: dict[int, int] = {}
+        self._steps = 0
+
+    def check(self, tokens: np.ndarray) -> list[bool]:
+        """tokens: (rows, length) generated so far. Returns the per-row stop flags."""
+        self._steps += 1
+        rows = len(tokens)
+        # Only look at frames generated in this call, never at the prompt.
+        if self._steps >= self.min_frames and self._steps % self.check_every == 0:
+            window = min(self._steps, self.window)
+            for row in range(rows):
+                if row not in self.loops:
+                    length = find_loop(tokens[row, -window:], self.min_frames, self.max_period)
+                    if length:
+                        self.loops[row] = length
+        return [row in self.loops for row in range(rows)]
+
+
+class LengthGovernor:
+    """
+    Frame budgets for generations and counters for how often they bind.
+    budget = (speech_seconds * scale + pad_seconds) * frame_rate, capped at
+    max_seconds; loop_seconds of periodic output ends a row early (0 = off).
+    """
+
+    def __init__(self, frame_rate: float = DEFAULT_FRAME_RATE, scale: float = 2.0, pad_seconds: float = 1.5,
+                 max_seconds: float = 60.0, loop_seconds: float = 2.0, max_period: int = 8):
+        self.frame_rate = frame_rate
+        self.scale = scale
+        self.pad_seconds = pad_seconds
+        self.max_seconds = max_seconds
+        self.loop_seconds = loop_seconds
+        self.max_period = max_period
+        self._lock = threading.Lock()
+        self._generations = 0
+        self._budget_hits = 0
+        self._loop_stops = 0
+        self._trimmed_s = 0.0
+
+    def budget(self, text: str, language: str = "Auto", scale: float | None = None) -> int:
+        """Max codec frames for one utterance; scale overrides the server default."""
+        seconds = speech_seconds(text, language) * (scale or self.scale) + self.pad_seconds
+        return max(1, math.ceil(min(seconds, self.max_seconds) * self.frame_rate))
+
+    def loop_detector(self) -> LoopDetector | None:
+        if self.loop_seconds <= 0:
+            return None
+        return LoopDetector(max(2, round(self.loop_seconds * self.frame_rate)), self.max_period)
+
+    def trim_loop(self, wav: np.ndarray, sample_rate: int, loop_frames: int) -> np.ndarray:
+        """Cut a looped tail, keeping a short stretch of it as a natural ending."""
+        keep = round(0.25 * self.frame_rate)
+        cut = int(max(loop_frames - keep, 0) * sample_rate / self.frame_rate)
+        if cut <= 0 or cut >= len(wav):
+            return wav
+        with self._lock:
+            self._trimmed_s += cut / sample_rate
+        return wav[:len(wav) - cut]
+
+    def observe(self, audio_seconds: float, budget: int, looped: bool) -> bool:
+        """Record one finished generation; returns True when it ran into its budget."""
+        hit = not looped and audio_seconds * self.frame_rate >= budget - 1
+        with self._lock:
+            self._generations += 1
+            self._budget_hits += hit
+            self._loop_stops += looped
+        return hit
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "frame_rate": self.frame_rate,
+                "scale": self.scale,
+                "pad_seconds": self.pad_seconds,
+                "max_seconds": self.max_seconds,
+                "loop_seconds": self.loop_seconds,
+                "generations": self._generations,
+                "budget_hits": self._budget_hits,
+                "budget_hit_rate": round(self._budget_hits / self._generations, 4) if self._generations else 0.0,
+                "loop_stops": self._loop_stops,
+                "trimmed_s": round(self._trimmed_s, 3),
+            }
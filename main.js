@@ -1,11 +1,41 @@
-const { app, BrowserWindow, ipcMain } = require('electron');
+const { app, BrowserWindow, ipcMain, protocol, net } = require('electron');
 const path = require('path');
 const fs = require('fs');
 const axios = require('axios');
 const { spawn, spawnSync } = require('child_process');
+const crypto = require('crypto');
+const { pathToFileURL } = require('url');
+const { AudioStore } = require('./audio_store');
 
 let mainWindow;
 
+// Identifies this app instance to the server so newer speculations supersede older ones.
+const speculationSession = `client-${crypto.randomUUID()}`;
+
+// How long we wait for /api/tts; sent as the request deadline so the server stops on time too.
+const TTS_REQUEST_TIMEOUT_MS = 30000;
+
+// Server quota identity: an API key from the server's TTS_CLIENTS_FILE, if it issues them.
+const ttsAuthHeaders = process.env.TTS_API_KEY ? { 'X-API-Key': process.env.TTS_API_KEY } : {};
+
+// Generated audio: content-hash files bounded by size and age, served to the renderer
+// as tts-audio://<id> URLs (streamed from disk, no base64 over IPC).
+const audioStore = new AudioStore(process.env.TTS_AUDIO_OUTPUT_DIR || path.join(__dirname, 'audio_output'), {
+  maxBytes: Number(process.env.TTS_AUDIO_CACHE_MB || 200) * 1024 * 1024,
+  maxAgeMs: Number(process.env.TTS_AUDIO_MAX_AGE_HOURS || 168) * 3600 * 1000
+});
+const audioStoreReady = audioStore.init().catch((e) => {
+  console.warn('[AudioStore] Init failed:', e?.message || e);
+});
+
+protocol.registerSchemesAsPrivileged([
+  { scheme: 'tts-audio', privileges: { standard: true, secure: true, stream: true, supportFetchAPI: true } }
+]);
+
+function audioUrl(entry) {
+  return `tts-audio://${entry.id}`;
+}
+
 function runCommandCapture(command, args, options = {}) {
   return new Promise((resolve) => {
     const child = spawn(command, args, {
@@ -293,6 +323,15 @@ function createWindow() {
 }
 
 app.whenReady().then(() => {
+  protocol.handle('tts-audio', async (request) => {
+    await audioStoreReady;
+    const entry = audioStore.get(new URL(request.url).hostname);
+    if (!entry) {
+      return new Response('Audio not found (evicted?)', { status: 404 });
+    }
+    return net.fetch(pathToFileURL(audioStore.pathFor(entry)).toString());
+  });
+
   createWindow();
 
   app.on('activate', () => {
@@ -314,13 +353,21 @@ ipcMain.handle('get-platform', async () => {
   return { platform: process.platform };
 });
 
-ipcMain.handle('read-audio-file-base64', async (_event, audioPath) => {
-  try {
-    const buf = fs.readFileSync(String(audioPath));
-    return { success: true, base64: buf.toString('base64') };
-  } catch (e) {
-    return { success: false, error: e?.message || String(e) };
-  }
+ipcMain.handle('list-audio-history', async () => {
+  await audioStoreReady;
+  return {
+    success: true,
+    stats: audioStore.stats(),
+    items: audioStore.list().map((entry) => ({
+      id: entry.id,
+      url: audioUrl(entry),
+      text: entry.text,
+      voice: entry.voice,
+      mediaType: entry.mediaType,
+      size: entry.size,
+      createdAt: entry.createdAt
+    }))
+  };
 });
 
 ipcMain.handle('get-server-voices', async (event, serverAddress) => {
@@ -534,37 +581,76 @@ ipcMain.handle('discord-audio-teardown', async () => {
   };
 });
 
+// Shared by speculation and generation so a speculated clip matches the real request.
+function buildTTSPayload({ text, voice, language, emotion, voiceDescription, discord }) {
+  const payload = {
+    text: text,
+    voice: voice
+  };
+  if (language) {
+    payload.language = language;
+  }
+  if (emotion) {
+    payload.emotion = String(emotion);
+  }
+  if (voiceDescription) {
+    payload.voice_description = String(voiceDescription);
+  }
+  if (discord?.autoPlay === true) {
+    // Discord mixes at 48 kHz stereo; have the server convert so the player doesn't resample.
+    payload.sample_rate = 48000;
+    payload.channels = 2;
+  }
+  return payload;
+}
+
+ipcMain.handle('speculate-tts', async (_event, data) => {
+  // Best effort: the server renders at low priority and keeps the result briefly.
+  try {
+    const endpointUrl = buildApiUrl(data?.serverAddress, '/api/tts/speculate');
+    const payload = { ...buildTTSPayload(data || {}), session: speculationSession };
+    const response = await axios.post(endpointUrl, payload, { timeout: 5000, headers: ttsAuthHeaders });
+    return { success: true, ...response.data };
+  } catch (error) {
+    return { success: false, error: error?.message || String(error) };
+  }
+});
+
+ipcMain.handle('cancel-speculation', async (_event, data) => {
+  const jobId = String(data?.jobId || '').trim();
+  if (!jobId) {
+    return { success: true, cancelled: false };
+  }
+  try {
+    const endpointUrl = buildApiUrl(data?.serverAddress, `/api/tts/speculate/${encodeURIComponent(jobId)}`);
+    const response = await axios.delete(endpointUrl, { timeout: 5000 });
+    return { success: true, cancelled: response?.data?.cancelled === true };
+  } catch (error) {
+    return { success: false, error: error?.message || String(error) };
+  }
+});
+
 ipcMain.handle('send-tts-request', async (event, data) => {
-  const { text, voice, language, serverAddress, discord, emotion, voiceDescription } = data;
+  const { serverAddress, discord } = data;
   
   try {
     const endpointUrl = buildApiUrl(serverAddress, '/api/tts');
-    const payload = {
-      text: text,
-      voice: voice
-    };
-    if (language) {
-      payload.language = language;
-    }
-    if (emotion) {
-      payload.emotion = String(emotion);
-    }
-    if (voiceDescription) {
-      payload.voice_description = String(voiceDescription);
-    }
+    const payload = buildTTSPayload(data);
     const response = await axios.post(endpointUrl, payload, {
       responseType: 'arraybuffer',
-      timeout: 30000
+      timeout: TTS_REQUEST_TIMEOUT_MS,
+      // Lets the server drop or abort the generation once we have stopped waiting for it.
+      headers: { ...ttsAuthHeaders, 'X-TTS-Deadline-Ms': String(TTS_REQUEST_TIMEOUT_MS) }
     });
     
-    // Save audio to temporary file
-    const outputDir = path.join(__dirname, 'audio_output');
-    if (!fs.existsSync(outputDir)) {
-      fs.mkdirSync(outputDir);
-    }
-    
-    const outputPath = path.join(outputDir, `tts_${Date.now()}.wav`);
-    fs.writeFileSync(outputPath, Buffer.from(response.data));
+    // Save audio (async; identical audio reuses one file, old files are evicted)
+    await audioStoreReady;
+    const entry = await audioStore.put(Buffer.from(response.data), {
+      mediaType: response?.headers?.['content-type'],
+      text: data?.text,
+      voice: data?.voice
+    });
+    const outputPath = audioStore.pathFor(entry);
 
     let discordPlayback = null;
 
@@ -596,7 +682,8 @@ ipcMain.handle('send-tts-request', async (event, data) => {
       }
     }
     
-    return { success: true, audioPath: outputPath, discordPlayback };
+    const cacheStatus = response?.headers?.['x-tts-cache'] || null;
+    return { success: true, audioPath: outputPath, audioId: entry.id, audioUrl: audioUrl(entry), discordPlayback, cacheStatus };
   } catch (error) {
     const endpointUrl = buildApiUrl(serverAddress, '/api/tts');
     console.error('TTS request failed:', error);
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+phrase_pack.py
+Precomputed phrase library (soundboard) for stock lines per voice
+Each voice's rendered phrases live in one pack file: a JSON offset table
+followed by the encoded clips back to back. Packs are memory-mapped, so
+serving a phrase is a dict lookup and a slice, with no model involved.
+
+Pack layout: b"TTSPACK1" | uint32 BE header length | JSON header | clip data
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from pathlib import Path
+
+from tts_logging import get_logger
+
+log = get_logger("phrases")
+
+MAGIC = b"TTSPACK1"
+PHRASE_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_phrase(text: str) -> str:
+    """Matching form of a line: case, punctuation and spacing don't matter."""
+    return _SPACE_RE.sub(" ", _PUNCT_RE.sub(" ", text.casefold())).strip()
+
+
+def definition_digest(definition: dict, reference: str | None = None) -> str:
+    """Digest of a phrase set and the reference audio (fingerprint) it was rendered from."""
+    payload = json.dumps({**definition, "reference": reference}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def write_pack(path: Path, header: dict, clips: dict[str, bytes]) -> None:
+    """
+    Write a pack atomically. header["entries"][id] gains offset/length for
+    each clip (offsets are relative to the start of the clip data).
+    """
+    entries = header.setdefault("entries", {})
+    offset = 0
+    for phrase_id, data in clips.items():
+        entries.setdefault(phrase_id, {}).update(offset=offset, length=len(data))
+        offset += len(data)
+    raw = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack(">I", len(raw)))
+        f.write(raw)
+        for data in clips.values():
+            f.write(data)
+    os.replace(tmp, path)
+
+
+class PhrasePack:
+    """Read-only, memory-mapped view of one pack file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a phrase pack")
+        (size,) = struct.unpack(">I", self._map[len(MAGIC):len(MAGIC) + 4])
+        self._base = len(MAGIC) + 4 + size
+        self.header = json.loads(self._map[len(MAGIC) + 4:self._base])
+        self.entries: dict[str, dict] = self.header["entries"]
+        self._by_text = {entry["match"]: phrase_id for phrase_id, entry in self.entries.items()}
+
+    @property
+    def size(self) -> int:
+        return len(self._map)
+
+    def get(self, phrase_id: str) -> bytes | None:
+        entry = self.entries.get(phrase_id)
+        if entry is None:
+            return None
+        start = self._base + entry["offset"]
+        return self._map[start:start + entry["length"]]
+
+    def match(self, text: str) -> str | None:
+        """Phrase id whose text matches, or None."""
+        return self._by_text.get(normalize_phrase(text))
+
+
+class PhraseLibrary:
+    """
+    Phrase set definitions (<voice>.json) and rendered packs (<voice>.pack)
+    under one directory. A pack is current when its header carries the
+    digest of the voice's definition and reference fingerprint; fingerprint(voice)
+    identifies the voice's reference audio as it is now (e.g. size and mtime).
+    """
+
+    def __init__(self, root: Path, fingerprint=None):
+        self.root = Path(root)
+        self.fingerprint = fingerprint or (lambda voice: None)
+        self._packs: dict[str, PhrasePack] = {}
+        self._definitions: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def _file(self, voice: str, suffix: str) -> Path:
+        return self.root / (re.sub(r"[^A-Za-z0-9._-]+", "_", voice) + suffix)
+
+    def load(self) -> list[str]:
+        """
+        Read definitions and packs from disk; returns voices whose pack is missing or stale.
+        A pack whose phrase set changed keeps serving until re-rendered; one rendered
+        from other reference audio, or unreadable, is dropped. Unreadable definitions
+        are logged and skipped.
+        """
+        stale = []
+        for path in sorted(self.root.glob("*.json")) if self.root.exists() else []:
+            try:
+                definition = json.loads(path.read_text(encoding="utf-8"))
+                voice = definition["voice"]
+                if not isinstance(voice, str) or not isinstance(definition["phrases"], dict):
+                    raise ValueError("voice or phrases has the wrong type")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                log.warning("Skipping unreadable phrase set %s: %s", path.name, e)
+                continue
+            self._definitions[voice] = definition
+            pack_path = self._file(voice, ".pack")
+            try:
+                pack = PhrasePack(pack_path) if pack_path.exists() else None
+            except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+                # Rendered again from the definition.
+                log.warning("Discarding unreadable phrase pack %s: %s", pack_path.name, e)
+                pack = None
+                pack_path.unlink(missing_ok=True)
+            reference = self.fingerprint(voice)
+            if pack is not None and pack.header.get("reference") != reference:
+                pack = None
+                pack_path.unlink(missing_ok=True)
+            if pack is not None:
+                self._packs[voice] = pack
+            if pack is None or pack.header.get("digest") != definition_digest(definition, reference):
+                stale.append(voice)
+        return stale
+
+    def define(self, voice: str, phrases: dict[str, str], settings: dict) -> dict:
+        """Save (replace) a voice's phrase set; its pack must then be rendered."""
+        definition = {"voice": voice, "phrases": phrases, "settings": settings}
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._file(voice, ".json")
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(definition, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, path)
+        with self._lock:
+            self._definitions[voice] = definition
+        return definition
+
+    def definition(self, voice: str) -> dict | None:
+        with self._lock:
+            return self._definitions.get(voice)
+
+    def voices(self) -> list[str]:
+        with self._lock:
+            return sorted(self._definitions)
+
+    def is_current(self, voice: str) -> bool:
+        """Whether the voice's pack was rendered from its current definition and reference audio."""
+        definition, pack = self.definition(voice), self.pack(voice)
+        return (definition is not None and pack is not None
+                and pack.header.get("digest") == definition_digest(definition, self.fingerprint(voice)))
+
+    def install(self, definition: dict, clips: dict[str, tuple[bytes, dict]],
+                reference: str | None = None) -> PhrasePack | None:
+        """
+        Write the rendered pack for a definition and start serving it.
+        clips maps id -> (data, entry fields incl. "match" and "signature");
+        reference is the fingerprint of the audio they were rendered from.
+        Returns None if the definition was replaced or removed, or the reference
+        audio changed, while rendering.
+        """
+        voice = definition["voice"]
+        if reference != self.fingerprint(voice):
+            return None
+        header = {
+            "voice": voice,
+            "reference": reference,
+            "digest": definition_digest(definition, reference),
+            "entries": {phrase_id: dict(fields) for phrase_id, (_, fields) in clips.items()},
+        }
+        with self._lock:
+            if self._definitions.get(voice) is not definition:
+                return None
+            path = self._file(voice, ".pack")
+            write_pack(path, header, {phrase_id: data for phrase_id, (data, _) in clips.items()})
+            # Readers may still hold the old map; it is closed once they drop it.
+            pack = self._packs[voice] = PhrasePack(path)
+        return pack
+
+    def pack(self, voice: str) -> PhrasePack | None:
+        with self._lock:
+            return self._packs.get(voice)
+
+    def _find(self, voice: str, text: str, signature: str) -> tuple[PhrasePack, str] | None:
+        pack = self.pack(voice)
+        phrase_id = pack.match(text) if pack is not None else None
+        if phrase_id is None or pack.entries[phrase_id].get("signature") != signature:
+            return None
+        return pack, phrase_id
+
+    def has(self, voice: str, text: str, signature: str) -> bool:
+        """Whether lookup would serve this line (without counting a hit)."""
+        return self._find(voice, text, signature) is not None
+
+    def lookup(self, voice: str, text: str, signature: str) -> tuple[bytes, dict] | None:
+        """Rendered clip for a line of a voice, when rendered with the same settings signature."""
+        found = self._find(voice, text, signature)
+        if found is None:
+            return None
+        pack, phrase_id = found
+        with self._lock:
+            self.hits += 1
+        return pack.get(phrase_id), pack.entries[phrase_id]
+
+    def drop_pack(self, voice: str) -> None:
+        """Stop serving a voice's pack (its reference audio changed); the definition stays."""
+        with self._lock:
+            self._packs.pop(voice, None)
+            self._file(voice, ".pack").unlink(missing_ok=True)
+
+    def remove(self, voice: str) -> bool:
+        with self._lock:
+            known = self._definitions.pop(voice, None) is not None
+            self._packs.pop(voice, None)
+            for suffix in (".json", ".pack"):
+                self._file(voice, suffix).unlink(missing_ok=True)
+        return known
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "voices": len(self._definitions),
+                "packs": len(self._packs),
+                "phrases": sum(len(p.entries) for p in self._packs.values()),
+                "bytes": sum(p.size for p in self._packs.values()),
+                "hits": self.hits,
+            }
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+pipeline_stages.py
+Staged generation pipeline: the model stage runs on scheduler workers, CPU
+post-processing (loudness, limiter, encoding) on its own pool behind a bounded
+queue, so the model can start the next request while the previous one is
+finished on CPU. Every stage reports occupancy for /health.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class StageMeter:
+    """Occupancy metrics for a stage whose work runs on someone else's threads."""
+
+    def __init__(self, name: str, workers: int = 1):
+        self.name = name
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._created = time.monotonic()
+        self._busy = 0.0
+        self._active = 0
+        self._items = 0
+
+    @contextmanager
+    def timed(self):
+        start = time.monotonic()
+        with self._lock:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._items += 1
+                self._busy += time.monotonic() - start
+
+    def stats(self) -> dict:
+        with self._lock:
+            wall = max(time.monotonic() - self._created, 1e-9)
+            return {
+                "workers": self.workers,
+                "active": self._active,
+                "items": self._items,
+                "busy_s": round(self._busy, 3),
+                # Fraction of the stage's worker time spent working since start.
+                "occupancy": round(self._busy / (wall * self.workers), 4),
+            }
+
+
+class Stage(StageMeter):
+    """
+    A worker pool with a bounded queue. submit() blocks while the queue is full
+    (backpressure on the stage before it) and returns a Future.
+    """
+
+    def __init__(self, name: str, workers: int = 2, queue_size: int = 8):
+        super().__init__(name, workers)
+        self.queue_size = max(0, queue_size)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix=f"stage-{name}")
+        self._pending = 0
+        self._blocked = 0.0
+
+    def submit(self, fn, *args) -> Future:
+        start = time.monotonic()
+        self._slots.acquire()
+        with self._lock:
+            self._blocked += time.monotonic() - start
+            self._pending += 1
+        try:
+            return self._pool.submit(self._run, fn, args)
+        except BaseException:
+            self._release()
+            raise
+
+    def _run(self, fn, args):
+        try:
+            with self.timed():
+                return fn(*args)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats.update(
+                queued=max(self._pending - stats["active"], 0),
+                queue_size=self.queue_size,
+                blocked_s=round(self._blocked, 3),
+            )
+        return stats
+
+
+def then(future: Future, fn) -> Future:
+    """Future of fn(future.result()); exceptions propagate."""
+    out = Future()
+
+    def done(f: Future):
+        try:
+            out.set_result(fn(f.result()))
+        except BaseException as e:
+            out.set_exception(e)
+
+    future.add_done_callback(done)
+    return out
+
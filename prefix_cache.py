@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+prefix_cache.py
+Memory-bounded LRU of prefilled conditioning state (attention KV for the
+speaker + style + language prefix), so a decoder can skip the prefix pre-fill
+for repeat voices. Cached states are never handed out directly: get() returns
+a fork (copied tensors) that the caller may extend in place. Not yet wired
+into the server: qwen-tts runs its pre-fill inside generate_voice_clone, so no
+production backend can hand over the state.
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+
+def prefix_key(speaker: str, style: str, language: str, model: str = "") -> tuple[str, str, str, str]:
+    return (speaker, style or "", (language or "auto").lower(), model)
+
+
+def state_nbytes(state) -> int:
+    """Bytes held by tensors/arrays in a (nested) KV state."""
+    if isinstance(state, torch.Tensor):
+        return state.element_size() * state.nelement()
+    if isinstance(state, np.ndarray):
+        return state.nbytes
+    if isinstance(state, dict):
+        return sum(state_nbytes(v) for v in state.values())
+    if isinstance(state, (list, tuple)):
+        return sum(state_nbytes(v) for v in state)
+    # transformers Cache objects keep per-layer lists of tensors.
+    if hasattr(state, "key_cache") and hasattr(state, "value_cache"):
+        return state_nbytes(state.key_cache) + state_nbytes(state.value_cache)
+    return 0
+
+
+def fork_state(state):
+    """Independent copy of a KV state; the cached original is never mutated."""
+    if isinstance(state, torch.Tensor):
+        return state.clone()
+    if isinstance(state, np.ndarray):
+        return state.copy()
+    if isinstance(state, dict):
+        return {k: fork_state(v) for k, v in state.items()}
+    if isinstance(state, tuple):
+        return tuple(fork_state(v) for v in state)
+    if isinstance(state, list):
+        return [fork_state(v) for v in state]
+    return copy.deepcopy(state)
+
+
+class PrefixCache:
+    """LRU of prefix states bounded by total tensor bytes."""
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[object, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._building: dict[tuple, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple, count_miss: bool = True):
+        """A fork of the cached state, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += count_miss
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            state = entry[0]
+        return fork_state(state)
+
+    def put(self, key: tuple, state) -> bool:
+        """Store a state (the cache keeps its own copy). False if it exceeds the budget."""
+        size = state_nbytes(state)
+        if size > self.max_bytes:
+            return False
+        state = fork_state(state)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (state, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+        return True
+
+    def get_or_build(self, key: tuple, build):
+        """
+        Return (state, hit). On a miss build() runs once per key even under
+        concurrency; other callers wait for it and then fork the result.
+        """
+        state = self.get(key)
+        if state is not None:
+            return state, True
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            state = self.get(key, count_miss=False)
+            if state is not None:
+                return state, True
+            state = build()
+            self.put(key, state)
+        with self._lock:
+            self._building.pop(key, None)
+        return state, False
+
+    def invalidate(self, speaker: str | None = None) -> int:
+        """Drop every state (or those of one speaker, e.g. after a reference upload)."""
+        with self._lock:
+            keys = [k for k in self._entries if speaker is None or k[0] == speaker]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[1]
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
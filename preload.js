@@ -2,10 +2,12 @@ const { contextBridge, ipcRenderer } = require('electron');
 
 contextBridge.exposeInMainWorld('electronAPI', {
   sendTTSRequest: (data) => ipcRenderer.invoke('send-tts-request', data),
+  speculateTTS: (data) => ipcRenderer.invoke('speculate-tts', data),
+  cancelSpeculation: (data) => ipcRenderer.invoke('cancel-speculation', data),
   getServerVoices: (serverAddress) => ipcRenderer.invoke('get-server-voices', serverAddress),
   uploadReferenceAudio: (data) => ipcRenderer.invoke('upload-reference-audio', data),
   discordAudioSetup: (options) => ipcRenderer.invoke('discord-audio-setup', options),
   discordAudioTeardown: () => ipcRenderer.invoke('discord-audio-teardown'),
   getPlatform: () => ipcRenderer.invoke('get-platform'),
-  readAudioFileBase64: (audioPath) => ipcRenderer.invoke('read-audio-file-base64', audioPath)
+  listAudioHistory: () => ipcRenderer.invoke('list-audio-history')
 });
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+quality_governor.py
+Load-adaptive quality tiers
+When the backlog grows, slightly cheaper audio on time beats full quality
+late. The governor watches queue depth and the real-time factor of recent
+generations. It steps down one tier when either crosses its threshold. It
+steps back up only after both have stayed at or below lower thresholds for
+a hold period (hysteresis), so it doesn't flap at the boundary.
+
+Tiers file (TTS_QUALITY_TIERS_FILE), best first; an omitted cap keeps the request's value:
+    [
+      {"name": "full"},
+      {"name": "reduced", "top_k": 20, "length_scale": 1.5, "description_chars": 80},
+      {"name": "economy", "top_k": 10, "length_scale": 1.25, "description_chars": 0,
+       "sample_rate": 16000, "lite_model": true}
+    ]
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from tts_logging import fields, get_logger
+
+log = get_logger("quality")
+
+DEFAULT_TIERS = [
+    {"name": "full"},
+    {"name": "reduced", "top_k": 20, "length_scale": 1.5, "description_chars": 80},
+    {"name": "economy", "top_k": 10, "length_scale": 1.25, "description_chars": 0,
+     "sample_rate": 16000, "lite_model": True},
+]
+
+
+def shorten_description(text: str, chars: int) -> str:
+    """Cut a style prompt to at most chars, at a word boundary where possible."""
+    text = text.strip()
+    if len(text) <= chars:
+        return text
+    cut = text[:chars]
+    if " " in cut and not text[chars].isspace():
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:-")
+
+
+class QualityTier:
+    """Caps one tier puts on a request's settings (None = as requested)."""
+
+    def __init__(self, name: str, top_k: int | None = None, length_scale: float | None = None,
+                 description_chars: int | None = None, sample_rate: int | None = None,
+                 lite_model: bool = False):
+        self.name = name
+        self.top_k = top_k
+        self.length_scale = length_scale
+        self.description_chars = description_chars
+        self.sample_rate = sample_rate
+        self.lite_model = lite_model
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QualityTier":
+        return cls(
+            data["name"],
+            data.get("top_k"),
+            data.get("length_scale"),
+            data.get("description_chars"),
+            data.get("sample_rate"),
+            bool(data.get("lite_model", False)),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "top_k": self.top_k,
+            "length_scale": self.length_scale,
+            "description_chars": self.description_chars,
+            "sample_rate": self.sample_rate,
+            "lite_model": self.lite_model,
+        }
+
+    def degrade(self, top_k: int, length_scale: float, voice_description: str | None,
+                sample_rate: int | None) -> dict:
+        """
+        Settings this tier changes, given the values in effect for a request.
+        sample_rate None means the client chose its rate, which is kept.
+        """
+        changes = {}
+        if self.top_k is not None and top_k > self.top_k:
+            changes["top_k"] = self.top_k
+        if self.length_scale is not None and length_scale > self.length_scale:
+            changes["length_scale"] = self.length_scale
+        if self.description_chars is not None and voice_description:
+            shorter = shorten_description(voice_description, self.description_chars)
+            if shorter != voice_description.strip():
+                changes["voice_description"] = shorter or None
+        if self.sample_rate is not None and sample_rate is not None and sample_rate > self.sample_rate:
+            changes["sample_rate"] = self.sample_rate
+        return changes
+
+
+def load_tiers(path: Path | None = None) -> list[QualityTier]:
+    """Tiers from a JSON file (a list, best first), or the built-in ones."""
+    data = json.loads(Path(path).read_text(encoding="utf-8")) if path else DEFAULT_TIERS
+    tiers = [QualityTier.from_dict(tier) for tier in data]
+    if not tiers:
+        raise ValueError("At least one quality tier is required")
+    return tiers
+
+
+class LoadGovernor:
+    """
+    Picks the quality tier from load. Steps down one tier (at most every
+    down_hold seconds) while queue depth >= down_queue or recent RTF >= down_rtf;
+    steps up one tier once depth <= up_queue and RTF <= up_rtf have held for
+    up_hold seconds. A threshold of 0 disables that signal for stepping down.
+    RTF is wall time over audio time for generations in the last window seconds.
+    """
+
+    def __init__(self, tiers: list[QualityTier], down_queue: int = 8, down_rtf: float = 1.0,
+                 up_queue: int = 2, up_rtf: float = 0.7, down_hold: float = 2.0,
+                 up_hold: float = 15.0, window: float = 30.0):
+        if down_queue and up_queue >= down_queue:
+            raise ValueError("up_queue must be below down_queue")
+        if down_rtf and up_rtf >= down_rtf:
+            raise ValueError("up_rtf must be below down_rtf")
+        self.tiers = list(tiers)
+        self.down_queue = down_queue
+        self.down_rtf = down_rtf
+        self.up_queue = up_queue
+        self.up_rtf = up_rtf
+        self.down_hold = down_hold
+        self.up_hold = up_hold
+        self.window = window
+        self.level = 0
+        self.queue_depth = 0
+        self._changed = float("-inf")
+        self._calm_since: float | None = None
+        self._samples: deque[tuple[float, float, float]] = deque()
+        self._served: dict[str, int] = {}
+        self._steps = {"down": 0, "up": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def tier(self) -> QualityTier:
+        return self.tiers[self.level]
+
+    def observe(self, elapsed: float, audio_seconds: float, now: float | None = None) -> None:
+        """Feed back one model call: wall seconds and seconds of audio produced."""
+        if audio_seconds <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._samples.append((now, elapsed, audio_seconds))
+            self._prune_locked(now)
+
+    def _prune_locked(self, now: float) -> None:
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+    def _rtf_locked(self, now: float) -> float | None:
+        self._prune_locked(now)
+        audio = sum(sample[2] for sample in self._samples)
+        return sum(sample[1] for sample in self._samples) / audio if audio else None
+
+    def recent_rtf(self, now: float | None = None) -> float | None:
+        """RTF over the window (None when nothing was generated lately)."""
+        with self._lock:
+            return self._rtf_locked(time.monotonic() if now is None else now)
+
+    def update(self, queue_depth: int, now: float | None = None) -> QualityTier:
+        """Re-evaluate the tier for the current queue depth; returns the tier to serve with."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.queue_depth = queue_depth
+            rtf = self._rtf_locked(now)
+            overloaded = (self.down_queue and queue_depth >= self.down_queue) or (
+                self.down_rtf and rtf is not None and rtf >= self.down_rtf)
+            calm = queue_depth <= self.up_queue and (rtf is None or rtf <= self.up_rtf)
+            if not calm:
+                self._calm_since = None
+            elif self._calm_since is None:
+                self._calm_since = now
+            step = 0
+            if overloaded and self.level < len(self.tiers) - 1 and now - self._changed >= self.down_hold:
+                step = 1
+            elif calm and self.level > 0 and now - max(self._calm_since, self._changed) >= self.up_hold:
+                step = -1
+            if step:
+                self.level += step
+                self._changed = now
+                self._steps["down" if step > 0 else "up"] += 1
+                log.info("Quality tier changed", extra=fields(
+                    tier=self.tier.name, queue=queue_depth, rtf=None if rtf is None else round(rtf, 3)))
+            return self.tier
+
+    def record(self, tier: str) -> None:
+        """Count a response served at a tier."""
+        with self._lock:
+            self._served[tier] = self._served.get(tier, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            rtf = self._rtf_locked(time.monotonic())
+            return {
+                "tier": self.tier.name,
+                "tiers": [tier.name for tier in self.tiers],
+                "queue_depth": self.queue_depth,
+                "recent_rtf": None if rtf is None else round(rtf, 3),
+                "steps": dict(self._steps),
+                "served": dict(self._served),
+            }
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+rate_limit.py
+Per-client quotas: identification by API key (or the caller's address),
+token buckets over requests and synthesized audio-seconds, and usage counters
+Each check touches one client's state, so it is O(1) per request. State lives
+in process memory, or in a SQLite file shared by several worker processes.
+
+Clients file (TTS_CLIENTS_FILE), quotas per minute, 0 = unlimited:
+    {
+      "default": {"requests_per_minute": 60, "audio_seconds_per_minute": 120},
+      "clients": {
+        "discord-bot": {"api_key": "...", "requests_per_minute": 30, "weight": 1},
+        "studio": {"api_key_sha256": "<hex>", "audio_seconds_per_minute": 0, "weight": 4}
+      }
+    }
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+_CLIENT_NAME_RE = re.compile(r"[^A-Za-z0-9._:@-]+")
+
+
+class Quota:
+    """Per-minute allowances (0 = unlimited) and the client's fair-share weight."""
+
+    def __init__(self, requests_per_minute: float = 0.0, audio_seconds_per_minute: float = 0.0,
+                 weight: float = 1.0):
+        self.requests_per_minute = float(requests_per_minute)
+        self.audio_seconds_per_minute = float(audio_seconds_per_minute)
+        self.weight = max(float(weight), 0.01)
+
+    @classmethod
+    def from_dict(cls, data: dict, base: "Quota | None" = None) -> "Quota":
+        base = base or cls()
+        return cls(
+            data.get("requests_per_minute", base.requests_per_minute),
+            data.get("audio_seconds_per_minute", base.audio_seconds_per_minute),
+            data.get("weight", base.weight),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "audio_seconds_per_minute": self.audio_seconds_per_minute,
+            "weight": self.weight,
+        }
+
+
+class Client:
+    """
+    An identified caller; authenticated clients came with a configured API key.
+    Quotas and fair share are kept per account (the id unless several ids share one).
+    """
+
+    def __init__(self, id: str, quota: Quota, authenticated: bool = False, account: str | None = None):
+        self.id = id
+        self.quota = quota
+        self.authenticated = authenticated
+        self.account = account or id
+
+
+class RateLimited(Exception):
+    """Raised by RateLimiter.admit; retry_after is in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _key_digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ClientRegistry:
+    """
+    Maps API keys to configured clients. Requests without a key are accounted
+    by address ("ip:<address>", so they can never spend a configured client's
+    quota); a claimed name (X-TTS-Client) only labels them ("ip:<address>/<name>"),
+    so rotating names doesn't buy a fresh quota. Trusted proxies (the gateway, a
+    bot host) are believed about the hops they added to X-Forwarded-For; a name one
+    of them sets itself, with no forwarded address, gets its own account ("anon:<name>").
+    """
+
+    def __init__(self, default: Quota | None = None, clients: dict[str, dict] | None = None,
+                 require_key: bool = False, trusted_proxies=()):
+        self.default = default or Quota()
+        self.require_key = require_key
+        self.trusted_proxies = set(trusted_proxies)
+        self._by_digest: dict[str, Client] = {}
+        for name, spec in (clients or {}).items():
+            digest = spec.get("api_key_sha256") or (_key_digest(spec["api_key"]) if spec.get("api_key") else None)
+            if not digest:
+                raise ValueError(f"Client '{name}' needs api_key or api_key_sha256")
+            self._by_digest[digest.lower()] = Client(name, Quota.from_dict(spec, self.default), authenticated=True)
+
+    @classmethod
+    def from_file(cls, path: Path, default: Quota | None = None, require_key: bool = False,
+                  trusted_proxies=()) -> "ClientRegistry":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        default = Quota.from_dict(data.get("default", {}), default)
+        return cls(default, data.get("clients", {}), require_key, trusted_proxies)
+
+    @property
+    def configured(self) -> list[str]:
+        return sorted(client.id for client in self._by_digest.values())
+
+    def identify(self, api_key: str | None, claimed: str | None = None, address: str | None = None,
+                 forwarded_for: str | None = None) -> Client:
+        """Client for a request. Raises PermissionError for an unknown or missing (when required) key."""
+        if api_key:
+            client = self._by_digest.get(_key_digest(api_key.strip()))
+            if client is None:
+                raise PermissionError("Unknown API key")
+            return client
+        if self.require_key:
+            raise PermissionError("An API key is required (X-API-Key or Authorization: Bearer)")
+        name = _CLIENT_NAME_RE.sub("_", (claimed or "").strip())[:64]
+        trusted = address in self.trusted_proxies
+        if trusted and not forwarded_for and name:
+            return Client(f"anon:{name}", self.default)
+        if trusted and forwarded_for:
+            # Walk back from the nearest hop while it is a trusted proxy: entries further
+            # left were written by the caller and can't be believed.
+            for hop in reversed([h.strip() for h in forwarded_for.split(",") if h.strip()]):
+                if address not in self.trusted_proxies:
+                    break
+                address = hop
+        account = f"ip:{address or 'unknown'}"
+        return Client(f"{account}/{name}" if name else account, self.default, account=account)
+
+
+# =======================
+# STATE STORES
+# =======================
+
+class MemoryStore:
+    """Per-client state dicts in this process; the least recently seen are dropped beyond max_clients."""
+
+    def __init__(self, max_clients: int = 10000):
+        self.max_clients = max(1, max_clients)
+        self._state: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def transact(self, client: str, fn):
+        """Run fn(state) on one client's state atomically; returns fn's result."""
+        with self._lock:
+            state = self._state.setdefault(client, {})
+            self._state.move_to_end(client)
+            if len(self._state) > self.max_clients:
+                self._state.popitem(last=False)
+            return fn(state)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return json.loads(json.dumps(self._state))
+
+
+class SqliteStore:
+    """
+    Per-client state shared by worker processes through one SQLite file
+    (one row per client, updated in an IMMEDIATE transaction).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS client_state (client TEXT PRIMARY KEY, state TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None)
+        return db
+
+    def transact(self, client: str, fn):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT state FROM client_state WHERE client = ?", (client,)).fetchone()
+            state = json.loads(row[0]) if row else {}
+            result = fn(state)
+            db.execute("INSERT OR REPLACE INTO client_state (client, state) VALUES (?, ?)",
+                       (client, json.dumps(state, separators=(",", ":"))))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return result
+
+    def snapshot(self) -> dict[str, dict]:
+        rows = self._connect().execute("SELECT client, state FROM client_state").fetchall()
+        return {client: json.loads(state) for client, state in rows}
+
+
+# =======================
+# LIMITER
+# =======================
+
+def _refill(state: dict, kind: str, per_minute: float, now: float) -> float:
+    """Bring a bucket (capacity: one minute's allowance) up to date; returns its tokens."""
+    tokens, stamp = state.get(kind, (per_minute, now))
+    tokens = min(per_minute, tokens + (now - stamp) * per_minute / 60.0)
+    state[kind] = (tokens, now)
+    return tokens
+
+
+class RateLimiter:
+    """
+    Token buckets per client. A request spends one request token; synthesized
+    audio is charged afterwards and may drive the audio bucket into debt, in
+    which case the client's next requests wait until it is paid back.
+    """
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else MemoryStore()
+
+    def admit(self, client: Client, requests: int = 1) -> None:
+        """Spend request tokens or raise RateLimited."""
+        quota = client.quota
+
+        def update(state: dict):
+            now = time.time()
+            usage = state.setdefault("usage", {"requests": 0, "limited": 0, "audio_s": 0.0})
+            usage["last_seen"] = now
+            if quota.audio_seconds_per_minute:
+                audio = _refill(state, "audio", quota.audio_seconds_per_minute, now)
+                if audio < 0:
+                    usage["limited"] += 1
+                    return "audio", -audio * 60.0 / quota.audio_seconds_per_minute
+            if quota.requests_per_minute:
+                tokens = _refill(state, "requests", quota.requests_per_minute, now)
+                if tokens < requests:
+                    usage["limited"] += 1
+                    if requests > quota.requests_per_minute:
+                        return "requests", float("inf")
+                    return "requests", (requests - tokens) * 60.0 / quota.requests_per_minute
+                state["requests"] = (tokens - requests, now)
+            usage["requests"] += requests
+            return None
+
+        limited = self.store.transact(client.account, update)
+        if limited is not None:
+            kind, retry_after = limited
+            if retry_after == float("inf"):
+                raise RateLimited(f"{requests} requests exceed the per-minute quota of {client.account}", 60.0)
+            what = "audio-seconds" if kind == "audio" else "requests"
+            raise RateLimited(f"Rate limit exceeded for {client.account} ({what} per minute)", retry_after)
+
+    def charge_audio(self, client: Client, seconds: float) -> None:
+        """Charge synthesized audio to a client (its bucket may go negative)."""
+        quota = client.quota
+
+        def update(state: dict):
+            now = time.time()
+            usage = state.setdefault("usage", {"requests": 0, "limited": 0, "audio_s": 0.0})
+            usage["audio_s"] += seconds
+            if quota.audio_seconds_per_minute:
+                tokens = _refill(state, "audio", quota.audio_seconds_per_minute, now)
+                state["audio"] = (tokens - seconds, now)
+
+        self.store.transact(client.account, update)
+
+    def usage(self) -> dict[str, dict]:
+        """Per-client counters: requests admitted, requests limited, audio-seconds synthesized."""
+        return {
+            client: {
+                "requests": state["usage"]["requests"],
+                "limited": state["usage"]["limited"],
+                "audio_s": round(state["usage"]["audio_s"], 2),
+                "last_seen": state["usage"].get("last_seen"),
+            }
+            for client, state in self.store.snapshot().items()
+            if "usage" in state
+        }
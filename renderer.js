@@ -7,6 +7,7 @@ const generateBtn = document.getElementById('generateBtn');
 const statusMessage = document.getElementById('statusMessage');
 const playbackStatus = document.getElementById('playbackStatus');
 const discordAutoPlayCheckbox = document.getElementById('discordAutoPlay');
+const speculativeCheckbox = document.getElementById('speculativeSynthesis');
 const discordSinkNameInput = document.getElementById('discordSinkName');
 const discordSetupBtn = document.getElementById('discordSetupBtn');
 const discordTeardownBtn = document.getElementById('discordTeardownBtn');
@@ -19,12 +20,24 @@ const referenceUploadInput = document.getElementById('referenceUploadInput');
 const uploadReferenceBtn = document.getElementById('uploadReferenceBtn');
 const referenceUploadNameInput = document.getElementById('referenceUploadName');
 const overwriteReferenceCheckbox = document.getElementById('overwriteReference');
+const historyPanel = document.getElementById('historyPanel');
+const historyList = document.getElementById('historyList');
 
 // State
 let voiceSamples = [];
 
+// Most recent clips listed in the history panel.
+const HISTORY_LIMIT = 20;
+
 let currentAudio = null;
 
+// Speculative pre-synthesis (opt-in): render text on the server while the user types.
+const SPECULATION_DEBOUNCE_MS = 700;
+const SPECULATION_SENTENCE_END_MS = 150;
+let speculationTimer = null;
+let lastSpeculationKey = '';
+let lastSpeculationJobId = null;
+
 function setPlaybackStatus(message, type) {
   if (!playbackStatus) return;
   const safeType = type || 'idle';
@@ -32,35 +45,21 @@ function setPlaybackStatus(message, type) {
   playbackStatus.textContent = message || 'Playback: idle';
 }
 
-async function playInAppWavFile(audioPath) {
-  const result = await window.electronAPI.readAudioFileBase64(audioPath);
-  if (!result?.success) {
-    throw new Error(result?.error || 'Failed to read audio file');
-  }
-
-  const binary = atob(result.base64);
-  const bytes = new Uint8Array(binary.length);
-  for (let i = 0; i < binary.length; i++) {
-    bytes[i] = binary.charCodeAt(i);
-  }
-  const blob = new Blob([bytes], { type: 'audio/wav' });
-  const url = URL.createObjectURL(blob);
-
+// audioUrl is a tts-audio:// URL from the main process; the file streams from its cache.
+async function playInAppAudio(audioUrl) {
   if (currentAudio) {
     try { currentAudio.pause(); } catch {}
     currentAudio = null;
   }
 
-  const audio = new Audio(url);
+  const audio = new Audio(audioUrl);
   currentAudio = audio;
 
   setPlaybackStatus('Playback: playing in app…', 'playing');
   audio.onended = () => {
-    URL.revokeObjectURL(url);
     setPlaybackStatus('Playback: finished', 'sent');
   };
   audio.onerror = () => {
-    URL.revokeObjectURL(url);
     setPlaybackStatus('Playback: error (failed to decode/play)', 'error');
   };
   await audio.play();
@@ -126,6 +125,11 @@ function loadSettings() {
     discordAutoPlayCheckbox.checked = savedDiscordAutoPlay === 'true';
   }
 
+  const savedSpeculative = localStorage.getItem('speculativeSynthesis');
+  if (savedSpeculative !== null && speculativeCheckbox) {
+    speculativeCheckbox.checked = savedSpeculative === 'true';
+  }
+
   const savedDiscordSinkName = localStorage.getItem('discordSinkName');
   if (savedDiscordSinkName) {
     discordSinkNameInput.value = savedDiscordSinkName;
@@ -183,6 +187,9 @@ function saveSettings() {
   }
 
   localStorage.setItem('discordAutoPlay', String(!!discordAutoPlayCheckbox.checked));
+  if (speculativeCheckbox) {
+    localStorage.setItem('speculativeSynthesis', String(!!speculativeCheckbox.checked));
+  }
   if (discordSinkNameInput.value) {
     localStorage.setItem('discordSinkName', discordSinkNameInput.value.trim());
   }
@@ -211,6 +218,9 @@ function saveSettings() {
 // Setup event listeners
 function setupEventListeners() {
   refreshVoicesBtn.addEventListener('click', handleRefreshVoices);
+  if (historyPanel) {
+    historyPanel.addEventListener('toggle', refreshHistory);
+  }
   generateBtn.addEventListener('click', handleGenerateSpeech);
   discordSetupBtn.addEventListener('click', handleDiscordSetup);
   discordTeardownBtn.addEventListener('click', handleDiscordTeardown);
@@ -265,6 +275,17 @@ function setupEventListeners() {
   });
   voiceSelect.addEventListener('change', saveSettings);
   discordAutoPlayCheckbox.addEventListener('change', saveSettings);
+  if (speculativeCheckbox) {
+    speculativeCheckbox.addEventListener('change', () => {
+      saveSettings();
+      if (speculativeCheckbox.checked) {
+        scheduleSpeculation();
+      } else {
+        cancelSpeculation();
+      }
+    });
+  }
+  textInput.addEventListener('input', scheduleSpeculation);
   discordSinkNameInput.addEventListener('change', saveSettings);
   discordOsModeSelect.addEventListener('change', saveSettings);
   discordWindowsCableInput.addEventListener('change', saveSettings);
@@ -441,15 +462,69 @@ async function loadServerVoices(serverAddress) {
   }
 }
 
+// Current TTS inputs, normalized exactly as they are sent (speculation must match Generate).
+function collectTTSOptions() {
+  return {
+    text: textInput.value.trim(),
+    voice: voiceSelect.value,
+    language: (languageSelect ? languageSelect.value : 'Auto') || 'Auto',
+    emotion: String((emotionSelect ? emotionSelect.value : 'Neutral') || 'Neutral').trim() || 'Neutral',
+    voiceDescription: String((voiceDescriptionInput ? voiceDescriptionInput.value : '') || '').trim(),
+    serverAddress: serverAddressInput.value.trim()
+  };
+}
+
+function scheduleSpeculation() {
+  if (speculationTimer) {
+    clearTimeout(speculationTimer);
+    speculationTimer = null;
+  }
+  if (!speculativeCheckbox?.checked) return;
+
+  const text = textInput.value.trim();
+  if (!text) {
+    cancelSpeculation();
+    return;
+  }
+  // Finished sentences are worth sending right away; otherwise wait for a typing pause.
+  const delay = /[.!?…]["')\]]*$/.test(text) ? SPECULATION_SENTENCE_END_MS : SPECULATION_DEBOUNCE_MS;
+  speculationTimer = setTimeout(runSpeculation, delay);
+}
+
+async function runSpeculation() {
+  speculationTimer = null;
+  // Same output format as the real request, or the server can't reuse the speculated audio.
+  const options = { ...collectTTSOptions(), discord: { autoPlay: !!discordAutoPlayCheckbox.checked } };
+  if (!options.text || !options.voice || !options.serverAddress) return;
+
+  const key = JSON.stringify(options);
+  if (key === lastSpeculationKey) return;
+  lastSpeculationKey = key;
+
+  // The server also supersedes older jobs of this client's session.
+  const result = await window.electronAPI.speculateTTS(options);
+  if (result?.success) {
+    lastSpeculationJobId = result.job_id || null;
+  }
+}
+
+function cancelSpeculation() {
+  if (speculationTimer) {
+    clearTimeout(speculationTimer);
+    speculationTimer = null;
+  }
+  const jobId = lastSpeculationJobId;
+  lastSpeculationKey = '';
+  lastSpeculationJobId = null;
+  if (jobId) {
+    window.electronAPI.cancelSpeculation({ serverAddress: serverAddressInput.value.trim(), jobId });
+  }
+}
+
 // Handle speech generation
 async function handleGenerateSpeech() {
   // Validate inputs
-  const text = textInput.value.trim();
-  const voice = voiceSelect.value;
-  const language = (languageSelect ? languageSelect.value : 'Auto') || 'Auto';
-  const emotion = (emotionSelect ? emotionSelect.value : 'Neutral') || 'Neutral';
-  const voiceDescription = (voiceDescriptionInput ? voiceDescriptionInput.value : '') || '';
-  const serverAddress = serverAddressInput.value.trim();
+  const { text, voice, language, emotion, voiceDescription, serverAddress } = collectTTSOptions();
   
   if (!text) {
     showStatus('Please enter text to speak', 'error');
@@ -466,6 +541,14 @@ async function handleGenerateSpeech() {
     return;
   }
   
+  // Generate supersedes any pending speculation; an in-flight one is joined server-side.
+  if (speculationTimer) {
+    clearTimeout(speculationTimer);
+    speculationTimer = null;
+  }
+  lastSpeculationKey = '';
+  lastSpeculationJobId = null;
+
   // Disable button and show loading
   generateBtn.disabled = true;
   generateBtn.textContent = '⏳ Generating...';
@@ -479,8 +562,8 @@ async function handleGenerateSpeech() {
       text: text,
       voice: voice,
       language: language,
-      emotion: String(emotion || 'Neutral').trim() || 'Neutral',
-      voiceDescription: String(voiceDescription || '').trim(),
+      emotion: emotion,
+      voiceDescription: voiceDescription,
       serverAddress: serverAddress,
       discord: {
         autoPlay: !!discordAutoPlayCheckbox.checked,
@@ -491,6 +574,7 @@ async function handleGenerateSpeech() {
     
     if (result.success) {
       const playback = result.discordPlayback;
+      const preRendered = result.cacheStatus === 'hit' || result.cacheStatus === 'joined' ? ' (pre-rendered)' : '';
       if (discordAutoPlayCheckbox.checked && playback && playback.started === false) {
         setPlaybackStatus(`Playback: error (${playback.error || 'unknown'})`, 'error');
         showStatus(
@@ -500,7 +584,7 @@ async function handleGenerateSpeech() {
       } else if (discordAutoPlayCheckbox.checked && playback && playback.started === true) {
         if (playback.playInApp === true) {
           try {
-            await playInAppWavFile(result.audioPath);
+            await playInAppAudio(result.audioUrl);
           } catch (e) {
             setPlaybackStatus(`Playback: error (${e.message})`, 'error');
             showStatus(
@@ -514,12 +598,12 @@ async function handleGenerateSpeech() {
           setPlaybackStatus(`Playback: sent via ${playback.player || 'player'}`, 'sent');
         }
         showStatus(
-          `✅ Speech generated and sent to Discord (${playback.player}). Audio saved to: ${result.audioPath}`,
+          `✅ Speech generated${preRendered} and sent to Discord (${playback.player}). Audio saved to: ${result.audioPath}`,
           'success'
         );
       } else {
         setPlaybackStatus('Playback: not sent (auto-play off)', 'idle');
-        showStatus(`✅ Speech generated successfully! Audio saved to: ${result.audioPath}`, 'success');
+        showStatus(`✅ Speech generated successfully${preRendered}! Audio saved to: ${result.audioPath}`, 'success');
       }
       localStorage.setItem('selectedVoice', voice);
     } else {
@@ -532,9 +616,44 @@ async function handleGenerateSpeech() {
     // Re-enable button
     generateBtn.disabled = false;
     generateBtn.textContent = '🔊 Generate';
+    refreshHistory();
   }
 }
 
+// List recent clips from the local audio store (only while the panel is open).
+async function refreshHistory() {
+  if (!historyPanel?.open) return;
+  const result = await window.electronAPI.listAudioHistory();
+  historyList.innerHTML = '';
+  const items = result?.success ? result.items.slice(0, HISTORY_LIMIT) : [];
+  if (!items.length) {
+    const empty = document.createElement('li');
+    empty.className = 'hint';
+    empty.textContent = result?.success ? 'No clips yet.' : 'Could not read the audio cache.';
+    historyList.appendChild(empty);
+    return;
+  }
+  items.forEach((item) => {
+    const row = document.createElement('li');
+    const play = document.createElement('button');
+    play.className = 'btn-secondary';
+    play.textContent = '▶';
+    play.title = 'Play again';
+    play.addEventListener('click', () => {
+      playInAppAudio(item.url).catch((e) => setPlaybackStatus(`Playback: error (${e.message})`, 'error'));
+    });
+    const text = document.createElement('span');
+    text.className = 'history-text';
+    text.textContent = item.text || '(no text)';
+    text.title = item.text || '';
+    const voice = document.createElement('span');
+    voice.className = 'history-voice';
+    voice.textContent = item.voice || '';
+    row.append(play, text, voice);
+    historyList.appendChild(row);
+  });
+}
+
 // Show status message
 let statusHideTimer = null;
 function showStatus(message, type) {
@@ -5,92 +5,90 @@ Qwen3-TTS FastAPI server with MP3 support and audio duration validation
 Designed to work with TTS Discord client
 """
 
+import asyncio
+import base64
 import gc
+import io
+import json
+import logging
+import math
 import re
 import os
+import threading
 import time
 import uuid
+import zipfile
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from functools import lru_cache
 from pathlib import Path
-from tempfile import NamedTemporaryFile
 
+import anyio
 import numpy as np
 import soundfile as sf
 import torch
 import torchaudio as ta
-from fastapi import FastAPI, Response, HTTPException, UploadFile, File, Form
-from pydantic import BaseModel, Field
-
-# Try to import Qwen3TTSModel
-try:
-    from qwen_tts import Qwen3TTSModel
-except ImportError:
-    print("[ERROR] qwen-tts not installed. Run: pip install qwen-tts")
-    exit(1)
+from fastapi import FastAPI, Request, Response, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+
+from audio_cache import AudioCache, make_cache_key
+from audio_delivery import audio_response
+from audio_format import FORMAT_EXTENSIONS, EncodedAudio, encode_audio, media_type, sniff_media_type, validate_output
+from determinism import MAX_SEED, RngGuard, configure_deterministic_torch, derive_seed
+from length_governor import DEFAULT_FRAME_RATE, LengthGovernor, LoopDetector
+from loudness import normalize_loudness_batch
+from phrase_pack import PHRASE_ID_RE, PhraseLibrary, normalize_phrase
+from pipeline_stages import Stage, StageMeter, then
+from quality_governor import LoadGovernor, load_tiers
+from rate_limit import Client, ClientRegistry, Quota, RateLimited, RateLimiter, SqliteStore
+from silence_trim import DEFAULT_MAX_PAUSE_SECONDS, DEFAULT_PAD_SECONDS, DEFAULT_THRESHOLD_DB, trim_silence_batch
+from text_frontend import clean_description, prepare_text
+from tts_backends import create_backend
+from tts_scheduler import (
+    CostModel,
+    Deadline,
+    DeadlineExceeded,
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_SPECULATIVE,
+    JobCancelled,
+    JobScheduler,
+)
+from voice_cache import VoiceCache, VoiceEntry
+from voice_store import VoiceStore, default_store_dir, embedder_key
+from tts_logging import fields, get_logger, setup_logging
+from ws_protocol import MESSAGE_TYPES, encode_audio_frame, parse_client_message
+
+# LOG_LEVEL, TTS_LOG_FORMAT (text | json) and TTS_LOG_SAMPLE configure output.
+setup_logging()
+log = get_logger("server")
 
 # For MP3 support
 try:
     import librosa
 except ImportError:
-    print("[WARNING] librosa not installed. MP3 support will be limited.")
-    print("Install with: pip install librosa")
+    log.warning("librosa not installed. MP3 support will be limited. Install with: pip install librosa")
     librosa = None
 
 # =======================
 # OFFLINE MODEL LOADING
 # =======================
 
+# Precision actually in effect after loading (e.g. "bf16", "fp16", "fp32", "int8", "fp32+onnx").
+MODEL_PRECISION = "fp32"
+
+
 def load_model_offline(device="auto"):
     """
-    Load Qwen3-TTS in offline mode after initial authentication
+    Create and load the inference backend chosen by TTS_BACKEND (torch | onnx | fake)
+    Returns (backend, device, model_id).
     """
-    model_id = os.environ.get("QWEN_TTS_MODEL", "Qwen/Qwen3-TTS-12Hz-1.7B-Base").strip()
-    if device == "auto":
-        device = "cuda" if torch.cuda.is_available() else "cpu"
+    global MODEL_PRECISION
 
-    device_map = "cuda:0" if device == "cuda" else "cpu"
-    if device_map != "cpu":
-        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
-    else:
-        dtype = torch.float32
-
-    print(f"[INIT] Loading Qwen3-TTS in offline mode")
-    print(f"[INIT] Model: {model_id}")
-    print(f"[INIT] Device: {device_map}")
-
-    # Set environment variables for offline mode
-    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
-    os.environ.setdefault('HF_DATASETS_OFFLINE', '1')
-    os.environ.setdefault('HF_HUB_OFFLINE', '1')
-    os.environ.setdefault('HF_HUB_DISABLE_SYMLINKS_WARNING', '1')
-
-    try:
-        # First, try to load with offline settings
-        model = Qwen3TTSModel.from_pretrained(
-            model_id,
-            device_map=device_map,
-            dtype=dtype,
-            local_files_only=True,
-        )
-        print("[INIT] Model loaded in offline mode")
-        return model, device_map, model_id
-
-    except Exception as e:
-        print(f"[WARNING] Offline loading failed: {e}")
-        print("[INIT] Trying standard loading (may require internet)...")
-
-        try:
-            model = Qwen3TTSModel.from_pretrained(
-                model_id,
-                device_map=device_map,
-                dtype=dtype,
-            )
-            print("[INIT] Model loaded successfully")
-            return model, device_map, model_id
-        except Exception as e2:
-            print(f"[ERROR] Failed to load model: {e2}")
-            print("[INFO] Make sure you ran the setup script first:")
-            print("  ./setup.sh <your-hf-token> [model-id]")
-            raise
+    backend = create_backend(os.environ.get("TTS_BACKEND", "torch"))
+    backend.load(device)
+    MODEL_PRECISION = backend.precision
+    return backend, backend.device, backend.model_id
 
 # =======================
 # AUDIO UTILITIES
@@ -111,7 +109,7 @@ def get_audio_duration(audio_path: Path) -> float:
             duration = len(audio) / sr
         return duration
     except Exception as e:
-        print(f"[ERROR] Failed to get duration for {audio_path}: {e}")
+        log.error("Failed to get duration for %s: %s", audio_path, e)
         return 0.0
 
 def convert_mp3_to_wav(mp3_path: Path, wav_path: Path) -> bool:
@@ -129,7 +127,7 @@ def convert_mp3_to_wav(mp3_path: Path, wav_path: Path) -> bool:
             ta.save(str(wav_path), waveform, sample_rate)
         return True
     except Exception as e:
-        print(f"[ERROR] Failed to convert {mp3_path} to WAV: {e}")
+        log.error("Failed to convert %s to WAV: %s", mp3_path, e)
         return False
 
 def validate_reference_audio(audio_path: Path) -> tuple[bool, str, float]:
@@ -154,7 +152,7 @@ def validate_reference_audio(audio_path: Path) -> tuple[bool, str, float]:
     if duration < 5.0:
         return False, f"Audio too short: {duration:.1f}s. Must be at least 5.0 seconds", duration
     
-    print(f"[INFO] Valid reference audio: {audio_path.name} ({duration:.1f}s)")
+    log.info("Valid reference audio: %s (%.1fs)", audio_path.name, duration)
     return True, "", duration
 
 # =======================
@@ -165,14 +163,17 @@ def validate_reference_audio(audio_path: Path) -> tuple[bool, str, float]:
 try:
     tts, device, model_id = load_model_offline()
 except Exception as e:
-    print(f"[ERROR] Failed to initialize model: {e}")
+    log.error("Failed to initialize model: %s", e)
     exit(1)
 
 try:
-    SUPPORTED_LANGUAGES = tts.get_supported_languages() if tts else None
+    SUPPORTED_LANGUAGES = tts.supported_languages() if tts else None
 except Exception as e:
     SUPPORTED_LANGUAGES = None
-    print(f"[WARNING] Failed to fetch supported languages: {e}")
+    log.warning("Failed to fetch supported languages: %s", e)
+
+# Lowercase lookup built once; language names are matched case-insensitively.
+SUPPORTED_LOWER = {lang.lower(): lang for lang in SUPPORTED_LANGUAGES} if SUPPORTED_LANGUAGES else {}
 
  # =======================
  # REFERENCES DIRECTORY
@@ -196,17 +197,28 @@ REF_DIR = _get_references_dir()
 # Create references directory if it doesn't exist
 REF_DIR.mkdir(parents=True, exist_ok=True)
 
-# Cache for validated reference files
-validated_references = {}
+# Resident voices (validated path, canonical audio, speaker prompt). Pinned voices are never evicted.
+voice_cache = VoiceCache(max_unpinned=int(os.environ.get("TTS_VOICE_CACHE_SIZE", "32")))
+# Precomputed voices (python3 -m voice_store precompute-voices): loaded without probing or embedding.
+voice_store = VoiceStore(default_store_dir(REF_DIR))
 
 def get_reference_path(voice_filename: str) -> Path:
     """
     Get the path to a reference audio file and validate it
     Returns the validated path or raises an exception
     """
+    return get_voice_entry(voice_filename).path
+
+
+def get_voice_entry(voice_filename: str) -> VoiceEntry:
+    """
+    Resolve, validate and (if needed) convert a reference voice, caching the result
+    Raises HTTPException when the voice is missing or invalid
+    """
     # Check if we have this voice cached
-    if voice_filename in validated_references:
-        return validated_references[voice_filename]["path"]
+    entry = voice_cache.get(voice_filename)
+    if entry is not None:
+        return entry
     
     # Look for the file in the references directory
     voice_path = REF_DIR / voice_filename
@@ -235,6 +247,10 @@ def get_reference_path(voice_filename: str) -> Path:
             ),
         )
     
+    stored = voice_store.lookup(voice_path)
+    if stored is not None:
+        return voice_cache.put(load_stored_voice(voice_filename, stored))
+
     # Validate the audio file
     is_valid, error_msg, duration = validate_reference_audio(voice_path)
     if not is_valid:
@@ -244,7 +260,7 @@ def get_reference_path(voice_filename: str) -> Path:
     if voice_path.suffix.lower() in ['.mp3', '.ogg', '.flac']:
         wav_path = voice_path.with_suffix('.wav')
         if not wav_path.exists():
-            print(f"[INFO] Converting {voice_path.name} to WAV...")
+            log.info("Converting %s to WAV...", voice_path.name)
             if not convert_mp3_to_wav(voice_path, wav_path):
                 raise HTTPException(
                     status_code=500,
@@ -253,12 +269,88 @@ def get_reference_path(voice_filename: str) -> Path:
         voice_path = wav_path
     
     # Cache the validated reference
-    validated_references[voice_filename] = {
-        "path": voice_path,
-        "duration": duration
-    }
-    
-    return voice_path
+    return voice_cache.put(VoiceEntry(voice_filename, voice_path, duration))
+
+
+def load_stored_voice(voice_filename: str, record: dict) -> VoiceEntry:
+    """VoiceEntry from a voice_store record (canonical audio and, for this engine, the prompt)."""
+    entry = VoiceEntry(voice_filename, REF_DIR / record["canonical"], record["duration"])
+    entry.audio = voice_store.load_audio(record)
+    if entry.audio is not None:
+        entry.sample_rate = record["sample_rate"]
+    map_location = "cuda:0" if str(device).startswith("cuda") else "cpu"
+    try:
+        entry.prompt = voice_store.load_prompt(record, embedder_key(tts), map_location=map_location)
+    except Exception as e:
+        log.warning("Stored prompt for %s unusable (%s); recomputing on use", voice_filename, e)
+    return entry
+
+
+def warm_stored_voices() -> int:
+    """Load precomputed voices into the cache at startup (up to its capacity)."""
+    loaded = 0
+    for name in list(voice_store.records())[:voice_cache.max_unpinned]:
+        try:
+            get_voice_entry(name)
+            loaded += 1
+        except Exception as e:
+            log.warning("Could not load stored voice '%s': %s", name, e)
+    if loaded:
+        log.info("Loaded %d precomputed voices from %s", loaded, voice_store.root)
+    return loaded
+
+
+def get_voice_clone_prompt(voice_filename: str):
+    """
+    Return the cached voice clone prompt (speaker embedding) for a voice.
+    Returns None when the backend cannot build reusable prompts.
+    """
+    if not tts.can_embed:
+        return None
+
+    entry = get_voice_entry(voice_filename)
+    if entry.prompt is None:
+        with entry.lock:
+            if entry.prompt is None:
+                log.info("Computing voice clone prompt for %s", entry.path.name)
+                ref_audio = (entry.audio, entry.sample_rate) if entry.audio is not None else str(entry.path)
+                entry.prompt = tts.embed_speaker(ref_audio)
+    return entry.prompt
+
+
+def warm_voice(voice_filename: str, pin: bool = False) -> VoiceEntry:
+    """
+    Load a voice fully: metadata, canonical mono audio, and speaker prompt
+    With pin=True the voice stays resident until unpinned.
+    """
+    if pin:
+        voice_cache.pin(voice_filename)
+    try:
+        entry = get_voice_entry(voice_filename)
+        with entry.lock:
+            if entry.audio is None:
+                audio, sr = sf.read(str(entry.path), dtype="float32")
+                if audio.ndim > 1:
+                    audio = audio.mean(axis=1).astype(np.float32)
+                entry.audio, entry.sample_rate = audio, sr
+        get_voice_clone_prompt(voice_filename)
+        return entry
+    except Exception:
+        if pin:
+            voice_cache.unpin(voice_filename)
+        raise
+
+
+def warm_pinned_voices(names) -> None:
+    """Pin and warm the given voices, logging (not raising) failures."""
+    for name in names:
+        try:
+            entry = warm_voice(name, pin=True)
+            log.info("Pinned voice: %s (%.1fs)", name, entry.duration)
+        except HTTPException as e:
+            log.warning("Could not pin voice '%s': %s", name, e.detail)
+        except Exception as e:
+            log.warning("Could not pin voice '%s': %s", name, e)
 
 
 def _sanitize_reference_filename(raw_name: str) -> str:
@@ -290,6 +382,54 @@ def _choose_reference_target_name(upload_filename: str, desired_name: str | None
 
 app = FastAPI(title="Qwen3-TTS", version="1.0")
 
+# All model calls go through one priority queue; MAX_WORKERS bounds concurrent generations.
+# Within a priority, short lines run before long paragraphs (TTS_SCHED_AGING keeps long ones moving).
+# Compatible unseeded requests of similar predicted length that are queued when a worker
+# frees up share one model call (up to TTS_MAX_BATCH; 1 disables merging).
+# Clients with work already queued yield to the others in proportion to their quota weight
+# (TTS_FAIR_SHARE scales the effect; 0 disables it).
+scheduler = JobScheduler(
+    workers=int(os.environ.get("MAX_WORKERS", "1")),
+    aging=float(os.environ.get("TTS_SCHED_AGING", "1.0")),
+    max_batch=int(os.environ.get("TTS_MAX_BATCH", "4")),
+    length_ratio=float(os.environ.get("TTS_BATCH_LENGTH_RATIO", "2.0")),
+    fair_share=float(os.environ.get("TTS_FAIR_SHARE", "1.0")),
+)
+# Pipeline: scheduler workers only run the model; loudness, limiting and encoding run on
+# TTS_POST_WORKERS CPU threads behind a TTS_POST_QUEUE-deep queue (full queue stalls the model).
+generate_meter = StageMeter("generate", workers=scheduler.stats()["workers"])
+post_stage = Stage(
+    "postprocess",
+    workers=int(os.environ.get("TTS_POST_WORKERS", "2")),
+    queue_size=int(os.environ.get("TTS_POST_QUEUE", "8")),
+)
+# Predicts generation time from text length, language and measured real-time factor per voice.
+cost_model = CostModel(default_rtf=float(os.environ.get("TTS_DEFAULT_RTF", "1.0")))
+# Interactive requests predicted to wait longer than this are refused with 503 (0 = never).
+MAX_PREDICTED_WAIT = float(os.environ.get("TTS_MAX_PREDICTED_WAIT", "0"))
+# Deadline for requests that send none (0 = wait as long as the client stays connected).
+DEFAULT_DEADLINE_MS = int(os.environ.get("TTS_DEFAULT_DEADLINE_MS", "0"))
+# How often a waiting request checks whether its client has disconnected.
+DISCONNECT_POLL = float(os.environ.get("TTS_DISCONNECT_POLL", "0.25"))
+
+# Speculative results wait here for the real request (short-lived, size-bounded).
+SPECULATIVE_TTL = float(os.environ.get("TTS_SPECULATIVE_TTL", "120"))
+SPECULATIVE_MAX_QUEUED = int(os.environ.get("TTS_SPECULATIVE_MAX_QUEUED", "16"))
+response_cache = AudioCache(
+    max_bytes=int(float(os.environ.get("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024),
+    default_ttl=SPECULATIVE_TTL,
+)
+
+# Deterministic mode: unseeded requests get a seed derived from their content,
+# so identical requests produce identical audio and can be served from cache.
+# Every generation is then seeded, so generations run one at a time (MAX_WORKERS has
+# no effect) and requests are never merged into batched calls.
+DETERMINISTIC = os.environ.get("TTS_DETERMINISTIC", "0").strip().lower() in ("1", "true", "yes")
+RESPONSE_CACHE_TTL = float(os.environ.get("TTS_CACHE_TTL", "3600"))
+if DETERMINISTIC:
+    configure_deterministic_torch()
+rng_guard = RngGuard()
+
 # TTS request model (used by both endpoints)
 class TTSRequest(BaseModel):
     text: str
@@ -302,16 +442,197 @@ class TTSRequest(BaseModel):
     top_p: float = Field(0.9, ge=0.0, le=1.0)
     top_k: int = Field(50, ge=1, le=100)
     repetition_penalty: float = Field(1.0, ge=0.5, le=2.0)
+    # Fixed seed for reproducible sampling (also part of the response cache key).
+    seed: int | None = Field(default=None, ge=0, le=MAX_SEED)
+    # Output stage: wav | pcm (raw s16le) | opus, resampled/upmixed server-side (e.g. 48000 Hz stereo for Discord).
+    output_format: str = Field(default="wav")
+    sample_rate: int | None = Field(default=None, ge=8000, le=48000)
+    channels: int = Field(default=1, ge=1, le=2)
+    # Multiplier on the expected speaking time that caps generated audio (default TTS_LENGTH_SCALE).
+    length_scale: float | None = Field(default=None, gt=0.0, le=10.0)
+    # Give up after this many ms (also X-TTS-Deadline-Ms); queued work is dropped, running work aborted.
+    deadline_ms: int | None = Field(default=None, ge=1, le=3_600_000)
+
+
+# Batch limits: items per HTTP call, and items per model call.
+BATCH_MAX_ITEMS = int(os.environ.get("TTS_BATCH_MAX_ITEMS", "64"))
+BATCH_CHUNK_SIZE = max(1, int(os.environ.get("TTS_BATCH_CHUNK_SIZE", "8")))
+
+
+class TTSSpeculateRequest(TTSRequest):
+    # Client session; a new speculation supersedes the session's queued ones.
+    session: str = Field(default="default", min_length=1, max_length=128)
+
+
+class TTSBatchRequest(BaseModel):
+    # Items are validated one by one so a bad item doesn't reject the whole batch.
+    items: list[dict] = Field(..., min_length=1)
+    format: str = Field(default="ndjson")  # ndjson | zip | multipart
+
+# =======================
+# CLIENTS AND QUOTAS
+# =======================
+
+# Clients are identified by API key (X-API-Key or Authorization: Bearer, configured in
+# TTS_CLIENTS_FILE), else accounted by their address (X-TTS-Client only labels them).
+# TTS_TRUSTED_PROXIES (comma-separated addresses, e.g. the gateway) are believed about
+# X-Forwarded-For. Quotas are token buckets per minute over requests and synthesized
+# audio-seconds (0 = unlimited).
+_default_quota = Quota(
+    requests_per_minute=float(os.environ.get("TTS_RATE_REQUESTS_PER_MIN", "0")),
+    audio_seconds_per_minute=float(os.environ.get("TTS_RATE_AUDIO_S_PER_MIN", "0")),
+)
+_require_key = os.environ.get("TTS_REQUIRE_API_KEY", "0").strip().lower() in ("1", "true", "yes")
+_clients_file = os.environ.get("TTS_CLIENTS_FILE", "").strip()
+_trusted_proxies = [p.strip() for p in os.environ.get("TTS_TRUSTED_PROXIES", "").split(",") if p.strip()]
+client_registry = (
+    ClientRegistry.from_file(Path(_clients_file).expanduser(), _default_quota, _require_key, _trusted_proxies)
+    if _clients_file else ClientRegistry(_default_quota, require_key=_require_key, trusted_proxies=_trusted_proxies)
+)
+# TTS_RATE_LIMIT_DB shares buckets and counters between worker processes (SQLite file).
+_rate_db = os.environ.get("TTS_RATE_LIMIT_DB", "").strip()
+rate_limiter = RateLimiter(SqliteStore(Path(_rate_db).expanduser()) if _rate_db else None)
+
+
+def identify_client(headers, address: str | None) -> Client:
+    """Client for a request's headers; raises HTTPException(401) for a bad or missing API key."""
+    auth = headers.get("authorization", "")
+    api_key = headers.get("x-api-key") or (auth[7:] if auth.lower().startswith("bearer ") else None)
+    try:
+        return client_registry.identify(api_key, headers.get("x-tts-client"), address, headers.get("x-forwarded-for"))
+    except PermissionError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+
+def admit_client(client: Client, requests: int = 1) -> None:
+    """Spend the client's request tokens; raises HTTPException(429) with Retry-After when limited."""
+    try:
+        rate_limiter.admit(client, requests)
+    except RateLimited as e:
+        log.info("Rate limited: %s", e, extra=fields(client=client.id))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+def request_client(request: Request, requests: int = 1) -> Client:
+    """Identify and admit the caller of an HTTP request."""
+    client = identify_client(request.headers, request.client.host if request.client else None)
+    admit_client(client, requests)
+    return client
+
+
+def fair_share(job: dict) -> dict:
+    """Scheduler client/weight arguments for a job (empty for server-internal work)."""
+    client = job.get("client")
+    return {"client": client.account, "weight": client.quota.weight} if client is not None else {}
+
+# =======================
+# QUALITY TIERS
+# =======================
+
+# Load-adaptive quality (TTS_QUALITY_GOVERNOR): under load, serve slightly cheaper audio on time
+# rather than full quality late. One tier down while TTS_QUALITY_DOWN_QUEUE interactive and batch
+# jobs are queued or recent generations run at TTS_QUALITY_DOWN_RTF or slower; one tier back up
+# once both stay at or below the _UP_ thresholds for TTS_QUALITY_UP_HOLD_S.
+QUALITY_GOVERNOR = os.environ.get("TTS_QUALITY_GOVERNOR", "0").strip().lower() in ("1", "true", "yes")
+_tiers_file = os.environ.get("TTS_QUALITY_TIERS_FILE", "").strip()
+_quality_tiers = load_tiers(Path(_tiers_file).expanduser() if _tiers_file else None)
+quality_governor = LoadGovernor(
+    _quality_tiers if QUALITY_GOVERNOR else _quality_tiers[:1],
+    down_queue=int(os.environ.get("TTS_QUALITY_DOWN_QUEUE", "8")),
+    down_rtf=float(os.environ.get("TTS_QUALITY_DOWN_RTF", "1.0")),
+    up_queue=int(os.environ.get("TTS_QUALITY_UP_QUEUE", "2")),
+    up_rtf=float(os.environ.get("TTS_QUALITY_UP_RTF", "0.7")),
+    down_hold=float(os.environ.get("TTS_QUALITY_DOWN_HOLD_S", "2")),
+    up_hold=float(os.environ.get("TTS_QUALITY_UP_HOLD_S", "15")),
+    window=float(os.environ.get("TTS_QUALITY_WINDOW_S", "30")),
+)
+FULL_QUALITY = quality_governor.tiers[0]
+
+# Smaller model for tiers with "lite_model" (e.g. Qwen/Qwen3-TTS-12Hz-0.6B-Base), loaded next to
+# the main one. ONNX exports belong to one model, so an onnx deployment runs it on torch.
+_lite_model = os.environ.get("TTS_LITE_MODEL", "").strip()
+lite_tts = None
+if _lite_model and QUALITY_GOVERNOR:
+    try:
+        lite_tts = create_backend("torch" if tts.name == "onnx" else tts.name, _lite_model)
+        lite_tts.load()
+    except Exception as e:
+        log.warning("Lite model %s not loaded (tiers will only cap settings): %s", _lite_model, e)
+        lite_tts = None
+
+
+@lru_cache(maxsize=64)
+def _lite_speaker(path: str, mtime_ns: int):
+    return lite_tts.embed_speaker(path)
+
+
+def lite_voice_prompt(ref_path: Path):
+    """Speaker prompt for the lite model (None when it can't build reusable prompts)."""
+    if not lite_tts.can_embed:
+        return None
+    return _lite_speaker(str(ref_path), ref_path.stat().st_mtime_ns)
+
+
+def quality_request(req: TTSRequest, job: dict, key: str) -> tuple[TTSRequest, dict, str]:
+    """
+    A prepared request as the current quality tier serves it: (req, job, key), with
+    job["quality"] naming the tier. Seeded requests keep their settings, and so do
+    requests that a phrase, a cached render or an in-flight job already serves at full quality.
+    """
+    tier = quality_governor.update(scheduler.depth(PRIORITY_BATCH))
+    keep = (tier is FULL_QUALITY or req.seed is not None or key in response_cache
+            or scheduler.find(key) is not None or has_phrase(job, req))
+    if keep:
+        job["quality"] = FULL_QUALITY.name
+        return req, job, key
+    changes = tier.degrade(
+        req.top_k,
+        req.length_scale or length_governor.scale,
+        req.voice_description,
+        None if req.sample_rate else tts.sr,
+    )
+    lite = tier.lite_model and lite_tts is not None
+    if changes or lite:
+        req = req.model_copy(update=changes)
+        job = {**prepare_tts_job(req, job["ref_path"]),
+               **{k: job[k] for k in ("client", "deadline") if k in job}}
+        if lite:
+            job["model"] = lite_tts.model_id
+        key = tts_cache_key(job, req)
+    job["quality"] = tier.name
+    return req, job, key
 
 # =======================
 # TEXT CLEANING
 # =======================
 
-def clean_text(text: str) -> str:
-    """Clean and prepare text by removing control chars (0x00-0x1f, 0x7f) for multilingual input."""
-    text = text.strip()
-    text = re.sub(r"[\x00-\x1f\x7f]", "", text)
-    return text[:600]
+def clean_text(text: str, language: str = "Auto") -> tuple[str, str]:
+    """Normalize chat text (Discord markup, repetition, numbers) and resolve the language.
+
+    Returns (cleaned_text, language) where language is the supported model
+    spelling, or "Auto" when it was requested and could not be detected.
+    """
+    cleaned, resolved = prepare_text(text, language)
+    if resolved != language and SUPPORTED_LOWER:
+        # Auto-detected: only pin languages the model knows, otherwise let it decide.
+        return cleaned, SUPPORTED_LOWER.get(resolved.lower(), "Auto")
+    return cleaned, resolve_language(resolved)
+
+
+def resolve_language(language: str) -> str:
+    """Map a language name onto the model's supported spelling.
+
+    Raises ValueError for a language the model does not support.
+    """
+    language = (language or "").strip() or "Auto"
+    if language == "Auto" or not SUPPORTED_LOWER:
+        return language
+    normalized = SUPPORTED_LOWER.get(language.lower())
+    if normalized:
+        return normalized
+    raise ValueError(
+        f"Unsupported language '{language}'. Supported: {sorted(SUPPORTED_LANGUAGES)}"
+    )
 
 
 _EMOTION_PRESETS: dict[str, str] = {
@@ -328,169 +649,1217 @@ _EMOTION_PRESETS: dict[str, str] = {
 
 def clean_voice_description(text: str) -> str:
     """Sanitize a short style prompt for the model (control chars removed, bounded length)."""
-    text = (text or "").strip()
-    text = re.sub(r"[\x00-\x1f\x7f]", "", text)
-    return text[:200]
+    return clean_description(text)
+
+
+def resolve_style(req: TTSRequest) -> str:
+    """Pick the style prompt: custom voice_description, else the emotion preset."""
+    style = clean_voice_description(req.voice_description or "")
+    if not style:
+        key = (req.emotion or "Neutral").strip().lower()
+        style = _EMOTION_PRESETS.get(key, _EMOTION_PRESETS["neutral"])
+    return style
 
 # =======================
 # DEBUG HELPERS
 # =======================
 
 def log_audio_stats(tag: str, audio: np.ndarray, sr: int):
-    """Log detailed audio statistics for debugging"""
-    peak = float(np.max(np.abs(audio)))
-    rms = float(np.sqrt(np.mean(audio ** 2)))
-    clipped = int(np.sum(np.abs(audio) >= 1.0))
-
-    print(
-        f"[DEBUG] {tag}:\n"
-        f"        SR={sr}\n"
-        f"        dtype={audio.dtype}\n"
-        f"        shape={audio.shape}\n"
-        f"        peak={peak:.4f}\n"
-        f"        rms={rms:.4f}\n"
-        f"        clipped_samples={clipped}"
-    )
+    """Log audio statistics at DEBUG; nothing is computed when DEBUG is off"""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    magnitude = np.abs(audio)
+    log.debug(tag, extra=fields(
+        sr=sr,
+        shape=audio.shape,
+        peak=round(float(magnitude.max(initial=0.0)), 4),
+        rms=round(float(np.sqrt(np.dot(audio, audio) / max(audio.size, 1))), 4),
+        clipped_samples=int(np.count_nonzero(magnitude >= 1.0)),
+    ))
 
 # =======================
-# FLOAT-SAFE LIMITER (WITH DEBUG)
+# FLOAT-SAFE LIMITER
 # =======================
 
-def peak_limit_float_debug(
-    path: Path,
-    target_dbfs: float = -1.0,
-):
-    """Apply peak limiting with detailed debug logging"""
-    audio, sr = sf.read(path, dtype="float32")
+def peak_limit_array(audio: np.ndarray, target_dbfs: float = -1.0) -> np.ndarray:
+    """Scale float audio so its peak sits at or below target_dbfs, then clip."""
+    audio = np.asarray(audio, dtype=np.float32)
+    peak = float(np.max(np.abs(audio))) if audio.size else 0.0
+    if peak <= 0:
+        return audio
 
+    target_peak = 10 ** (target_dbfs / 20.0)
+    gain = min(1.0, target_peak / peak)
+    return np.clip(audio * gain, -1.0, 1.0)
+
+
+# EBU R128 loudness target for generated speech ("off" keeps plain peak limiting).
+_loudness_target = os.environ.get("TTS_LOUDNESS_TARGET", "-16").strip().lower()
+LOUDNESS_TARGET = None if _loudness_target in ("", "off", "none") else float(_loudness_target)
+TRUE_PEAK_DB = float(os.environ.get("TTS_TRUE_PEAK_DB", "-1.0"))
+# Silence trimming: leading/trailing silence and internal pauses longer than TTS_TRIM_MAX_PAUSE_S.
+TRIM_SILENCE = os.environ.get("TTS_TRIM_SILENCE", "true").strip().lower() in ("1", "true", "yes", "on")
+TRIM_OPTIONS = {
+    "threshold_db": float(os.environ.get("TTS_TRIM_THRESHOLD_DB", str(DEFAULT_THRESHOLD_DB))),
+    "pad_seconds": float(os.environ.get("TTS_TRIM_PAD_S", str(DEFAULT_PAD_SECONDS))),
+    "max_pause_seconds": float(os.environ.get("TTS_TRIM_MAX_PAUSE_S", str(DEFAULT_MAX_PAUSE_SECONDS))),
+    "fade_seconds": float(os.environ.get("TTS_TRIM_FADE_MS", "10")) / 1000.0,
+}
+
+
+def finalize_audio(wavs: list, sr: int) -> tuple[list, list[float]]:
+    """
+    Trim silence, then loudness-normalize and true-peak limit a batch of generated
+    waveforms in one pass. Returns (wavs, seconds of silence removed per wav).
+    """
+    wavs = [np.asarray(w, dtype=np.float32).reshape(-1) for w in wavs]
+    trimmed = [0.0] * len(wavs)
+    if TRIM_SILENCE:
+        wavs, trimmed = trim_silence_batch(wavs, sr, **TRIM_OPTIONS)
+    if LOUDNESS_TARGET is None:
+        return wavs, trimmed
+    return normalize_loudness_batch(
+        wavs,
+        sr,
+        target_lufs=LOUDNESS_TARGET,
+        true_peak_ceiling_db=TRUE_PEAK_DB,
+    ), trimmed
+
+
+def encode_output(audio: np.ndarray, sr: int, req: TTSRequest) -> tuple[bytes, str, int]:
+    """
+    Peak-limit float audio and encode it in the request's output format/rate/channels.
+    Returns (data, media_type, sample_rate).
+    """
+    audio = np.asarray(audio, dtype=np.float32)
     if audio.ndim > 1:
         audio = audio[:, 0]
+    return encode_audio(peak_limit_array(audio, -1.0), sr, req.output_format, req.sample_rate, req.channels)
 
-    log_audio_stats("RAW FILE READ", audio, sr)
 
-    peak = np.max(np.abs(audio))
-    if peak <= 0:
-        print("[DEBUG] Silent audio, skipping limiter")
-        return
+# =======================
+# GENERATION
+# =======================
 
-    target_peak = 10 ** (target_dbfs / 20.0)
-    gain = min(1.0, target_peak / peak)
+def prepare_tts_job(req: TTSRequest, ref_path: Path | None = None) -> dict:
+    """
+    Resolve voice, language, text and style for a request.
+    Raises HTTPException for voice problems and ValueError for bad input.
+    """
+    if ref_path is None:
+        ref_path = get_reference_path(req.voice)
+
+    # Validate an explicit language before doing any work.
+    language = req.language.strip() or "Auto"
+    if language != "Auto":
+        language = resolve_language(language)
+
+    validate_output(req.output_format, req.sample_rate, req.channels)
+
+    # Normalize the text; "Auto" is resolved by the fast detector when possible.
+    cleaned_text, language = clean_text(req.text, language)
+    if not cleaned_text:
+        raise ValueError("Text is empty after normalization")
+
+    job = {
+        "voice": req.voice,
+        "ref_path": ref_path,
+        "text": cleaned_text,
+        "language": language,
+        "style": resolve_style(req),
+        "max_frames": length_governor.budget(cleaned_text, language, req.length_scale),
+    }
+    if req.seed is not None:
+        job["seed"] = req.seed
+    elif DETERMINISTIC:
+        job["seed"] = derive_seed(tts_cache_key(job, req))
+    else:
+        job["seed"] = None
+    return job
 
-    print(f"[DEBUG] Applying gain: {gain:.4f}")
 
-    audio *= gain
-    audio = np.clip(audio, -1.0, 1.0)
+def _make_stop_criteria():
+    """
+    Build a transformers stopping criterion checked between decode steps, or
+    None when the backend can't take one. It stops every row once all
+    deadlines have expired, and single rows that fall into a loop.
+    """
+    if not tts.accepts("stopping_criteria"):
+        return None
+    try:
+        from transformers import StoppingCriteria, StoppingCriteriaList
+    except ImportError:
+        return None
+
+    class StopGeneration(StoppingCriteria):
+        def __init__(self, deadlines: list[Deadline] | None, loops: LoopDetector | None):
+            self.deadlines = deadlines
+            self.loops = loops
+
+        def __call__(self, input_ids, scores, **kwargs):
+            rows = input_ids.shape[0]
+            if self.deadlines and all(deadline.expired() for deadline in self.deadlines):
+                return torch.ones(rows, dtype=torch.bool, device=input_ids.device)
+            if self.loops is None:
+                return torch.zeros(rows, dtype=torch.bool, device=input_ids.device)
+            window = input_ids[:, -self.loops.window:].cpu().numpy()
+            return torch.tensor(self.loops.check(window), dtype=torch.bool, device=input_ids.device)
+
+    return lambda deadlines, loops: StoppingCriteriaList([StopGeneration(deadlines, loops)])
+
+
+# Deadlines and loop detection are checked between decode steps; without a criterion,
+# expired jobs are still dropped from the queue and generations are still length-capped.
+stop_criteria = _make_stop_criteria()
+log.info("Mid-generation stop (deadlines, loops): %s", "enabled" if stop_criteria else "unavailable")
+# Frame budget per generation from the text's expected speaking time.
+length_governor = LengthGovernor(
+    frame_rate=float(os.environ.get("TTS_CODEC_FRAME_RATE", str(DEFAULT_FRAME_RATE))),
+    scale=float(os.environ.get("TTS_LENGTH_SCALE", "2.0")),
+    pad_seconds=float(os.environ.get("TTS_LENGTH_PAD_S", "1.5")),
+    max_seconds=float(os.environ.get("TTS_MAX_AUDIO_S", "60")),
+    loop_seconds=float(os.environ.get("TTS_LOOP_STOP_S", "2.0")),
+)
+
+
+def job_expired(job: dict) -> bool:
+    deadline = job.get("deadline")
+    return deadline is not None and deadline.expired()
+
+
+def generate_tts_batch(jobs: list[dict], req: TTSRequest) -> tuple[list, int]:
+    """
+    Run one backend call for jobs sharing a voice, style and sampling settings.
+    Returns (wavs, sample_rate) with one waveform per job. Output is capped at
+    the jobs' frame budget; decoding stops early (truncated output) when every
+    job has a deadline and all of them expire, and per row on a token loop.
+    """
+    texts = [job["text"] for job in jobs]
+    languages = [job["language"] for job in jobs]
+    single = len(jobs) == 1
+
+    # Jobs degraded to a lite-model tier run on the smaller model.
+    engine = lite_tts if jobs[0].get("model") else tts
+    if engine is tts:
+        speaker = get_voice_clone_prompt(jobs[0]["voice"])
+    else:
+        speaker = lite_voice_prompt(jobs[0]["ref_path"])
+    options = {}
+    budget = max(job["max_frames"] for job in jobs)
+    if engine.accepts("max_new_tokens"):
+        options["max_new_tokens"] = budget
+    stop = stop_criteria if engine.accepts("stopping_criteria") else None
+    loops = length_governor.loop_detector() if stop is not None else None
+    if stop is not None:
+        deadlines = [job.get("deadline") for job in jobs]
+        options["stopping_criteria"] = stop(None if None in deadlines else deadlines, loops)
+
+    # Seeded calls run alone so no other generation advances the shared RNGs.
+    with rng_guard.generation(jobs[0].get("seed")):
+        start = time.perf_counter()
+        wavs, sample_rate = engine.generate(
+            texts,
+            languages,
+            speaker=speaker,
+            ref_audio=str(jobs[0]["ref_path"]),
+            style=jobs[0]["style"],
+            temperature=req.temperature,
+            top_p=req.top_p,
+            top_k=req.top_k,
+            repetition_penalty=req.repetition_penalty,
+            **options,
+        )
+        elapsed = time.perf_counter() - start
+
+    if not wavs or len(wavs) < len(jobs):
+        raise RuntimeError(f"No audio returned from the {engine.name} backend (check input text, reference audio, and model status)")
+    quality_governor.observe(elapsed, max(len(wav) for wav in wavs[:len(jobs)]) / sample_rate)
+    for row, job in enumerate(jobs):
+        loop = loops.loops.get(row) if loops is not None else None
+        if loop:
+            wavs[row] = length_governor.trim_loop(np.asarray(wavs[row]).reshape(-1), sample_rate, loop)
+        if length_governor.observe(len(wavs[row]) / sample_rate, budget, bool(loop)):
+            log.info("Generation hit its length budget", extra=fields(voice=job["voice"], frames=budget))
+    if single and engine is tts and not job_expired(jobs[0]):
+        # Batched calls amortize overhead, aborted ones are truncated and lite-model calls run
+        # on another model: none of them trains the cost model.
+        cost_model.observe(len(texts[0]), languages[0], jobs[0]["voice"], elapsed, len(wavs[0]) / sample_rate)
+    return wavs, sample_rate
+
+
+def estimate_cost(jobs: list[dict]) -> float:
+    """Predicted seconds of model time for a list of prepared jobs."""
+    return sum(cost_model.estimate(len(job["text"]), job["language"], job["voice"]) for job in jobs)
+
+def tts_cache_key(job: dict, req: TTSRequest) -> str:
+    """Fingerprint of everything that shapes the generated audio."""
+    return make_cache_key(
+        voice=str(job["ref_path"]),
+        text=job["text"],
+        language=job["language"],
+        style=job["style"],
+        temperature=req.temperature,
+        top_p=req.top_p,
+        top_k=req.top_k,
+        repetition_penalty=req.repetition_penalty,
+        seed=job.get("seed"),
+        length_scale=req.length_scale,
+        output=(req.output_format.strip().lower(), req.sample_rate, req.channels),
+        # Only lite-model renders carry a model, so full-model keys (and derived seeds) are unchanged.
+        **({"model": job["model"]} if job.get("model") else {}),
+    )
 
-    log_audio_stats("AFTER GAIN STAGING", audio, sr)
 
-    sf.write(path, audio, sr, subtype="PCM_16")
+def generation_group(job: dict, req: TTSRequest) -> tuple | None:
+    """
+    Jobs with equal groups can share one model call (same voice, style and sampling).
+    Seeded jobs return None: they must run alone to be reproducible.
+    """
+    if job["seed"] is not None:
+        return None
+    return (str(job["ref_path"]), job.get("model"), job["style"], req.temperature, req.top_p, req.top_k,
+            req.repetition_penalty)
+
+
+def generate_stage(jobs: list[dict], req: TTSRequest) -> tuple[list, int]:
+    """
+    Model stage (runs on a scheduler worker): raw waveforms for one model call.
+    Generated audio is charged to the clients whose jobs it was for.
+    """
+    try:
+        with generate_meter.timed():
+            wavs, sample_rate = generate_tts_batch(jobs, req)
+        for job, wav in zip(jobs, wavs):
+            if job.get("client") is not None:
+                rate_limiter.charge_audio(job["client"], len(wav) / sample_rate)
+        return wavs, sample_rate
+    finally:
+        if str(device).startswith("cuda"):
+            torch.cuda.empty_cache()
+        gc.collect()
+
+
+def postprocess_stage(items: list[tuple], wavs: list, sample_rate: int) -> list:
+    """
+    CPU stage: loudness, limiter and encoding for (job, req, key, ttl) items.
+    Returns encoded audio (or the encoding error) per item; cached when ttl is set.
+    """
+    log_audio_stats("Model output", wavs[0], sample_rate)
+    wavs, trimmed = finalize_audio(wavs[:len(items)], sample_rate)
+    results = []
+    for (job, req, key, ttl), wav, removed in zip(items, wavs, trimmed):
+        if job_expired(job):
+            results.append(DeadlineExceeded("Deadline passed during generation"))
+            continue
+        try:
+            audio = EncodedAudio.wrap(encode_output(wav, sample_rate, req)[0], len(wav) / sample_rate, removed)
+        except Exception as e:
+            results.append(e)
+            continue
+        if ttl:
+            response_cache.put(key, audio, ttl=ttl)
+        results.append(audio)
+    return results
+
+
+def synthesize_group(items: list[tuple[dict, TTSRequest, str, float | None]]) -> Future:
+    """
+    Scheduler batch_fn: one model call for (job, req, key, ttl) items of one group,
+    then post-processing handed to the CPU stage. Resolves to one result per item.
+    Model time spent on items whose deadline passed is reported as wasted.
+    """
+    jobs = [job for job, _, _, _ in items]
+    start = time.perf_counter()
+    wavs, sample_rate = generate_stage(jobs, items[0][1])
+    expired = sum(job_expired(job) for job in jobs)
+    if expired:
+        scheduler.record_wasted((time.perf_counter() - start) * expired / len(jobs), expired)
+    if expired == len(jobs):
+        done = Future()
+        done.set_result([DeadlineExceeded("Deadline passed during generation")] * len(items))
+        return done
+    return post_stage.submit(postprocess_stage, items, wavs, sample_rate)
+
 
-    # Read back to verify no damage on write
-    verify, _ = sf.read(path, dtype="float32")
-    if verify.ndim > 1:
-        verify = verify[:, 0]
+def _first_result(results: list):
+    if isinstance(results[0], BaseException):
+        raise results[0]
+    return results[0]
+
+
+def synthesize_item(job: dict, req: TTSRequest, key: str, ttl: float | None) -> Future:
+    """Scheduler fn for one job: resolves to its encoded audio (cached when ttl is set)."""
+    return then(synthesize_group([(job, req, key, ttl)]), _first_result)
+
+
+def cache_ttl(job: dict) -> float:
+    """Seeded audio is reproducible and cached long; unseeded audio only briefly."""
+    return RESPONSE_CACHE_TTL if job.get("seed") is not None else SPECULATIVE_TTL
 
-    log_audio_stats("AFTER WAV WRITE (VERIFY)", verify, sr)
 
 # =======================
 # ENDPOINTS
 # =======================
 
+def _interactive_job(job: dict, req: TTSRequest, key: str) -> Future:
+    # Reproducible (seeded) output is cached so exact repeats are served from cache.
+    return synthesize_item(job, req, key, RESPONSE_CACHE_TTL if job["seed"] is not None else None)
+
+
+def submit_interactive(job: dict, req: TTSRequest, key: str):
+    """
+    Queue a generation at interactive priority; the Job carries predicted_wait.
+    Raises HTTPException(503) when the predicted wait exceeds TTS_MAX_PREDICTED_WAIT.
+    """
+    cost = estimate_cost([job])
+    predicted_wait = scheduler.predict_wait(PRIORITY_INTERACTIVE, cost, **fair_share(job))
+    if MAX_PREDICTED_WAIT and predicted_wait > MAX_PREDICTED_WAIT:
+        log.warning("Refusing request: predicted wait %.1fs", predicted_wait)
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy: predicted wait {predicted_wait:.1f}s",
+            headers={"Retry-After": str(int(predicted_wait) + 1)},
+        )
+    return scheduler.submit(
+        lambda: _interactive_job(job, req, key),
+        PRIORITY_INTERACTIVE,
+        key=key,
+        cost=cost,
+        batch_key=generation_group(job, req),
+        batch_fn=synthesize_group,
+        payload=(job, req, key, None),
+        deadline=job.get("deadline"),
+        **fair_share(job),
+    )
+
+
+def find_or_submit(job: dict, req: TTSRequest, key: str):
+    """
+    Serve from the phrase library or cache, join an in-flight identical job, or queue a new one.
+    Returns (cache_status, audio or None, pending Job or None).
+    """
+    audio = find_phrase(job, req)
+    if audio is not None:
+        return "phrase", audio, None
+    audio = response_cache.get(key)
+    if audio is not None:
+        return "hit", audio, None
+    # A speculative (or concurrent identical) job may already be on it.
+    pending = scheduler.find(key)
+    if pending is not None:
+        scheduler.promote(pending, PRIORITY_INTERACTIVE)
+        if pending.deadline is not None:
+            pending.deadline.join(job.get("deadline"))
+        return "joined", None, pending
+    return "miss", None, submit_interactive(job, req, key)
+
+
+def request_deadline(req: TTSRequest, request: Request | None = None) -> Deadline:
+    """The request's Deadline: deadline_ms, else the X-TTS-Deadline-Ms header, else the server default."""
+    ms = req.deadline_ms
+    if ms is None and request is not None and request.headers.get("x-tts-deadline-ms"):
+        try:
+            ms = int(request.headers["x-tts-deadline-ms"])
+        except ValueError:
+            raise ValueError("X-TTS-Deadline-Ms must be an integer number of milliseconds")
+        if ms < 1:
+            raise ValueError("X-TTS-Deadline-Ms must be at least 1")
+    return Deadline.after(ms if ms is not None else DEFAULT_DEADLINE_MS)
+
+
+def client_disconnected(request: Request) -> bool:
+    """From a sync endpoint's worker thread: has the HTTP client gone away?"""
+    try:
+        return anyio.from_thread.run(request.is_disconnected)
+    except Exception:
+        return False
+
+
+def wait_for_job(pending, request: Request, expires_at: float | None) -> bytes:
+    """
+    Block until the job finishes, the request's deadline passes or the client
+    disconnects. Giving up leaves the job's Deadline, so a job nobody waits
+    for any more is dropped from the queue or aborted mid-generation.
+    """
+    try:
+        while True:
+            timeout = DISCONNECT_POLL
+            if expires_at is not None:
+                timeout = min(timeout, max(expires_at - time.monotonic(), 0.0))
+            try:
+                return pending.future.result(timeout=timeout)
+            except FutureTimeout:
+                pass
+            if expires_at is not None and time.monotonic() >= expires_at:
+                raise DeadlineExceeded("Deadline passed before the audio was ready")
+            if client_disconnected(request):
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    except (DeadlineExceeded, HTTPException):
+        if pending.deadline is not None:
+            pending.deadline.leave()
+        raise
+
+
 @app.post("/api/tts")
-def api_tts_endpoint(req: TTSRequest):
+def api_tts_endpoint(req: TTSRequest, request: Request):
     """
     TTS endpoint for client compatibility
     Accepts 'text' and 'voice' parameters with optional advanced settings
     """
     
-    print(f"[DEBUG] API endpoint called")
-    print(f"[DEBUG] Text: {req.text}")
-    print(f"[DEBUG] Voice: {req.voice}")
-    print(f"[DEBUG] Language: {req.language}")
-    print(f"[DEBUG] Emotion: {req.emotion}")
-    print(f"[DEBUG] Voice description (custom): {bool(req.voice_description and req.voice_description.strip())}")
-    
+    debug = log.isEnabledFor(logging.DEBUG)
+    start = time.perf_counter()
+    client = request_client(request)
+
     # Get the reference audio path
     ref_path = get_reference_path(req.voice)
+
+    try:
+        job = prepare_tts_job(req, ref_path)
+        job["client"] = client
+        job["deadline"] = request_deadline(req, request)
+        expires_at = job["deadline"].at  # joiners may extend the shared Deadline, not ours
+        req, job, key = quality_request(req, job, tts_cache_key(job, req))
+        cache_status, audio, pending = find_or_submit(job, req, key)
+        if audio is None:
+            try:
+                audio = wait_for_job(pending, request, expires_at)
+            except JobCancelled:
+                # The job we joined was cancelled before it ran: render it ourselves.
+                job["deadline"] = Deadline(expires_at)
+                cache_status, pending = "miss", submit_interactive(job, req, key)
+                audio = wait_for_job(pending, request, expires_at)
+        predicted_wait = pending.predicted_wait if cache_status == "miss" else None
+        quality_governor.record(job["quality"])
+
+        if debug:
+            log.debug("TTS request", extra=fields(
+                voice=req.voice,
+                language=job["language"],
+                emotion=req.emotion,
+                custom_style=bool(req.voice_description and req.voice_description.strip()),
+                chars=len(job["text"]),
+                cache=cache_status,
+                quality=job["quality"],
+                client=client.id,
+                ms=round((time.perf_counter() - start) * 1000),
+            ))
+
+        fmt = req.output_format.strip().lower()
+        headers = {
+            "Content-Disposition": f"attachment; filename=out.{FORMAT_EXTENSIONS[fmt]}",
+            "X-TTS-Cache": cache_status,
+            "X-TTS-Client": client.id,
+            "X-TTS-Quality": job["quality"],
+        }
+        if predicted_wait is not None:
+            headers["X-TTS-Predicted-Wait"] = f"{predicted_wait:.2f}"
+        if job["seed"] is not None:
+            headers["X-TTS-Seed"] = str(job["seed"])
+        if getattr(audio, "duration", None) is not None:
+            # Playback length after silence trimming, so clients can schedule back-to-back clips.
+            headers["X-TTS-Duration"] = f"{audio.duration:.3f}"
+            headers["X-TTS-Trimmed"] = f"{audio.trimmed:.3f}"
+        if key in response_cache:
+            # Stable GET URL for Range requests and proxy revalidation.
+            headers["Content-Location"] = f"/api/tts/audio/{key}"
+
+        # Return the audio file (ETag / If-None-Match / Range aware)
+        max_age = RESPONSE_CACHE_TTL if job["seed"] is not None else 0
+        out_type = media_type(fmt, req.sample_rate or tts.sr, req.channels)
+        return audio_response(request, audio, media_type=out_type, headers=headers, max_age=max_age)
+
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        log.info("TTS request dropped: %s", e)
+        raise HTTPException(status_code=504, detail=f"Deadline exceeded: {e}")
+    except ValueError as e:
+        log.warning("TTS request validation failed: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.exception("TTS generation failed: %s", e)
+        raise HTTPException(status_code=500, detail=f"TTS generation failed: {str(e)}")
+
+@app.post("/tts")
+def tts_endpoint(req: TTSRequest, request: Request):
+    """TTS endpoint with full parameter control - same as /api/tts"""
     
-    with NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-        out_path = Path(tmp.name)
+    # Both endpoints now work identically
+    return api_tts_endpoint(req, request)
+
 
+@app.api_route("/api/tts/audio/{key}", methods=["GET", "HEAD"])
+def api_tts_audio(key: str, request: Request):
+    """Cached audio by fingerprint (the Content-Location of /api/tts responses)"""
+    audio = response_cache.get(key)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Audio not cached (expired or never rendered)")
+    return audio_response(request, audio, media_type=sniff_media_type(audio), max_age=0)
+
+# =======================
+# WEBSOCKET SESSIONS
+# =======================
+
+# Flow-control window: requests one connection may have queued or rendering at once.
+WS_MAX_INFLIGHT = max(1, int(os.environ.get("TTS_WS_MAX_INFLIGHT", "16")))
+WS_SETTINGS = set(TTSRequest.model_fields) - {"text"}
+
+
+class TTSSocketSession:
+    """
+    One /ws connection: session defaults, in-flight requests and serialized sends.
+    Requests run concurrently (pipelined) and results are sent as they finish,
+    tagged with the client's request id; see ws_protocol.py for the framing.
+    """
+
+    def __init__(self, websocket: WebSocket, client: Client):
+        self.websocket = websocket
+        self.client = client
+        self.defaults: dict = {}
+        self.tasks: dict[str, asyncio.Task] = {}
+        self.jobs: dict[str, object] = {}  # scheduler jobs this session queued (cancellable)
+        self.deadlines: dict[str, Deadline] = {}  # shared Deadlines of jobs this session waits on
+        self.send_lock = asyncio.Lock()
+        self.counter = 0
+
+    async def send_json(self, message: dict):
+        async with self.send_lock:
+            await self.websocket.send_text(json.dumps(message))
+
+    async def send_error(self, request_id, status: int, detail, **extra):
+        await self.send_json({"type": "error", "id": request_id, "status": status, "error": detail, **extra})
+
+    async def handle(self, raw: str):
+        message = parse_client_message(raw)
+        kind = message.get("type")
+        if kind == "config":
+            await self.configure(message)
+        elif kind == "tts":
+            await self.start(message)
+        elif kind == "cancel":
+            await self.cancel(str(message.get("id", "")))
+        elif kind == "ping":
+            await self.send_json({"type": "pong", "id": message.get("id")})
+        else:
+            await self.send_error(message.get("id"), 400, f"Unknown message type '{kind}'. Supported: {list(MESSAGE_TYPES)}")
+
+    async def configure(self, message: dict):
+        """Set defaults for later requests; fields merge over earlier config."""
+        settings = message.get("defaults", {k: v for k, v in message.items() if k != "type"})
+        unknown = set(settings) - WS_SETTINGS
+        if unknown:
+            await self.send_error(None, 400, f"Unknown settings: {sorted(unknown)}")
+            return
+        merged = {**self.defaults, **settings}
+        try:
+            req = TTSRequest.model_validate({"text": "-", "voice": "-", **merged})
+            validate_output(req.output_format, req.sample_rate, req.channels)
+            if "voice" in settings:
+                await asyncio.to_thread(get_reference_path, req.voice)
+        except ValidationError as e:
+            await self.send_error(None, 422, e.errors(include_url=False, include_context=False))
+            return
+        except ValueError as e:
+            await self.send_error(None, 400, str(e))
+            return
+        except HTTPException as e:
+            await self.send_error(None, e.status_code, e.detail)
+            return
+        self.defaults = merged
+        await self.send_json({"type": "config_ok", "defaults": merged})
+
+    async def start(self, message: dict):
+        self.counter += 1
+        request_id = str(message.get("id") or f"r{self.counter}")
+        if request_id in self.tasks:
+            await self.send_error(request_id, 409, "A request with this id is already in flight")
+            return
+        if len(self.tasks) >= WS_MAX_INFLIGHT:
+            await self.send_error(request_id, 429, f"Flow control: {WS_MAX_INFLIGHT} requests already in flight")
+            return
+        params = {**self.defaults, **{k: v for k, v in message.items() if k not in ("type", "id")}}
+        self.tasks[request_id] = asyncio.create_task(self.run(request_id, params))
+
+    async def run(self, request_id: str, params: dict):
+        try:
+            req = TTSRequest.model_validate(params)
+            admit_client(self.client)
+            job = await asyncio.to_thread(prepare_tts_job, req)
+            job["client"] = self.client
+            job["deadline"] = request_deadline(req)
+            req, job, key = await asyncio.to_thread(quality_request, req, job, tts_cache_key(job, req))
+            cache_status, audio, pending = find_or_submit(job, req, key)
+            if audio is None:
+                audio, cache_status = await self.wait(request_id, job, req, key, cache_status, pending)
+            quality_governor.record(job["quality"])
+
+            fmt = req.output_format.strip().lower()
+            header = {
+                "id": request_id,
+                "media_type": media_type(fmt, req.sample_rate or tts.sr, req.channels),
+                "cache": cache_status,
+                "quality": job["quality"],
+                "seed": job["seed"],
+                "language": job["language"],
+                "duration": getattr(audio, "duration", None),
+                "trimmed": getattr(audio, "trimmed", None),
+            }
+            frame = encode_audio_frame(header, audio)
+            async with self.send_lock:
+                await self.websocket.send_bytes(frame)
+        except asyncio.CancelledError:
+            raise
+        except ValidationError as e:
+            await self.send_error(request_id, 422, e.errors(include_url=False, include_context=False))
+        except HTTPException as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            extra = {"retry_after": int(retry_after)} if retry_after else {}
+            await self.send_error(request_id, e.status_code, e.detail, **extra)
+        except DeadlineExceeded as e:
+            await self.send_error(request_id, 504, f"Deadline exceeded: {e}")
+        except ValueError as e:
+            await self.send_error(request_id, 400, str(e))
+        except Exception as e:
+            log.exception("WebSocket TTS request %s failed: %s", request_id, e)
+            await self.send_error(request_id, 500, f"TTS generation failed: {str(e)}")
+        finally:
+            self.tasks.pop(request_id, None)
+            self.jobs.pop(request_id, None)
+            self.deadlines.pop(request_id, None)
+
+    async def wait(self, request_id, job, req, key, cache_status, pending):
+        """Await a queued or joined job without blocking the event loop."""
+        expires_at = job["deadline"].at  # joiners may extend the shared Deadline, not ours
+        self.track(request_id, pending, cache_status)
+        await self.send_json({
+            "type": "queued",
+            "id": request_id,
+            "cache": cache_status,
+            "predicted_wait": round(pending.predicted_wait, 2) if cache_status == "miss" else None,
+        })
+        try:
+            return await self.await_job(request_id, pending, expires_at), cache_status
+        except JobCancelled:
+            if cache_status == "miss":
+                raise asyncio.CancelledError()
+            # The job we joined was cancelled before it ran: render it ourselves.
+            job["deadline"] = Deadline(expires_at)
+            pending = submit_interactive(job, req, key)
+            self.track(request_id, pending, "miss")
+            return await self.await_job(request_id, pending, expires_at), "miss"
+
+    def track(self, request_id: str, pending, cache_status: str):
+        if cache_status == "miss":
+            self.jobs[request_id] = pending
+        if pending.deadline is not None:
+            self.deadlines[request_id] = pending.deadline
+
+    async def await_job(self, request_id: str, pending, expires_at: float | None):
+        timeout = None if expires_at is None else max(expires_at - time.monotonic(), 0.0)
+        try:
+            # shield: cancelling this task must not cancel a future other requests may share.
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending.future)), timeout)
+        except asyncio.TimeoutError:
+            self.leave(request_id)
+            raise DeadlineExceeded("Deadline passed before the audio was ready")
+
+    def leave(self, request_id: str):
+        """Stop waiting on a job; once nobody waits, it is dropped or aborted mid-generation."""
+        deadline = self.deadlines.pop(request_id, None)
+        if deadline is not None:
+            deadline.leave()
+
+    async def cancel(self, request_id: str):
+        """Drop a request: queued jobs are removed, running ones aborted if no one else waits."""
+        task = self.tasks.pop(request_id, None)
+        if task is None:
+            await self.send_error(request_id, 404, "No request with this id in flight")
+            return
+        job = self.jobs.pop(request_id, None)
+        state = "queued" if job is not None and scheduler.cancel(job.id) else "running"
+        self.leave(request_id)
+        task.cancel()
+        await self.send_json({"type": "cancelled", "id": request_id, "state": state})
+
+    def close(self):
+        for request_id, task in list(self.tasks.items()):
+            job = self.jobs.get(request_id)
+            if job is not None:
+                scheduler.cancel(job.id)
+            self.leave(request_id)
+            task.cancel()
+        self.tasks.clear()
+        self.jobs.clear()
+
+
+@app.websocket("/ws")
+async def tts_websocket(websocket: WebSocket):
+    """
+    Persistent bot session: set defaults once with a config message, then send
+    text frames; audio comes back as binary frames tagged with the request id.
+    """
+    await websocket.accept()
     try:
-        # Clean the text
-        cleaned_text = clean_text(req.text)
-        print(f"[DEBUG] Cleaned text: {cleaned_text}")
-
-        # Generate audio with Qwen3-TTS
-        language = req.language.strip() or "Auto"
-        if language != "Auto" and SUPPORTED_LANGUAGES:
-            supported_lower = {lang.lower(): lang for lang in SUPPORTED_LANGUAGES}
-            normalized = supported_lower.get(language.lower())
-            if not normalized:
-                raise ValueError(
-                    f"Unsupported language '{language}'. Supported: {sorted(SUPPORTED_LANGUAGES)}"
-                )
-            language = normalized
-
-        style = clean_voice_description(req.voice_description or "")
-        if not style:
-            key = (req.emotion or "Neutral").strip().lower()
-            style = _EMOTION_PRESETS.get(key, _EMOTION_PRESETS["neutral"])
-
-        # Use x_vector_only_mode to avoid requiring reference transcripts.
-        wavs, sample_rate = tts.generate_voice_clone(
-            text=cleaned_text,
-            language=language,
-            ref_audio=str(ref_path),
-            voice_description=style,
-            x_vector_only_mode=True,
-            temperature=req.temperature,
-            top_p=req.top_p,
-            top_k=req.top_k,
-            repetition_penalty=req.repetition_penalty
-        )
+        client = identify_client(websocket.headers, websocket.client.host if websocket.client else None)
+    except HTTPException as e:
+        await websocket.send_text(json.dumps({"type": "error", "id": None, "status": e.status_code, "error": e.detail}))
+        await websocket.close(code=1008)
+        return
+    session = TTSSocketSession(websocket, client)
+    await session.send_json({
+        "type": "ready",
+        "window": WS_MAX_INFLIGHT,
+        "settings": sorted(WS_SETTINGS),
+        "client": client.id,
+    })
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                await session.handle(message["text"])
+            else:
+                await session.send_error(None, 400, "Send requests as text frames")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.close()
+
+# =======================
+# PHRASE LIBRARY
+# =======================
 
-        if not wavs:
-            raise RuntimeError("No audio returned from Qwen3-TTS (check input text, reference audio, and model status)")
+# Stock lines per voice, rendered once in the background and served from memory-mapped packs.
+PHRASE_DIR = Path(os.environ.get("TTS_PHRASE_DIR", "").strip() or REF_DIR / ".phrases").expanduser().resolve()
+PHRASES_MAX = int(os.environ.get("TTS_PHRASES_MAX", "256"))
 
-        # Save the generated audio
-        sf.write(str(out_path), wavs[0], sample_rate)
 
-        print("[DEBUG] Inference complete")
+def reference_fingerprint(voice: str) -> str | None:
+    """Size and mtime of a voice's reference WAV: packs rendered from other audio are stale."""
+    try:
+        stat = (REF_DIR / voice).stat()
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
 
-        # Apply peak limiting with debug
-        peak_limit_float_debug(out_path, target_dbfs=-1.0)
 
-        # Return the audio file
-        return Response(
-            content=out_path.read_bytes(),
-            media_type="audio/wav",
-            headers={"Content-Disposition": "attachment; filename=out.wav"},
-        )
+phrase_library = PhraseLibrary(PHRASE_DIR, reference_fingerprint)
+
+
+class PhraseSetRequest(BaseModel):
+    # Phrase id -> text, e.g. {"greeting": "Welcome back!", "low_hp": "Careful, low health!"}
+    phrases: dict[str, str] = Field(..., min_length=1)
+    # /api/tts settings shared by every phrase (emotion, language, output_format, ...).
+    settings: dict = Field(default_factory=dict)
+
+
+def phrase_signature(job: dict, req: TTSRequest) -> str:
+    """What a rendered phrase must share with a request to stand in for it."""
+    return make_cache_key(
+        language=job["language"],
+        style=job["style"],
+        output=(req.output_format.strip().lower(), req.sample_rate, req.channels),
+    )
+
+
+def has_phrase(job: dict, req: TTSRequest) -> bool:
+    """Whether find_phrase would serve this request (without counting a hit)."""
+    return req.seed is None and phrase_library.has(Path(job["ref_path"]).name, job["text"], phrase_signature(job, req))
+
+
+def find_phrase(job: dict, req: TTSRequest) -> EncodedAudio | None:
+    """Pre-rendered phrase for this request's voice and text, if any (seeded requests never match)."""
+    if req.seed is not None:
+        return None
+    found = phrase_library.lookup(Path(job["ref_path"]).name, job["text"], phrase_signature(job, req))
+    if found is None:
+        return None
+    data, entry = found
+    return EncodedAudio.wrap(data, entry["duration"], entry["trimmed"])
+
+
+def prepare_phrases(definition: dict) -> list[tuple[str, dict, TTSRequest]]:
+    """Validate a phrase set; raises ValueError (or HTTPException) naming the bad phrase."""
+    items = []
+    for phrase_id, text in definition["phrases"].items():
+        if not PHRASE_ID_RE.match(phrase_id):
+            raise ValueError(f"Invalid phrase id '{phrase_id}': use 1-64 letters, digits, '.', '_' or '-'")
+        try:
+            req = TTSRequest.model_validate({**definition["settings"], "text": text, "voice": definition["voice"]})
+            items.append((phrase_id, prepare_tts_job(req), req))
+        except ValidationError as e:
+            raise ValueError(f"Phrase '{phrase_id}': {e.errors(include_url=False, include_context=False)}")
+        except ValueError as e:
+            raise ValueError(f"Phrase '{phrase_id}': {e}")
+    return items
+
+
+def render_phrase_set(definition: dict, items: list | None = None) -> None:
+    """Render every phrase at speculative priority, then write and swap in the voice's pack."""
+    voice = definition["voice"]
+    start = time.perf_counter()
+    try:
+        items = items if items is not None else prepare_phrases(definition)
+    except Exception as e:
+        log.warning("Phrase set for %s is invalid: %s", voice, getattr(e, "detail", e))
+        return
+    # Taken after prepare_phrases resolved (and converted) the reference audio.
+    reference = reference_fingerprint(voice)
+    pending = []
+    for phrase_id, job, req in items:
+        key = tts_cache_key(job, req)
+        pending.append((phrase_id, job, req, scheduler.submit(
+            lambda job=job, req=req, key=key: synthesize_item(job, req, key, None),
+            PRIORITY_SPECULATIVE,
+            key=key,
+            cost=estimate_cost([job]),
+            batch_key=generation_group(job, req),
+            batch_fn=synthesize_group,
+            payload=(job, req, key, None),
+        )))
+    clips = {}
+    for phrase_id, job, req, rendering in pending:
+        try:
+            audio = rendering.future.result()
+        except Exception as e:
+            log.warning("Phrase %s/%s failed to render: %s", voice, phrase_id, e)
+            continue
+        fmt = req.output_format.strip().lower()
+        clips[phrase_id] = (bytes(audio), {
+            "text": job["text"],
+            "match": normalize_phrase(job["text"]),
+            "signature": phrase_signature(job, req),
+            "media_type": media_type(fmt, req.sample_rate or tts.sr, req.channels),
+            "duration": audio.duration,
+            "trimmed": audio.trimmed,
+        })
+    if phrase_library.install(definition, clips, reference) is not None:
+        log.info("Phrase pack ready", extra=fields(
+            voice=voice, phrases=len(clips), failed=len(items) - len(clips),
+            s=round(time.perf_counter() - start, 1),
+        ))
+
+
+def start_phrase_render(definition: dict, items: list | None = None) -> None:
+    threading.Thread(
+        target=render_phrase_set, args=(definition, items), name=f"phrases-{definition['voice']}", daemon=True,
+    ).start()
+
+
+def phrase_status(voice: str) -> dict:
+    definition = phrase_library.definition(voice)
+    pack = phrase_library.pack(voice)
+    current = phrase_library.is_current(voice)
+    return {
+        "voice": voice,
+        "phrases": sorted(definition["phrases"]) if definition else [],
+        "rendered": sorted(pack.entries) if pack is not None else [],
+        "state": "ready" if current else "rendering",
+        "bytes": pack.size if pack is not None else 0,
+    }
+
+
+def phrase_voice(voice: str) -> str:
+    """
+    Name a voice's phrase set is stored under: its canonical reference name, as for
+    define_phrases ("alice" -> "alice.wav"); the name as given once the reference is gone.
+    """
+    if phrase_library.definition(voice) is not None:
+        return voice
+    try:
+        return get_reference_path(voice).name
+    except HTTPException:
+        return voice
+
+
+@app.put("/phrases/{voice}", status_code=202)
+def define_phrases(voice: str, body: PhraseSetRequest):
+    """Register (replace) a voice's phrase set; it is rendered in the background."""
+    if len(body.phrases) > PHRASES_MAX:
+        raise HTTPException(status_code=400, detail=f"Too many phrases: {len(body.phrases)} (max {PHRASES_MAX})")
+    voice = get_reference_path(voice).name
+    unknown = set(body.settings) - WS_SETTINGS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown settings: {sorted(unknown)}")
+    try:
+        items = prepare_phrases({"voice": voice, "phrases": body.phrases, "settings": body.settings})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    definition = phrase_library.define(voice, body.phrases, body.settings)
+    start_phrase_render(definition, items)
+    return phrase_status(voice)
+
+
+@app.get("/phrases/{voice}")
+def get_phrases(voice: str):
+    """A voice's phrase ids and whether its pack is rendered."""
+    voice = phrase_voice(voice)
+    if phrase_library.definition(voice) is None:
+        raise HTTPException(status_code=404, detail=f"No phrase set for voice '{voice}'")
+    return phrase_status(voice)
 
+
+@app.api_route("/phrases/{voice}/{phrase_id}", methods=["GET", "HEAD"])
+def get_phrase_audio(voice: str, phrase_id: str, request: Request):
+    """A rendered phrase, straight from the voice's pack."""
+    voice = phrase_voice(voice)
+    pack = phrase_library.pack(voice)
+    data = pack.get(phrase_id) if pack is not None else None
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"Phrase '{phrase_id}' is not rendered for voice '{voice}'")
+    entry = pack.entries[phrase_id]
+    headers = {"X-TTS-Duration": f"{entry['duration']:.3f}", "X-TTS-Cache": "phrase"}
+    return audio_response(request, data, media_type=entry["media_type"], headers=headers)
+
+
+@app.delete("/phrases/{voice}")
+def delete_phrases(voice: str):
+    """Remove a voice's phrase set and pack."""
+    voice = phrase_voice(voice)
+    if not phrase_library.remove(voice):
+        raise HTTPException(status_code=404, detail=f"No phrase set for voice '{voice}'")
+    return {"voice": voice, "removed": True}
+
+
+for _voice in phrase_library.load():
+    start_phrase_render(phrase_library.definition(_voice))
+
+# =======================
+# SPECULATIVE PRE-SYNTHESIS
+# =======================
+
+def _speculative_job(job: dict, req: TTSRequest, key: str) -> Future:
+    return synthesize_item(job, req, key, cache_ttl(job))
+
+
+@app.post("/api/tts/speculate")
+def api_tts_speculate_endpoint(req: TTSSpeculateRequest, request: Request):
+    """
+    Pre-render text the user is still typing, at low priority
+    A later /api/tts call with the same text is served from the result (X-TTS-Cache: hit/joined).
+    Each new speculation cancels the session's queued ones.
+    """
+    client = request_client(request)
+    ref_path = get_reference_path(req.voice)
+    try:
+        job = prepare_tts_job(req, ref_path)
     except ValueError as e:
-        print(f"[ERROR] TTS request validation failed: {e}")
         raise HTTPException(status_code=400, detail=str(e))
+    job["client"] = client
+
+    # Rendered at the tier the real request would get now, so it can be served from the result.
+    req, job, key = quality_request(req, job, tts_cache_key(job, req))
+    if response_cache.get(key) is not None:
+        superseded = scheduler.cancel_session(req.session)
+        return {"status": "cached", "job_id": None, "superseded": superseded}
+
+    existing = scheduler.find(key)
+    if existing is not None:
+        superseded = scheduler.cancel_session(req.session, keep=existing.id)
+        return {"status": existing.state, "job_id": existing.id, "superseded": superseded}
+
+    queued = scheduler.stats()["queued_by_priority"].get(str(PRIORITY_SPECULATIVE), 0)
+    if queued >= SPECULATIVE_MAX_QUEUED:
+        # Make room for this session's newest text before giving up.
+        if scheduler.cancel_session(req.session) == 0:
+            return {"status": "rejected", "job_id": None, "superseded": 0}
+
+    spec = scheduler.submit(
+        lambda: _speculative_job(job, req, key),
+        PRIORITY_SPECULATIVE,
+        key=key,
+        session=req.session,
+        cost=estimate_cost([job]),
+        batch_key=generation_group(job, req),
+        batch_fn=synthesize_group,
+        payload=(job, req, key, cache_ttl(job)),
+        **fair_share(job),
+    )
+    superseded = scheduler.cancel_session(req.session, keep=spec.id)
+    return {"status": "queued", "job_id": spec.id, "superseded": superseded}
+
+
+@app.delete("/api/tts/speculate/{job_id}")
+def api_tts_speculate_cancel(job_id: str):
+    """Cancel a queued speculative job (running jobs finish and stay cached)."""
+    return {"job_id": job_id, "cancelled": scheduler.cancel(job_id)}
+
+# =======================
+# BATCH ENDPOINT
+# =======================
+
+def _batch_error(index: int, status: int, detail) -> dict:
+    return {"index": index, "ok": False, "status": status, "error": str(detail)}
+
+
+def _synthesize_batch_chunk(chunk: list[tuple[int, TTSRequest, dict]]):
+    """Generate one chunk in a single model call; retry item by item if that fails."""
+    jobs = [job for _, _, job in chunk]
+    try:
+        wavs, sample_rate = scheduler.run(
+            lambda: generate_stage(jobs, chunk[0][1]),
+            PRIORITY_BATCH,
+            cost=estimate_cost(jobs),
+            **fair_share(jobs[0]),
+        )
+        wavs, trimmed = post_stage.submit(finalize_audio, wavs[:len(jobs)], sample_rate).result()
     except Exception as e:
-        print(f"[ERROR] TTS generation failed: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"TTS generation failed: {str(e)}")
-        
+        if len(chunk) == 1:
+            log.error("Batch item %d failed: %s", chunk[0][0], e)
+            yield _batch_error(chunk[0][0], 500, f"TTS generation failed: {e}")
+            return
+        log.warning("Batched generation failed (%s); retrying %d items individually", e, len(chunk))
+        for item in chunk:
+            yield from _synthesize_batch_chunk([item])
+        return
+
+    for (index, req, job), wav, removed in zip(chunk, wavs, trimmed):
+        try:
+            audio, out_type, out_rate = encode_output(wav, sample_rate, req)
+        except Exception as e:
+            yield _batch_error(index, 500, f"Audio encoding failed: {e}")
+            continue
+        quality_governor.record(job["quality"])
+        yield {
+            "index": index,
+            "ok": True,
+            "voice": req.voice,
+            "language": job["language"],
+            "sample_rate": out_rate,
+            "channels": req.channels,
+            "duration": round(len(wav) / sample_rate, 3),
+            "trimmed": round(removed, 3),
+            "media_type": out_type,
+            "quality": job["quality"],
+            "filename": f"{index:03d}.{FORMAT_EXTENSIONS[req.output_format.strip().lower()]}",
+            "audio": audio,
+        }
+
+
+def iter_batch_results(items: list[dict], client: Client | None = None):
+    """
+    Validate and synthesize batch items, yielding per-item results as they complete.
+    Items sharing voice, style and sampling settings are generated together,
+    so each voice's speaker prompt is computed once and reused.
+    """
+    groups: dict[tuple, list] = {}
+    try:
+        for index, raw in enumerate(items):
+            try:
+                req = TTSRequest.model_validate(raw)
+                job = prepare_tts_job(req)
+                job["client"] = client
+                req, job, _ = quality_request(req, job, tts_cache_key(job, req))
+            except ValidationError as e:
+                yield _batch_error(index, 422, e)
+                continue
+            except HTTPException as e:
+                yield _batch_error(index, e.status_code, e.detail)
+                continue
+            except ValueError as e:
+                yield _batch_error(index, 400, e)
+                continue
+
+            key = (
+                str(job["ref_path"]),
+                job.get("model"),
+                job["style"],
+                req.temperature,
+                req.top_p,
+                req.top_k,
+                req.repetition_penalty,
+                job["seed"],
+            )
+            groups.setdefault(key, []).append((index, req, job))
+
+        for key, group in groups.items():
+            # Seeded items run one per call so their audio matches a single /api/tts request.
+            size = 1 if key[-1] is not None else BATCH_CHUNK_SIZE
+            for start in range(0, len(group), size):
+                yield from _synthesize_batch_chunk(group[start:start + size])
     finally:
-        # Cleanup
-        out_path.unlink(missing_ok=True)
         if str(device).startswith("cuda"):
             torch.cuda.empty_cache()
         gc.collect()
-        print("[DEBUG] Cleanup complete")
 
-@app.post("/tts")
-def tts_endpoint(req: TTSRequest):
-    """TTS endpoint with full parameter control - same as /api/tts"""
-    
-    # Both endpoints now work identically
-    return api_tts_endpoint(req)
+
+def _result_manifest(result: dict) -> dict:
+    return {k: v for k, v in result.items() if k != "audio"}
+
+
+def _ndjson_stream(items: list[dict], client: Client):
+    for result in iter_batch_results(items, client):
+        line = _result_manifest(result)
+        if result["ok"]:
+            line["audio_base64"] = base64.b64encode(result["audio"]).decode("ascii")
+        yield (json.dumps(line) + "\n").encode("utf-8")
+
+
+def _multipart_stream(items: list[dict], boundary: str, client: Client):
+    for result in iter_batch_results(items, client):
+        if result["ok"]:
+            content_type, body, filename = result["media_type"], result["audio"], result["filename"]
+        else:
+            content_type, body = "application/json", json.dumps(result).encode("utf-8")
+            filename = f"{result['index']:03d}.json"
+        headers = (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Disposition: attachment; filename=\"{filename}\"\r\n"
+            f"X-Item-Index: {result['index']}\r\n"
+            f"X-Item-Manifest: {json.dumps(_result_manifest(result))}\r\n\r\n"
+        )
+        yield headers.encode("utf-8") + body + b"\r\n"
+    yield f"--{boundary}--\r\n".encode("utf-8")
+
+
+@app.post("/api/tts/batch")
+def api_tts_batch_endpoint(batch: TTSBatchRequest, request: Request):
+    """
+    Synthesize many lines in one HTTP call
+    format=ndjson (default) and multipart stream items as they complete;
+    format=zip returns one archive with NNN.wav files and manifest.json.
+    Failed items are reported individually and never fail the whole batch.
+    """
+    fmt = (batch.format or "ndjson").strip().lower()
+    if fmt not in ("ndjson", "zip", "multipart"):
+        raise HTTPException(status_code=400, detail=f"Unsupported batch format: {batch.format}. Supported: ndjson, zip, multipart")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items: {len(batch.items)}. Maximum: {BATCH_MAX_ITEMS}")
+    # Every item counts as one request against the client's quota.
+    client = request_client(request, len(batch.items))
+
+    log.debug("Batch request", extra=fields(items=len(batch.items), format=fmt))
+
+    if fmt == "ndjson":
+        return StreamingResponse(_ndjson_stream(batch.items, client), media_type="application/x-ndjson")
+
+    if fmt == "multipart":
+        boundary = f"tts-batch-{uuid.uuid4().hex}"
+        return StreamingResponse(
+            _multipart_stream(batch.items, boundary, client),
+            media_type=f"multipart/mixed; boundary={boundary}",
+        )
+
+    buf = io.BytesIO()
+    manifest = []
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as archive:
+        for result in iter_batch_results(batch.items, client):
+            entry = _result_manifest(result)
+            if result["ok"]:
+                archive.writestr(entry["filename"], result["audio"])
+            manifest.append(entry)
+        manifest.sort(key=lambda entry: entry["index"])
+        archive.writestr("manifest.json", json.dumps({"items": manifest}, indent=2))
+
+    return Response(
+        content=buf.getvalue(),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=batch.zip"},
+    )
 
 # =======================
 # HEALTH CHECK
@@ -508,13 +1877,42 @@ def health():
     return {
         "status": "ok",
         "device": device,
+        "precision": MODEL_PRECISION,
+        "deterministic": DETERMINISTIC,
+        "loudness_target_lufs": LOUDNESS_TARGET,
+        "silence_trim": TRIM_OPTIONS if TRIM_SILENCE else None,
         "cuda": torch.cuda.is_available(),
         "model": "qwen3-tts",
         "model_id": model_id,
+        "backend": tts.name,
         "references_directory": str(REF_DIR),
         "available_voices": len(available_voices),
         "voice_samples": available_voices,
-        "model_loaded": tts is not None
+        "model_loaded": tts is not None,
+        "scheduler": scheduler.stats(),
+        "cost_model": cost_model.stats(),
+        "length_governor": length_governor.stats(),
+        "quality": {**quality_governor.stats(), "lite_model": lite_tts.model_id if lite_tts else None},
+        "phrases": phrase_library.stats(),
+        "pipeline": {meter.name: meter.stats() for meter in (generate_meter, post_stage)},
+        "cache": response_cache.stats(),
+        "voice_cache": voice_cache.stats(),
+        "voice_store": {"dir": str(voice_store.root), "voices": len(voice_store.records())},
+        "clients": {
+            "configured": len(client_registry.configured),
+            "require_api_key": client_registry.require_key,
+            "shared_state": _rate_db or None,
+        },
+    }
+
+
+@app.get("/clients")
+def client_usage():
+    """Per-client usage counters and the quotas in effect"""
+    return {
+        "default_quota": client_registry.default.to_dict(),
+        "configured": client_registry.configured,
+        "usage": rate_limiter.usage(),
     }
 
 # =======================
@@ -528,6 +1926,8 @@ def model_info():
         "model": "Qwen3-TTS",
         "version": "1.0",
         "device": device,
+        "precision": MODEL_PRECISION,
+        "backend": tts.info(),
         "features": [
             "Zero-shot voice cloning",
             "Language selection",
@@ -535,21 +1935,32 @@ def model_info():
             "MP3/WAV/OGG/FLAC support",
             "Audio duration validation"
         ],
-        "sample_rate": getattr(tts, 'sr', 24000),
+        "sample_rate": tts.sr,
         "endpoints": {
             "/api/tts": "TTS endpoint for client compatibility (text, voice)",
             "/tts": "TTS endpoint with full parameter control (same as /api/tts)",
+            "/api/tts/batch": "Synthesize a list of TTS requests in one call (ndjson, zip, or multipart)",
+            "/api/tts/audio/{key}": "Cached audio by fingerprint (GET/HEAD, ETag and Range aware)",
+            "/api/tts/speculate": "Pre-render text at low priority so a later /api/tts call is instant",
+            "/clients": "Per-client usage counters (requests, rate-limited, audio-seconds) and quotas",
+            "/ws": "WebSocket session: set defaults once, pipeline requests, receive tagged binary audio",
             "/upload-reference": "Upload a new reference audio file (multipart/form-data)",
             "/health": "Health check",
             "/info": "Model information",
             "/validate-references": "Validate reference audio files",
-            "/list-voices": "List available voice samples"
+            "/list-voices": "List available voice samples",
+            "/voices/{name}/prefetch": "Warm a voice ahead of use (?pin=true keeps it resident)",
+            "/voices/{name}/pin": "DELETE to unpin a voice"
         },
         "parameters": {
             "temperature": "0.05-5.0 (default: 1.7)",
             "top_p": "0.0-1.0 (default: 0.9)",
             "top_k": "1-100 (default: 50)",
             "repetition_penalty": "0.5-2.0 (default: 1.0)",
+            "seed": f"0-{MAX_SEED} (optional; fixed seed for reproducible output)",
+            "output_format": "wav | pcm | opus (default: wav)",
+            "sample_rate": "8000-48000 (optional; default: model rate, 48000 for opus)",
+            "channels": "1 or 2 (default: 1)",
             "language": "Auto or supported language"
         },
         "supported_languages": SUPPORTED_LANGUAGES or [
@@ -629,7 +2040,21 @@ async def upload_reference_audio(
             raise HTTPException(status_code=400, detail=error_msg)
 
         # Invalidate cache so list/tts sees it immediately.
-        validated_references.clear()
+        voice_cache.invalidate()
+        response_cache.clear()
+        # Phrase sets are stored under the voice's canonical (converted WAV) name.
+        try:
+            voice = get_reference_path(target_path.name).name
+        except HTTPException:
+            voice = target_path.with_suffix(".wav").name
+        definition = phrase_library.definition(voice)
+        if definition is not None:
+            # The old pack speaks with the replaced voice: stop serving it before re-rendering.
+            phrase_library.drop_pack(voice)
+            start_phrase_render(definition)
+        for pinned in voice_cache.pinned_names():
+            # Pinned voices are rebuilt in the background from the new file.
+            scheduler.submit(lambda name=pinned: warm_pinned_voices([name]), PRIORITY_BATCH)
 
         return {
             "success": True,
@@ -696,41 +2121,99 @@ def list_voices():
             "error": "References directory does not exist"
         }
     
+    residency = voice_cache.residency()
+    pinned = set(voice_cache.pinned_names())
+
     # Find all audio files
     for ext in ['.wav', '.mp3', '.ogg', '.flac']:
         for audio_file in REF_DIR.glob(f"*{ext}"):
-            is_valid, error_msg, duration = validate_reference_audio(audio_file)
+            resident = residency.get(audio_file.name)
+            if resident is not None:
+                # Resident voices were validated when loaded; skip re-reading the file.
+                is_valid, error_msg = True, ""
+                duration = resident["duration"]
+            else:
+                is_valid, error_msg, duration = validate_reference_audio(audio_file)
+                resident = {"cached": False, "pinned": audio_file.name in pinned, "embedding": False, "audio": False}
             voices.append({
                 "filename": audio_file.name,
                 "valid": is_valid,
                 "duration": duration,
                 "format": audio_file.suffix[1:],
-                "error": error_msg if not is_valid else None
+                "error": error_msg if not is_valid else None,
+                "resident": resident,
             })
     
     return {
         "voices": voices,
         "count": len(voices),
         "valid_count": sum(1 for v in voices if v["valid"]),
-        "directory": str(REF_DIR)
+        "directory": str(REF_DIR),
+        "voice_cache": voice_cache.stats(),
+    }
+
+# =======================
+# VOICE PREFETCH / PINNING
+# =======================
+
+@app.post("/voices/{name}/prefetch")
+def prefetch_voice(name: str, pin: bool = False):
+    """
+    Warm a voice ahead of use (resolution, conversion, audio, speaker prompt)
+    With ?pin=true the voice is kept resident and exempt from eviction.
+    """
+    try:
+        entry = scheduler.run(lambda: warm_voice(name, pin=pin), PRIORITY_BATCH)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error("Prefetch of voice '%s' failed: %s", name, e)
+        raise HTTPException(status_code=500, detail=f"Prefetch failed: {str(e)}")
+
+    return {
+        "voice": name,
+        "filename": entry.path.name,
+        "duration": entry.duration,
+        "resident": entry.residency(),
     }
 
+
+@app.delete("/voices/{name}/pin")
+def unpin_voice(name: str):
+    """Release a pinned voice; it stays cached until evicted."""
+    return {"voice": name, "unpinned": voice_cache.unpin(name)}
+
+
+# Voices to keep resident from startup, e.g. TTS_PINNED_VOICES=alice.wav,bob.mp3
+PINNED_VOICES = [v.strip() for v in os.environ.get("TTS_PINNED_VOICES", "").split(",") if v.strip()]
+warm_stored_voices()
+warm_pinned_voices(PINNED_VOICES)
+
 # =======================
 # RUN
 # =======================
 
 if __name__ == "__main__":
     import uvicorn
-    print(f"[STARTUP] Starting Qwen3-TTS server on port 5002")
-    print(f"[STARTUP] References directory: {REF_DIR}")
-    print("[STARTUP] Override with: TTS_REFERENCES_DIR=/path/to/references")
-    print("[STARTUP] Override model with: QWEN_TTS_MODEL=Qwen/Qwen3-TTS-12Hz-1.7B-Base")
-    print(f"[STARTUP] Available endpoints:")
-    print(f"         POST /api/tts - TTS with voice parameter (client compatible)")
-    print(f"         POST /tts - TTS with full parameter control")
-    print(f"         POST /upload-reference - Upload a new reference audio file")
-    print(f"         GET  /health - Health check")
-    print(f"         GET  /info - Model information")
-    print(f"         GET  /validate-references - Check reference audio files")
-    print(f"         GET  /list-voices - List available voice samples")
+    log.info("Starting Qwen3-TTS server on port 5002")
+    log.info("References directory: %s", REF_DIR)
+    log.info("Override with: TTS_REFERENCES_DIR=/path/to/references")
+    log.info("Override model with: QWEN_TTS_MODEL=Qwen/Qwen3-TTS-12Hz-1.7B-Base")
+    log.info("Inference backend: %s (TTS_BACKEND=torch | onnx | fake)", tts.name)
+    log.info("Available endpoints:\n" + "\n".join([
+        "         POST /api/tts - TTS with voice parameter (client compatible)",
+        "         POST /tts - TTS with full parameter control",
+        "         POST /api/tts/batch - Synthesize many lines in one call",
+        "         POST /api/tts/speculate - Pre-render text while the user types",
+        "         WS   /ws - Persistent session with pipelined requests and cancellation",
+        "         POST /upload-reference - Upload a new reference audio file",
+        "         GET  /health - Health check",
+        "         GET  /clients - Per-client usage and quotas",
+        "         GET  /info - Model information",
+        "         GET  /validate-references - Check reference audio files",
+        "         GET  /list-voices - List available voice samples",
+        "         POST /voices/{name}/prefetch - Warm (and optionally pin) a voice",
+        "         PUT  /phrases/{voice} - Register a phrase set (rendered in the background)",
+        "         GET  /phrases/{voice}/{id} - Pre-rendered phrase audio",
+    ]))
     uvicorn.run(app, host="0.0.0.0", port=5002)
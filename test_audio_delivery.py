@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for audio delivery (ETags, conditional requests and byte ranges)
+"""
+
+import sys
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from audio_delivery import RangeNotSatisfiable, audio_etag, audio_response, parse_range
+
+DATA = bytes(range(256)) * 4
+
+app = FastAPI()
+
+
+@app.get("/audio")
+def audio(request: Request):
+    return audio_response(request, DATA, max_age=60)
+
+
+client = TestClient(app)
+
+
+def test_parse_range_forms():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None  # multiple ranges: serve the full body
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def test_full_response_has_validators():
+    r = client.get("/audio")
+    assert r.status_code == 200
+    assert r.content == DATA
+    assert r.headers["etag"] == audio_etag(DATA)
+    assert r.headers["accept-ranges"] == "bytes"
+    assert r.headers["cache-control"] == "public, max-age=60"
+
+
+def test_if_none_match_revalidates():
+    r = client.get("/audio", headers={"If-None-Match": audio_etag(DATA)})
+    assert r.status_code == 304
+    assert r.content == b""
+
+
+def test_range_request_returns_partial_content():
+    r = client.get("/audio", headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.content == DATA[10:20]
+    assert r.headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+
+
+def test_stale_if_range_serves_full_body():
+    r = client.get("/audio", headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert r.status_code == 200
+    assert r.content == DATA
+
+
+def test_unsatisfiable_range():
+    r = client.get("/audio", headers={"Range": f"bytes={len(DATA)}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the output-format stage (resampling, channel layout and encoders)
+"""
+
+import io
+import sys
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_format import encode_audio, polyphase_filter, resample, to_channels, validate_output
+
+
+def _sine(freq: float, sr: int, seconds: float = 0.5) -> np.ndarray:
+    return (0.5 * np.sin(2 * np.pi * freq * np.arange(int(sr * seconds)) / sr)).astype(np.float32)
+
+
+def test_resample_preserves_tone_and_length():
+    out = resample(_sine(1000, 24000), 24000, 48000)
+    assert len(out) == 24000
+    spectrum = np.abs(np.fft.rfft(out))
+    assert np.argmax(spectrum) * 48000 / len(out) == pytest.approx(1000, abs=5)
+    assert np.abs(out).max() == pytest.approx(0.5, abs=0.02)
+
+
+def test_resample_rejects_content_above_new_nyquist():
+    out = resample(_sine(10000, 24000), 24000, 16000)
+    assert np.abs(out[200:-200]).max() < 0.01
+
+
+def test_filters_are_cached_per_rate_pair():
+    assert polyphase_filter(2, 1) is polyphase_filter(2, 1)
+    assert resample(_sine(440, 24000), 24000, 24000).shape == (12000,)
+
+
+def test_to_channels_layout():
+    mono = np.arange(4, dtype=np.float32)
+    assert to_channels(mono, 1).shape == (4,)
+    stereo = to_channels(mono, 2)
+    assert stereo.shape == (4, 2)
+    assert np.array_equal(stereo[:, 0], stereo[:, 1])
+
+
+def test_wav_48k_stereo_roundtrip():
+    data, media_type, rate = encode_audio(_sine(440, 24000), 24000, "wav", 48000, 2)
+    audio, sr = sf.read(io.BytesIO(data))
+    assert (media_type, rate, sr) == ("audio/wav", 48000, 48000)
+    assert audio.shape == (24000, 2)
+
+
+def test_pcm_is_raw_s16le():
+    data, media_type, _ = encode_audio(_sine(440, 24000), 24000, "pcm", 48000, 2)
+    assert media_type == "audio/L16; rate=48000; channels=2"
+    assert len(data) == 24000 * 2 * 2
+
+
+def test_opus_defaults_to_48k():
+    data, media_type, rate = encode_audio(_sine(440, 22050), 22050, "opus")
+    assert data[:4] == b"OggS"
+    assert (media_type, rate) == ("audio/ogg; codecs=opus", 48000)
+
+
+def test_validate_output():
+    assert validate_output(" WAV ", None, 1) == "wav"
+    with pytest.raises(ValueError):
+        validate_output("mp3", None, 1)
+    with pytest.raises(ValueError):
+        validate_output("opus", 44100, 2)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
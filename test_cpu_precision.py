@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for reduced-precision CPU inference helpers
+"""
+
+import sys
+
+import pytest
+import torch
+
+from cpu_precision import (
+    apply_cpu_precision,
+    module_size_mb,
+    quantize_linear_int8,
+    resolve_cpu_precision,
+    save_quantized,
+)
+
+
+class _Wrapper:
+    """Stands in for Qwen3TTSModel, which wraps the torch module as `.model`."""
+
+    def __init__(self, module):
+        self.model = module
+
+
+def _toy_model() -> torch.nn.Module:
+    torch.manual_seed(0)
+    model = torch.nn.Sequential()
+    model.add_module("proj", torch.nn.Linear(256, 512))
+    model.add_module("act", torch.nn.GELU())
+    model.add_module("out", torch.nn.Linear(512, 256))
+    model.add_module("lm_head", torch.nn.Linear(256, 32))
+    return model.eval()
+
+
+def test_int8_quantization_shrinks_weights_and_stays_close():
+    model = _toy_model()
+    x = torch.randn(8, 256)
+    expected = model(x)
+    before = module_size_mb(model)
+
+    assert quantize_linear_int8(model) == 2  # lm_head is skipped
+    actual = model(x)
+
+    assert module_size_mb(model) < before * 0.5
+    assert isinstance(model.lm_head, torch.nn.Linear)
+    rel_error = (actual - expected).norm() / expected.norm()
+    assert rel_error < 0.05
+
+
+def test_prequantized_weights_round_trip(tmp_path):
+    source = _toy_model()
+    quantize_linear_int8(source)
+    weights = tmp_path / "int8.pt"
+    save_quantized(source, weights)
+
+    target = _Wrapper(_toy_model())
+    with torch.no_grad():
+        for p in target.model.parameters():
+            p.zero_()
+    assert apply_cpu_precision(target, "int8-prequantized", str(weights)) == "int8-prequantized"
+
+    x = torch.randn(4, 256)
+    assert torch.allclose(target.model(x), source(x))
+
+
+def test_precision_resolution():
+    assert resolve_cpu_precision("FP32") == "fp32"
+    assert resolve_cpu_precision("int8") == "int8"
+    assert resolve_cpu_precision("bf16") in ("bf16", "fp32")
+    with pytest.raises(ValueError):
+        resolve_cpu_precision("fp8")
+    with pytest.raises(FileNotFoundError):
+        apply_cpu_precision(_Wrapper(_toy_model()), "int8-prequantized", "/nonexistent.pt")
+    assert apply_cpu_precision(object(), "int8") == "fp32"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for the generation length budget and loop detection
+"""
+
+import sys
+
+import numpy as np
+import pytest
+
+from length_governor import LengthGovernor, LoopDetector, find_loop, speech_seconds
+
+
+def test_speech_seconds_grows_with_text_and_pauses():
+    short = speech_seconds("Hello there", "English")
+    long = speech_seconds("Hello there, how are you doing today? I am fine.", "English")
+    assert 0.5 < short < long < 6
+    # Ideographs count per character whatever the requested language.
+    assert speech_seconds("你好今天怎么样", "Auto") > speech_seconds("你好", "Auto") > 0
+
+
+def test_digits_count_as_spoken_syllables():
+    # Unexpanded numbers (Auto / non-English) are read out and need room in the budget.
+    assert speech_seconds("call 555-1234", "Auto") - speech_seconds("call", "Auto") > 2.0
+    assert speech_seconds("2024", "German") > 1.0
+    governor = LengthGovernor(frame_rate=12.0, scale=2.0, pad_seconds=1.5)
+    assert governor.budget("call 555-1234", "Auto") / 12.0 > 5.0
+
+
+def test_budget_scales_and_caps():
+    governor = LengthGovernor(frame_rate=12.0, scale=2.0, pad_seconds=1.0, max_seconds=10.0)
+    text = "Hello there, how are you doing today?"
+    default = governor.budget(text, "English")
+    assert governor.budget(text, "English", scale=4.0) > default > governor.budget(text, "English", scale=0.5)
+    assert governor.budget("word " * 500, "English") == 120
+
+
+def test_find_loop_detects_periodic_tails():
+    speech = np.arange(20)
+    assert find_loop(np.concatenate([speech, np.full(10, 7)]), min_frames=6) == 10
+    assert find_loop(np.concatenate([speech, np.tile([3, 4, 5], 4)]), min_frames=9, max_period=4) == 12
+    assert find_loop(speech, min_frames=6) == 0
+
+
+def test_loop_detector_ignores_prompt_and_flags_rows():
+    detector = LoopDetector(min_frames=4, max_period=2, check_every=1)
+    prompt = np.zeros((2, 8), dtype=np.int64)  # constant prompt tokens must not trigger
+    rows = prompt
+    flags = []
+    for step in range(6):
+        new = np.array([[9], [step + 10]])  # row 0 holds one token, row 1 keeps changing
+        rows = np.concatenate([rows, new], axis=1)
+        flags = detector.check(rows)
+        if step < 3:
+            assert flags == [False, False]
+    assert flags == [True, False]
+    assert detector.loops[0] >= 4
+
+
+def test_trim_and_budget_counters():
+    governor = LengthGovernor(frame_rate=10.0)
+    wav = np.ones(1000, dtype=np.float32)  # 1 s at 1 kHz
+    trimmed = governor.trim_loop(wav, 1000, loop_frames=5)
+    assert len(trimmed) == 1000 - int((5 - round(0.25 * 10)) * 100)
+    assert governor.observe(2.0, budget=20, looped=False)
+    assert not governor.observe(1.0, budget=20, looped=True)
+    stats = governor.stats()
+    assert stats["budget_hits"] == 1 and stats["loop_stops"] == 1 and stats["budget_hit_rate"] == 0.5
+    assert stats["trimmed_s"] == pytest.approx(0.3)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
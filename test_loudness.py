@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for EBU R128 loudness normalization and the true-peak limiter
+"""
+
+import sys
+
+import numpy as np
+import pytest
+
+from loudness import (
+    integrated_loudness,
+    integrated_loudness_batch,
+    k_weighting_sos,
+    normalize_loudness_batch,
+    true_peak_db,
+)
+
+SR = 24000
+
+
+def _sine(freq: float, amplitude: float, seconds: float, sr: int = SR, phase: float = 0.0) -> np.ndarray:
+    t = np.arange(int(seconds * sr)) / sr
+    return (amplitude * np.sin(2 * np.pi * freq * t + phase)).astype(np.float32)
+
+
+def test_k_weighting_matches_reference_coefficients_at_48k():
+    sos = k_weighting_sos(48000)
+    assert np.allclose(sos[0, :3], [1.53512485958697, -2.69169618940638, 1.19839281085285])
+    assert np.allclose(sos[0, 4:], [-1.69065929318241, 0.73248077421585])
+    assert np.allclose(sos[1, 4:], [-1.99004745483398, 0.99007225036621])
+
+
+@pytest.mark.parametrize("sr", [24000, 48000])
+def test_1khz_sine_reads_minus_3_lufs_per_full_scale(sr):
+    # BS.1770: a 0 dBFS 1 kHz sine in one channel reads -3.01 LUFS.
+    assert integrated_loudness(_sine(1000, 0.1, 5, sr), sr) == pytest.approx(-23.01, abs=0.1)
+
+
+def test_silence_and_batch_shapes():
+    values = integrated_loudness_batch([np.zeros(SR), _sine(1000, 0.1, 3), _sine(1000, 0.1, 0.2)], SR)
+    assert values[0] == -np.inf
+    assert values[1] == pytest.approx(-23.01, abs=0.1)
+    assert values[2] == pytest.approx(-23.01, abs=0.5)
+
+
+def test_true_peak_finds_intersample_overs():
+    # fs/4 sine at 45 degrees: samples sit at 0.707 of the real peak.
+    audio = _sine(SR / 4, 0.9, 0.5, phase=np.pi / 4)
+    assert np.abs(audio).max() < 0.65
+    assert true_peak_db(audio) == pytest.approx(20 * np.log10(0.9), abs=0.3)
+
+
+def test_normalize_hits_target_and_respects_ceiling():
+    rng = np.random.default_rng(0)
+    quiet = (rng.standard_normal(SR * 3) * 0.03).astype(np.float32)
+    loud = _sine(440, 0.3, 2)
+    loud[SR // 2:SR // 2 + 50] = 0.99  # a transient that needs limiting after gain
+    out = normalize_loudness_batch([quiet, loud, np.zeros(100, dtype=np.float32)], SR, target_lufs=-14.0)
+    assert [len(o) for o in out] == [len(quiet), len(loud), 100]
+    assert integrated_loudness(out[0], SR) == pytest.approx(-14.0, abs=0.2)
+    assert integrated_loudness(out[1], SR) == pytest.approx(-14.0, abs=1.0)
+    assert all(true_peak_db(o) <= -0.9 for o in out[:2])
+    assert not out[2].any()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
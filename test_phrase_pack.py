@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for phrase packs and the phrase library
+"""
+
+import sys
+
+import pytest
+
+from phrase_pack import PhraseLibrary, PhrasePack, normalize_phrase, write_pack
+
+
+def _clip(text: str, data: bytes, signature: str = "sig") -> tuple[bytes, dict]:
+    return data, {"text": text, "match": normalize_phrase(text), "signature": signature,
+                  "media_type": "audio/wav", "duration": 1.0, "trimmed": 0.0}
+
+
+def test_normalize_phrase_ignores_case_punctuation_and_spacing():
+    assert normalize_phrase("  Welcome   back!! ") == normalize_phrase("welcome, back") == "welcome back"
+
+
+def test_pack_round_trip(tmp_path):
+    path = tmp_path / "v.pack"
+    write_pack(path, {"voice": "v", "entries": {"a": {"match": "a"}, "b": {"match": "b"}}},
+               {"a": b"first", "b": b"second clip"})
+    pack = PhrasePack(path)
+    assert pack.get("a") == b"first" and pack.get("b") == b"second clip"
+    assert pack.get("missing") is None
+    assert pack.match("B!") == "b"
+    (tmp_path / "junk.pack").write_bytes(b"not a pack at all")
+    with pytest.raises(ValueError):
+        PhrasePack(tmp_path / "junk.pack")
+
+
+def test_library_serves_installed_pack_and_checks_signature(tmp_path):
+    library = PhraseLibrary(tmp_path)
+    definition = library.define("alice.wav", {"hi": "Welcome back!"}, {"output_format": "opus"})
+    assert library.lookup("alice.wav", "welcome back", "sig") is None
+    assert library.install(definition, {"hi": _clip("Welcome back!", b"OggS...")}) is not None
+    data, entry = library.lookup("alice.wav", "WELCOME BACK", "sig")
+    assert data == b"OggS..." and entry["duration"] == 1.0
+    assert library.lookup("alice.wav", "welcome back", "other-output") is None
+    assert library.stats()["hits"] == 1
+
+
+def test_replaced_definition_discards_stale_render(tmp_path):
+    library = PhraseLibrary(tmp_path)
+    old = library.define("alice.wav", {"hi": "Hello"}, {})
+    library.define("alice.wav", {"hi": "Hi there"}, {})
+    assert library.install(old, {"hi": _clip("Hello", b"x")}) is None
+    assert library.pack("alice.wav") is None
+
+
+def test_pack_from_replaced_reference_audio_is_not_served(tmp_path):
+    references = {"alice.wav": "100:1"}
+    library = PhraseLibrary(tmp_path, references.get)
+    definition = library.define("alice.wav", {"hi": "Hello"}, {})
+    assert library.install(definition, {"hi": _clip("Hello", b"old voice")}, "100:1") is not None
+    assert library.is_current("alice.wav")
+    # The voice is re-uploaded: the pack is stale, and a restart does not bring it back.
+    references["alice.wav"] = "120:2"
+    assert not library.is_current("alice.wav")
+    reloaded = PhraseLibrary(tmp_path, references.get)
+    assert reloaded.load() == ["alice.wav"]
+    assert reloaded.pack("alice.wav") is None
+    # A render of the old audio that finishes late is not installed.
+    assert reloaded.install(reloaded.definition("alice.wav"), {"hi": _clip("Hello", b"x")}, "100:1") is None
+    library.drop_pack("alice.wav")
+    assert library.pack("alice.wav") is None and library.definition("alice.wav") is not None
+
+
+def test_load_reports_missing_and_stale_packs(tmp_path):
+    library = PhraseLibrary(tmp_path)
+    definition = library.define("alice.wav", {"hi": "Hello"}, {})
+    library.install(definition, {"hi": _clip("Hello", b"x")})
+    library.define("bob.wav", {"yo": "Yo"}, {})
+    reloaded = PhraseLibrary(tmp_path)
+    assert reloaded.load() == ["bob.wav"]
+    assert reloaded.lookup("alice.wav", "hello", "sig")[0] == b"x"
+    # Editing the definition on disk makes its pack stale.
+    reloaded.define("alice.wav", {"hi": "Hello again"}, {})
+    assert sorted(PhraseLibrary(tmp_path).load()) == ["alice.wav", "bob.wav"]
+    assert reloaded.remove("alice.wav") and not reloaded.remove("alice.wav")
+    assert not (tmp_path / "alice.wav.pack").exists()
+
+
+
+def test_load_skips_corrupt_definitions_and_packs(tmp_path):
+    library = PhraseLibrary(tmp_path)
+    definition = library.define("alice.wav", {"hi": "Hello"}, {})
+    library.install(definition, {"hi": _clip("Hello", b"x")})
+    (tmp_path / "truncated.json").write_text('{"voice": "bob.wav", "phr', encoding="utf-8")
+    (tmp_path / "novoice.json").write_text('{"phrases": {}}', encoding="utf-8")
+    (tmp_path / "alice.wav.pack").write_bytes(b"TTSPACK1\x00\x00")
+    reloaded = PhraseLibrary(tmp_path)
+    assert reloaded.load() == ["alice.wav"]
+    assert reloaded.voices() == ["alice.wav"] and reloaded.pack("alice.wav") is None
+    assert not (tmp_path / "alice.wav.pack").exists()
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
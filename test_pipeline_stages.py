@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged pipeline (bounded queues, occupancy metrics, future chaining)
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from pipeline_stages import Stage, StageMeter, then
+
+
+def test_full_queue_blocks_submitter():
+    stage = Stage("post", workers=1, queue_size=1)
+    release = threading.Event()
+    stage.submit(release.wait, 5)
+    stage.submit(lambda: None)  # fills the queue
+    submitted = threading.Event()
+    threading.Thread(target=lambda: (stage.submit(lambda: None), submitted.set()), daemon=True).start()
+    assert not submitted.wait(0.2)
+    assert stage.stats()["queued"] == 1
+    release.set()
+    assert submitted.wait(5)
+    assert stage.stats()["blocked_s"] > 0.1
+
+
+def test_occupancy_and_results():
+    stage = Stage("post", workers=2, queue_size=4)
+    futures = [stage.submit(lambda x: (time.sleep(0.05), x * 2)[1], i) for i in range(4)]
+    assert [f.result(5) for f in futures] == [0, 2, 4, 6]
+    stats = stage.stats()
+    assert stats["items"] == 4 and stats["active"] == 0 and stats["queued"] == 0
+    assert stats["busy_s"] >= 0.2
+    assert 0 < stats["occupancy"] <= 1
+
+
+def test_meter_counts_work_on_caller_threads():
+    meter = StageMeter("generate")
+    with meter.timed():
+        assert meter.stats()["active"] == 1
+    assert meter.stats()["items"] == 1
+
+
+def test_stage_errors_reach_the_future():
+    stage = Stage("post", workers=1, queue_size=0)
+    future = stage.submit(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(5)
+    # The slot is released: the next submit does not block.
+    assert stage.submit(lambda: "ok").result(5) == "ok"
+
+
+def test_then_maps_results_and_propagates_errors():
+    source = Future()
+    doubled = then(source, lambda x: x * 2)
+    source.set_result(21)
+    assert doubled.result(1) == 42
+
+    failed = Future()
+    out = then(failed, lambda x: x)
+    failed.set_exception(ValueError("boom"))
+    with pytest.raises(ValueError):
+        out.result(1)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the prefix (KV state) cache
+"""
+
+import sys
+import threading
+
+import numpy as np
+import pytest
+import torch
+
+from prefix_cache import PrefixCache, fork_state, prefix_key, state_nbytes
+
+
+def _kv(layers=2, tokens=8, value=1.0):
+    return tuple((torch.full((1, 4, tokens, 16), value), torch.full((1, 4, tokens, 16), value)) for _ in range(layers))
+
+
+def test_get_returns_fork_that_callers_can_extend():
+    cache = PrefixCache()
+    key = prefix_key("alice.wav", "Speak in a neutral tone.", "English")
+    cache.put(key, _kv())
+    first = cache.get(key)
+    first[0][0].add_(5.0)
+    assert torch.all(cache.get(key)[0][0] == 1.0)
+    assert cache.stats()["hits"] == 2
+
+
+def test_lru_eviction_by_bytes():
+    one = state_nbytes(_kv())
+    cache = PrefixCache(max_bytes=2 * one)
+    for name in ("a", "b"):
+        cache.put(prefix_key(name, "", "auto"), _kv())
+    cache.get(prefix_key("a", "", "auto"))
+    cache.put(prefix_key("c", "", "auto"), _kv())
+    assert cache.get(prefix_key("b", "", "auto")) is None
+    assert cache.get(prefix_key("a", "", "auto")) is not None
+    assert cache.stats()["bytes"] == 2 * one and cache.stats()["evictions"] == 1
+    assert cache.put(prefix_key("huge", "", "auto"), _kv(tokens=64)) is False
+
+
+def test_get_or_build_builds_once_under_concurrency():
+    cache = PrefixCache()
+    builds = []
+    gate = threading.Event()
+
+    def build():
+        builds.append(1)
+        gate.wait(1)
+        return {"k": np.ones(4)}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_build(("v", "", "auto"), build)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(builds) == 1
+    assert sorted(hit for _, hit in results) == [False, True, True, True]
+
+
+def test_invalidate_one_speaker():
+    cache = PrefixCache()
+    cache.put(("a", "x", "auto"), _kv())
+    cache.put(("a", "y", "auto"), _kv())
+    cache.put(("b", "x", "auto"), _kv())
+    assert cache.invalidate("a") == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_fork_copies_nested_arrays():
+    state = {"layers": [np.zeros(3)], "meta": ("len", 3)}
+    forked = fork_state(state)
+    forked["layers"][0][0] = 1
+    assert state["layers"][0][0] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
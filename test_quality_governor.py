@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for load-adaptive quality tiers
+"""
+
+import json
+import sys
+
+import pytest
+
+from quality_governor import LoadGovernor, QualityTier, load_tiers, shorten_description
+
+
+def _governor(**kwargs) -> LoadGovernor:
+    return LoadGovernor(load_tiers(), down_queue=8, down_rtf=1.0, up_queue=2, up_rtf=0.7,
+                        down_hold=2.0, up_hold=10.0, window=30.0, **kwargs)
+
+
+def test_shorten_description_cuts_at_a_word():
+    assert shorten_description("warm, calm narrator voice", 12) == "warm, calm"
+    assert shorten_description("short", 80) == "short"
+    assert shorten_description("anything", 0) == ""
+
+
+def test_tier_only_lowers_settings():
+    tier = QualityTier("reduced", top_k=20, length_scale=1.5, description_chars=10, sample_rate=16000)
+    assert tier.degrade(50, 2.0, "a very long style prompt", 24000) == {
+        "top_k": 20, "length_scale": 1.5, "voice_description": "a very", "sample_rate": 16000}
+    # Already cheaper, or a sample rate the client chose: kept.
+    assert tier.degrade(10, 1.0, "short", None) == {}
+    assert QualityTier("economy", description_chars=0).degrade(50, 2.0, "calm", None) == {"voice_description": None}
+
+
+def test_steps_down_on_queue_depth_then_rtf():
+    governor = _governor()
+    assert governor.update(3, now=0.0).name == "full"
+    assert governor.update(8, now=1.0).name == "reduced"
+    # One step per down_hold, however deep the queue.
+    assert governor.update(20, now=2.0).name == "reduced"
+    governor.observe(6.0, 4.0, now=3.0)
+    assert governor.recent_rtf(now=3.0) == pytest.approx(1.5)
+    assert governor.update(0, now=3.5).name == "economy"
+    assert governor.update(50, now=10.0).name == "economy"
+
+
+def test_steps_up_with_hysteresis():
+    governor = _governor()
+    governor.update(8, now=0.0)
+    assert governor.update(5, now=20.0).name == "reduced"  # between the thresholds: stay
+    assert governor.update(2, now=21.0).name == "reduced"  # calm, but not for up_hold yet
+    assert governor.update(8, now=25.0).name == "economy"  # load came back: hold restarts
+    assert governor.update(1, now=26.0).name == "economy"
+    assert governor.update(1, now=36.0).name == "reduced"
+    assert governor.update(1, now=40.0).name == "reduced"
+    assert governor.update(1, now=46.0).name == "full"
+    assert governor.stats()["steps"] == {"down": 2, "up": 2}
+
+
+def test_stale_rtf_is_forgotten():
+    governor = _governor()
+    governor.observe(3.0, 1.0, now=0.0)
+    assert governor.update(0, now=1.0).name == "reduced"
+    assert governor.recent_rtf(now=40.0) is None
+    assert governor.update(0, now=40.0).name == "reduced"
+    assert governor.update(0, now=50.0).name == "full"
+
+
+def test_load_tiers_and_threshold_checks(tmp_path):
+    path = tmp_path / "tiers.json"
+    path.write_text(json.dumps([{"name": "hq"}, {"name": "lq", "top_k": 5, "lite_model": True}]))
+    tiers = load_tiers(path)
+    assert [tier.name for tier in tiers] == ["hq", "lq"] and tiers[1].lite_model
+    assert tiers[1].to_dict()["top_k"] == 5
+    with pytest.raises(ValueError):
+        LoadGovernor(tiers, down_queue=4, up_queue=4)
+    # A single tier never changes.
+    single = LoadGovernor(tiers[:1])
+    assert single.update(1000, now=100.0).name == "hq"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for client identification, token-bucket quotas and shared limiter state
+"""
+
+import sys
+
+import pytest
+
+import rate_limit
+from rate_limit import Client, ClientRegistry, Quota, RateLimited, RateLimiter, SqliteStore
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit.time, "time", clock.time)
+    return clock
+
+
+def test_identify_by_key_claimed_name_or_address():
+    registry = ClientRegistry(Quota(requests_per_minute=10), {"bot": {"api_key": "s3cret", "weight": 2}})
+    bot = registry.identify("s3cret")
+    assert bot.id == "bot" and bot.authenticated and bot.quota.weight == 2
+    assert bot.quota.requests_per_minute == 10  # inherited from the default quota
+    # A claimed name only labels an anonymous caller, and never maps onto a configured client.
+    named = registry.identify(None, "bot", "10.0.0.7")
+    assert named.id == "ip:10.0.0.7/bot" and named.account == "ip:10.0.0.7" and not named.authenticated
+    assert registry.identify(None, None, "10.0.0.7").id == "ip:10.0.0.7"
+    with pytest.raises(PermissionError):
+        registry.identify("wrong")
+    with pytest.raises(PermissionError):
+        ClientRegistry(require_key=True).identify(None, "me")
+
+
+def test_rotating_names_from_one_address_share_a_bucket(clock):
+    registry = ClientRegistry(Quota(requests_per_minute=3))
+    limiter = RateLimiter()
+    for i in range(3):
+        limiter.admit(registry.identify(None, f"bot-{i}", "10.0.0.9"))
+    with pytest.raises(RateLimited):
+        limiter.admit(registry.identify(None, "bot-3", "10.0.0.9"))
+    limiter.admit(registry.identify(None, "bot-3", "10.0.0.10"))
+    assert list(limiter.usage()) == ["ip:10.0.0.9", "ip:10.0.0.10"]
+
+
+def test_trusted_proxies_forward_addresses_and_vouch_for_names():
+    registry = ClientRegistry(trusted_proxies={"10.0.0.1", "10.0.0.2"})
+    # Through the gateway (10.0.0.1): the caller's address, not the gateway's.
+    assert registry.identify(None, "me", "10.0.0.1", "203.0.113.5").account == "ip:203.0.113.5"
+    # A hop the caller wrote itself is not believed.
+    assert registry.identify(None, None, "10.0.0.1", "1.2.3.4, 203.0.113.5").account == "ip:203.0.113.5"
+    assert registry.identify(None, None, "10.0.0.1", "1.2.3.4, 203.0.113.5, 10.0.0.2").account == "ip:203.0.113.5"
+    # Untrusted callers can't claim another address.
+    assert registry.identify(None, None, "203.0.113.5", "1.2.3.4").account == "ip:203.0.113.5"
+    # A bot host that names its users itself gets one account per user.
+    assert registry.identify(None, "alice", "10.0.0.2").account == "anon:alice"
+
+
+def test_request_bucket_refills_over_time(clock):
+    limiter = RateLimiter()
+    client = Client("c", Quota(requests_per_minute=2))
+    limiter.admit(client)
+    limiter.admit(client)
+    with pytest.raises(RateLimited) as limited:
+        limiter.admit(client)
+    assert limited.value.retry_after == pytest.approx(30.0)
+    clock.now += 30
+    limiter.admit(client)
+    with pytest.raises(RateLimited):
+        limiter.admit(client, requests=3)  # more than a minute's allowance at once
+    assert limiter.usage()["c"]["requests"] == 3 and limiter.usage()["c"]["limited"] == 2
+
+
+def test_audio_debt_blocks_until_paid_back(clock):
+    limiter = RateLimiter()
+    client = Client("c", Quota(audio_seconds_per_minute=6))
+    limiter.admit(client)
+    limiter.charge_audio(client, 9.0)  # 3 s over the bucket
+    with pytest.raises(RateLimited) as limited:
+        limiter.admit(client)
+    assert limited.value.retry_after == pytest.approx(30.0)
+    clock.now += 31
+    limiter.admit(client)
+    assert limiter.usage()["c"]["audio_s"] == 9.0
+
+
+def test_unlimited_quota_only_counts(clock):
+    limiter = RateLimiter()
+    client = Client("c", Quota())
+    for _ in range(100):
+        limiter.admit(client)
+    limiter.charge_audio(client, 1000.0)
+    assert limiter.usage()["c"] == {"requests": 100, "limited": 0, "audio_s": 1000.0, "last_seen": 1000.0}
+
+
+def test_sqlite_store_is_shared_between_limiters(tmp_path, clock):
+    first = RateLimiter(SqliteStore(tmp_path / "limits.db"))
+    second = RateLimiter(SqliteStore(tmp_path / "limits.db"))
+    client = Client("c", Quota(requests_per_minute=2))
+    first.admit(client)
+    second.admit(client)
+    with pytest.raises(RateLimited):
+        first.admit(client)
+    assert second.usage()["c"]["requests"] == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
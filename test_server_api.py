@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for the HTTP endpoints, driving the real app on the fake backend
+"""
+
+import io
+import json
+import sys
+import threading
+import time
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(server):
+    with TestClient(server.app) as client:
+        yield client
+
+
+def _wait_for(fn, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not fn():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_phrase_endpoints_resolve_the_voice_like_define(client):
+    r = client.put("/phrases/alice", json={"phrases": {"hi": "Welcome back!"}})
+    assert r.status_code == 202 and r.json()["voice"] == "alice.wav"
+    _wait_for(lambda: client.get("/phrases/alice").json()["state"] == "ready")
+    assert client.get("/phrases/alice").json()["rendered"] == ["hi"]
+    for path in ("/phrases/alice/hi", "/phrases/alice.wav/hi"):
+        r = client.get(path)
+        assert r.status_code == 200 and r.headers["x-tts-cache"] == "phrase"
+    assert client.delete("/phrases/alice").json() == {"voice": "alice.wav", "removed": True}
+    assert client.get("/phrases/alice.wav").status_code == 404
+    assert client.delete("/phrases/alice").status_code == 404
+
+
+
+def test_batch_reports_item_errors_without_failing_the_batch(client):
+    items = [
+        {"text": "The first line of the batch.", "voice": "alice.wav"},
+        {"text": "Nobody reads this.", "voice": "nobody.wav"},
+        {"voice": "alice.wav"},
+        {"text": "Not in this format.", "voice": "alice.wav", "output_format": "mp3"},
+        {"text": "The last line of the batch.", "voice": "alice.wav", "output_format": "pcm"},
+    ]
+    r = client.post("/api/tts/batch", json={"items": items})
+    assert r.status_code == 200
+    results = sorted((json.loads(line) for line in r.text.splitlines()), key=lambda item: item["index"])
+    statuses = [item.get("status") if not item["ok"] else 200 for item in results]
+    assert statuses == [200, 404, 422, 400, 200]
+    assert results[4]["filename"] == "004.pcm" and results[4]["audio_base64"]
+
+    r = client.post("/api/tts/batch", json={"items": items[:2], "format": "zip"})
+    with zipfile.ZipFile(io.BytesIO(r.content)) as archive:
+        manifest = json.loads(archive.read("manifest.json"))["items"]
+        assert archive.read("000.wav")[:4] == b"RIFF"
+    assert [entry["ok"] for entry in manifest] == [True, False] and manifest[1]["status"] == 404
+
+
+def test_tts_is_served_from_the_matching_speculation(server, client, hold_worker):
+    release = hold_worker()
+    typing = {"voice": "alice.wav", "session": "typing"}
+    first = client.post("/api/tts/speculate", json={**typing, "text": "Speculation is"}).json()
+    assert first["status"] == "queued"
+    second = client.post("/api/tts/speculate", json={**typing, "text": "Speculation is served."}).json()
+    assert second["status"] == "queued" and second["superseded"] == 1
+
+    responses = []
+    request = {"voice": "alice.wav", "text": "Speculation is served."}
+    thread = threading.Thread(target=lambda: responses.append(client.post("/api/tts", json=request)))
+    thread.start()
+    # The real request joins the speculative job and lifts it to interactive priority.
+    _wait_for(lambda: server.scheduler.stats()["queued_by_priority"] == {"0": 1})
+    release.set()
+    thread.join(10)
+    assert responses[0].status_code == 200 and responses[0].headers["x-tts-cache"] == "joined"
+    again = client.post("/api/tts", json=request)
+    assert again.headers["x-tts-cache"] == "hit" and again.content == responses[0].content
+
+
+def test_prefetch_and_pin_show_up_in_list_voices(client):
+    def alice():
+        return next(v for v in client.get("/list-voices").json()["voices"] if v["filename"] == "alice.wav")
+
+    r = client.post("/voices/alice.wav/prefetch", params={"pin": "true"})
+    assert r.status_code == 200
+    resident = r.json()["resident"]
+    assert resident["cached"] and resident["pinned"] and resident["embedding"] and resident["audio"]
+    assert alice()["resident"]["pinned"] and alice()["valid"]
+    assert "alice.wav" in client.get("/list-voices").json()["voice_cache"]["pinned"]
+
+    assert client.delete("/voices/alice.wav/pin").json() == {"voice": "alice.wav", "unpinned": True}
+    resident = alice()["resident"]
+    assert resident["cached"] and not resident["pinned"]
+    assert client.post("/voices/nobody.wav/prefetch").status_code == 404
+
+
+def test_expired_deadline_is_dropped_with_504(server, client, hold_worker):
+    request = {"voice": "alice.wav", "text": "Nobody waits for this line."}
+    assert client.post("/api/tts", json=request, headers={"X-TTS-Deadline-Ms": "0"}).status_code == 400
+    expired = server.scheduler.stats()["expired"]
+    release = hold_worker()
+    r = client.post("/api/tts", json=request, headers={"X-TTS-Deadline-Ms": "1"})
+    assert r.status_code == 504 and "Deadline" in r.json()["detail"]
+    release.set()
+    # The queued job is dropped rather than rendered for nobody.
+    _wait_for(lambda: server.scheduler.stats()["queued"] == 0)
+    assert server.scheduler.stats()["expired"] == expired + 1
+    assert client.post("/api/tts", json=request).headers["x-tts-cache"] == "miss"
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
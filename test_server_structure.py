@@ -38,6 +38,7 @@ def test_server_structure():
     required_endpoints = [
         '@app.post("/api/tts")',
         '@app.post("/tts")',
+        '@app.post("/api/tts/batch")',
         '@app.post("/upload-reference")',
         '@app.get("/health")',
         '@app.get("/info")',
@@ -86,7 +87,7 @@ def test_server_structure():
         print("❌ Language fallback to Auto missing")
         return False
 
-    if 'supported_lower = {lang.lower(): lang for lang in SUPPORTED_LANGUAGES}' in content:
+    if 'SUPPORTED_LOWER = {lang.lower(): lang for lang in SUPPORTED_LANGUAGES}' in content:
         print("✅ Language normalization found")
     else:
         print("❌ Language normalization missing")
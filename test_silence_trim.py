@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for silence trimming and pause compaction
+"""
+
+import sys
+
+import numpy as np
+import pytest
+
+from silence_trim import frame_levels_db, trim_silence, trim_silence_batch
+
+SR = 24000
+
+
+def _tone(seconds: float, amplitude: float = 0.5) -> np.ndarray:
+    t = np.arange(int(seconds * SR)) / SR
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SR), dtype=np.float32)
+
+
+def test_frame_levels():
+    levels = frame_levels_db(np.concatenate([_silence(0.1), _tone(0.1)]), 480)
+    assert levels[0] < -100 and levels[-1] == pytest.approx(20 * np.log10(0.5 / np.sqrt(2)), abs=0.2)
+
+
+def test_trims_edges_and_keeps_padding():
+    audio = np.concatenate([_silence(1.0), _tone(0.5), _silence(2.0)])
+    trimmed, removed = trim_silence(audio, SR, pad_seconds=0.05, max_pause_seconds=0)
+    assert len(trimmed) / SR == pytest.approx(0.6, abs=0.03)
+    assert removed == pytest.approx(len(audio) / SR - len(trimmed) / SR)
+    # Short fades at the cuts: no click at either end.
+    assert abs(trimmed[0]) < 1e-3 and abs(trimmed[-1]) < 1e-3
+
+
+def test_clamps_long_internal_pauses_only():
+    long_pause = np.concatenate([_tone(0.5), _silence(2.0), _tone(0.5)])
+    trimmed, removed = trim_silence(long_pause, SR, pad_seconds=0, max_pause_seconds=0.5)
+    assert len(trimmed) / SR == pytest.approx(1.5, abs=0.05)
+    assert removed == pytest.approx(1.5, abs=0.05)
+
+    short_pause = np.concatenate([_tone(0.5), _silence(0.3), _tone(0.5)])
+    trimmed, removed = trim_silence(short_pause, SR, pad_seconds=0, max_pause_seconds=0.5)
+    assert removed == pytest.approx(0.0, abs=0.02)
+
+
+def test_quiet_speech_is_not_silence_but_digital_silence_is_kept():
+    quiet = np.concatenate([_silence(0.5), _tone(0.5, amplitude=0.01), _silence(0.5)])
+    trimmed, _ = trim_silence(quiet, SR, pad_seconds=0)
+    assert len(trimmed) / SR == pytest.approx(0.5, abs=0.03)
+    silent = _silence(1.0)
+    trimmed, removed = trim_silence(silent, SR)
+    assert len(trimmed) == len(silent) and removed == 0.0
+
+
+def test_batch():
+    wavs, removed = trim_silence_batch([np.concatenate([_silence(0.5), _tone(0.2)]), _tone(0.2)], SR, pad_seconds=0)
+    assert removed[0] == pytest.approx(0.5, abs=0.03) and removed[1] == pytest.approx(0.0, abs=0.02)
+    assert len(wavs) == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the text frontend (Discord markup normalization and language detection)
+"""
+
+import sys
+
+from text_frontend import (
+    clean_description,
+    detect_language,
+    expand_english,
+    prepare_text,
+    strip_discord_markup,
+)
+
+
+def test_discord_markup_is_removed():
+    text = "hey <@123456> <@!42> <@&7> <#99> look <:pepe:123456789> <a:dance:1> 🔥🔥 https://example.com/x?y=1"
+    assert strip_discord_markup(text) == "hey look link"
+
+
+def test_markdown_and_spoilers_are_unwrapped():
+    assert strip_discord_markup("**bold** __under__ ~~gone~~ ||secret|| `code`") == "bold under gone secret code"
+    assert strip_discord_markup("snake_case stays") == "snake_case stays"
+    assert strip_discord_markup("> quoted line") == "quoted line"
+
+
+def test_repetition_is_collapsed():
+    assert strip_discord_markup("loooool") == "lool"
+    assert strip_discord_markup("hahahahaha") == "haha"
+    assert strip_discord_markup("what!!!!!???") == "what!?"
+    assert strip_discord_markup("gg gg gg gg gg") == "gg gg"
+    # Digits are never collapsed.
+    assert strip_discord_markup("1000") == "1000"
+
+
+def test_english_numbers_and_abbreviations():
+    assert expand_english("21") == "twenty-one"
+    assert expand_english("1,250") == "one thousand two hundred fifty"
+    assert expand_english("45.5%") == "forty-five point five percent"
+    assert expand_english("2nd and 23rd") == "second and twenty-third"
+    assert expand_english("007") == "zero zero seven"
+    assert expand_english("me & you btw") == "me and you by the way"
+
+
+def test_times_prices_and_hash_numbers():
+    assert expand_english("at 5:30pm") == "at five thirty p m"
+    assert expand_english("10:05 or 7 a.m.") == "ten oh five or seven a m."
+    assert expand_english("5:00") == "five o'clock"
+    assert expand_english("$5 or $1") == "five dollars or one dollar"
+    assert expand_english("€1.50") == "one euro fifty cents"
+    assert expand_english("#1 fan") == "number one fan"
+
+
+def test_symbol_attached_numbers_are_left_alone():
+    assert expand_english("call 555-1234") == "call 555-1234"
+    assert expand_english("v2 is 1/2 done, $50k") == "v2 is 1/2 done, $50k"
+    # "St." is street or saint: not expanded.
+    assert expand_english("Main St.") == "Main St."
+
+
+def test_language_detection():
+    assert detect_language("the cat is on the table and it is happy") == "English"
+    assert detect_language("je suis très content, c'est pas mal") == "French"
+    assert detect_language("ich bin müde und das ist nicht gut") == "German"
+    assert detect_language("こんにちは") == "Japanese"
+    assert detect_language("안녕하세요") == "Korean"
+    assert detect_language("你好") == "Chinese"
+    assert detect_language("привет") == "Russian"
+    assert detect_language("ok") is None
+    assert detect_language("questo è molto bello, sono contento") == "Italian"
+
+
+def test_short_english_chat_is_not_called_another_language():
+    # One shared or single-letter stopword is not evidence ("a", "no" are everyday English).
+    for text in ("grab a beer", "a dog barked loudly", "has anyone seen a ghost", "no way", "no problem man"):
+        assert detect_language(text) is None, text
+    assert prepare_text("no problem man", "Auto")[1] == "Auto"
+
+
+def test_prepare_text_resolves_auto_and_keeps_explicit_language():
+    text, language = prepare_text("I have 3 cats and it is great", "Auto")
+    assert language == "English"
+    assert text == "I have three cats and it is great"
+
+    text, language = prepare_text("3 chats", "French")
+    assert language == "French"
+    assert text == "3 chats"
+
+    text, language = prepare_text("ok", "Auto")
+    assert language == "Auto"
+
+
+def test_length_bounds():
+    text, _ = prepare_text("a " * 1000)
+    assert len(text) <= 600
+    assert clean_description("x\x00" * 300) == "x" * 200
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the inference backend interface (fake, torch wrapper, ONNX module swap)
+"""
+
+import sys
+
+import numpy as np
+import pytest
+import torch
+
+from tts_backends import FakeBackend, OrtModule, TorchBackend, create_backend, resolve_module
+
+SAMPLING = {"temperature": 0.9, "top_p": 0.9, "top_k": 50}
+
+
+def test_create_backend_by_name():
+    assert isinstance(create_backend(" Fake "), FakeBackend)
+    assert isinstance(create_backend(None), TorchBackend)
+    with pytest.raises(ValueError):
+        create_backend("tensorrt")
+
+
+def test_fake_backend_is_deterministic_and_follows_text():
+    backend = FakeBackend()
+    backend.load()
+    speaker = backend.embed_speaker((np.ones(2400, dtype=np.float32), 24000))
+    texts = ["Hello there", "Hello there, how are you doing today?"]
+    wavs, sr = backend.generate(texts, ["English"] * 2, speaker=speaker, **SAMPLING)
+    again, _ = backend.generate(texts[:1], ["English"], speaker=speaker, **SAMPLING)
+    assert sr == backend.sr and np.array_equal(wavs[0], again[0])
+    assert len(wavs[1]) > len(wavs[0]) > 0
+    other, _ = backend.generate(texts[:1], ["English"], speaker=speaker, style="whisper", **SAMPLING)
+    assert not np.array_equal(other[0], wavs[0])
+    capped, _ = backend.generate(texts[1:], ["English"], speaker=speaker, max_new_tokens=6, **SAMPLING)
+    assert len(capped[0]) == int(6 / backend.frame_rate * sr)
+    assert backend.accepts("max_new_tokens") and not backend.accepts("stopping_criteria")
+
+
+class _Model:
+    sr = 16000
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_voice_clone(self, text, language, voice_description=None, max_new_tokens=None, **kw):
+        self.calls.append((text, language, kw))
+        return [np.zeros(10)] * (len(text) if isinstance(text, list) else 1), self.sr
+
+
+def test_torch_backend_wraps_generate_voice_clone():
+    backend = TorchBackend("test-model")
+    backend.model = _Model()
+    backend._kwargs = {"text", "language", "voice_description", "max_new_tokens"}
+    assert backend.sr == 16000 and backend.accepts("max_new_tokens") and not backend.accepts("stopping_criteria")
+    wavs, _ = backend.generate(["a", "b"], ["English", "English"], speaker=["prompt"], **SAMPLING)
+    text, _, kw = backend.model.calls[-1]
+    assert text == ["a", "b"] and kw["voice_clone_prompt"] == ["prompt", "prompt"] and len(wavs) == 2
+    backend.generate(["a"], ["English"], ref_audio="ref.wav", **SAMPLING)
+    text, language, kw = backend.model.calls[-1]
+    assert text == "a" and language == "English" and kw["ref_audio"] == "ref.wav"
+
+
+class _Session:
+    def __init__(self):
+        self.feeds = None
+
+    def run(self, names, feeds):
+        self.feeds = feeds
+        return [feeds["x"] * 2, feeds["scale"]]
+
+
+def test_ort_module_replaces_a_submodule():
+    root = torch.nn.Sequential()
+    root.add_module("decoder", torch.nn.Linear(2, 2))
+    session = _Session()
+    parent, attr = resolve_module(root, "decoder")
+    setattr(parent, attr, OrtModule(session, [{"name": "x", "position": 0}, {"name": "scale", "position": None}], 2))
+    x = torch.ones(1, 2, dtype=torch.bfloat16)
+    doubled, scale = root.decoder(x, scale=torch.tensor([3]))
+    assert session.feeds["x"].dtype == np.float32
+    assert doubled.dtype == torch.bfloat16 and doubled.tolist() == [[2.0, 2.0]] and scale.tolist() == [3]
+    with pytest.raises(ValueError):
+        resolve_module(root, "missing")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-node gateway, against in-process stand-in backends
+"""
+
+import sys
+
+import httpx
+import pytest
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from tts_gateway import Gateway, HashRing, create_app
+
+
+def _stand_in(name: str, state: dict) -> FastAPI:
+    """A fake TTS server that answers with its own name."""
+    app = FastAPI()
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "scheduler": {"queued": state.get("queued", 0), "running": 0, "workers": 1}}
+
+    @app.post("/api/tts")
+    def tts(payload: dict, request: Request):
+        if state.get("fail"):
+            raise HTTPException(status_code=500, detail="boom")
+        state.setdefault("voices", []).append(payload["voice"])
+        state["headers"] = dict(request.headers)
+        return Response(content=name.encode(), media_type="audio/wav",
+                        headers={"Content-Location": f"/api/tts/audio/{name}-key"})
+
+    @app.api_route("/api/tts/audio/{key}", methods=["GET", "HEAD"])
+    def audio(key: str):
+        if not key.startswith(name):
+            raise HTTPException(status_code=404)
+        return Response(content=name.encode(), media_type="audio/wav")
+
+    @app.api_route("/phrases/{voice}", methods=["GET", "PUT", "DELETE"])
+    @app.get("/phrases/{voice}/{phrase_id}")
+    def phrases(voice: str, request: Request, phrase_id: str | None = None):
+        state.setdefault("phrases", []).append((request.method, voice, phrase_id))
+        return {"voice": voice}
+
+    @app.post("/upload-reference")
+    async def upload(file: UploadFile = File(...), name: str | None = Form(default=None)):
+        state["uploaded"] = (name or file.filename, len(await file.read()))
+        return {"status": "ok"}
+
+    return app
+
+
+class _Dispatch(httpx.AsyncBaseTransport):
+    """Route requests to stand-in apps by host; hosts in `down` refuse connections."""
+
+    def __init__(self, apps: dict, down: set):
+        self.transports = {host: httpx.ASGITransport(app=app) for host, app in apps.items()}
+        self.down = down
+
+    async def handle_async_request(self, request):
+        if request.url.host in self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        return await self.transports[request.url.host].handle_async_request(request)
+
+
+@pytest.fixture
+def cluster():
+    states = {host: {} for host in ("a", "b", "c")}
+    down = set()
+    transport = _Dispatch({host: _stand_in(host, state) for host, state in states.items()}, down)
+    gateway = Gateway([f"http://{host}" for host in states], transport=transport, spill_threshold=4)
+    with TestClient(create_app(gateway, poll=False)) as client:
+        yield client, gateway, states, down
+
+
+def test_ring_is_stable_when_a_node_is_added():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    voices = [f"voice{i}.wav" for i in range(1000)]
+    moved = sum(before.candidates(v)[0] != after.candidates(v)[0] for v in voices)
+    assert 150 < moved < 400  # ~1/4 of the keys move, and only to the new node
+    assert all(after.candidates(v)[0] == "d" for v in voices if before.candidates(v)[0] != after.candidates(v)[0])
+
+
+def test_same_voice_sticks_to_one_backend(cluster):
+    client, _, _, _ = cluster
+    served = {client.post("/api/tts", json={"text": "hi", "voice": "alice.wav"}).content for _ in range(5)}
+    assert len(served) == 1
+
+
+def test_failover_on_error_and_refused_connection(cluster):
+    client, gateway, states, down = cluster
+    home = gateway.route("alice.wav")[0].url.split("//")[1]
+    states[home]["fail"] = True
+    r = client.post("/api/tts", json={"text": "hi", "voice": "alice.wav"})
+    assert r.status_code == 200 and r.content.decode() != home
+    states[home]["fail"] = False
+    down.add(home)
+    r = client.post("/api/tts", json={"text": "hi", "voice": "alice.wav"})
+    assert r.status_code == 200 and r.content.decode() != home
+    assert gateway.backends[f"http://{home}"].healthy is False
+
+
+def test_spills_when_home_queue_is_much_deeper(cluster):
+    client, gateway, states, _ = cluster
+    home, second = gateway.route("bob.wav")
+    gateway.backends[home.url].queued = 10
+    assert gateway.route("bob.wav")[0] is second
+    gateway.backends[home.url].queued = 3
+    assert gateway.route("bob.wav")[0] is home
+
+
+def test_cached_audio_is_fetched_from_its_node(cluster):
+    client, _, _, _ = cluster
+    first = client.post("/api/tts", json={"text": "hi", "voice": "carol.wav"})
+    r = client.get(first.headers["content-location"])
+    assert r.status_code == 200 and r.content == first.content
+    assert client.get("/api/tts/audio/nowhere").status_code == 404
+
+
+def test_deadline_reaches_the_backend(cluster):
+    client, _, states, _ = cluster
+    r = client.post("/api/tts", json={"text": "hi", "voice": "alice.wav"}, headers={"X-TTS-Deadline-Ms": "30000"})
+    assert states[r.headers["x-tts-backend"].removeprefix("http://")]["headers"]["x-tts-deadline-ms"] == "30000"
+
+
+def test_client_identity_reaches_the_backend(cluster):
+    client, _, states, _ = cluster
+    r = client.post("/api/tts", json={"text": "hi", "voice": "alice.wav"},
+                    headers={"X-API-Key": "secret", "Authorization": "Bearer tok", "X-TTS-Client": "bot",
+                             "X-Forwarded-For": "198.51.100.7"})
+    seen = states[r.headers["x-tts-backend"].removeprefix("http://")]["headers"]
+    assert seen["x-api-key"] == "secret" and seen["authorization"] == "Bearer tok"
+    assert seen["x-tts-client"] == "bot"
+    # The gateway appends the address it saw, for nodes that trust it (TTS_TRUSTED_PROXIES).
+    assert seen["x-forwarded-for"] == "198.51.100.7, testclient"
+
+
+def test_phrases_and_sessions_follow_the_voice(cluster):
+    client, _, states, _ = cluster
+    home = client.post("/api/tts", json={"text": "hi", "voice": "alice.wav"}).headers["x-tts-backend"]
+    for method, path in (("PUT", "/phrases/alice"), ("GET", "/phrases/alice.wav"),
+                         ("GET", "/phrases/alice.wav/hi"), ("DELETE", "/phrases/alice")):
+        r = client.request(method, path, json={"phrases": {"hi": "Hello"}} if method == "PUT" else None)
+        assert r.status_code == 200 and r.headers["x-tts-backend"] == home
+    assert [call[0] for call in states[home.removeprefix("http://")]["phrases"]] == ["PUT", "GET", "GET", "DELETE"]
+    located = client.get("/voices/alice/home").json()
+    assert located["backend"] == home and located["ws"] == f"ws://{home.removeprefix('http://')}/ws"
+
+
+def test_upload_is_replicated_to_all_backends(cluster):
+    client, _, states, _ = cluster
+    r = client.post("/upload-reference", files={"file": ("x.wav", b"RIFF0000")}, data={"name": "new.wav"})
+    assert r.status_code == 200
+    assert r.json()["replicated"] == 3
+    assert all(state["uploaded"] == ("new.wav", 8) for state in states.values())
+
+
+def test_health_polling_updates_load(cluster):
+    client, gateway, states, _ = cluster
+    states["a"]["queued"] = 7
+    client.portal.call(gateway.check, gateway.backends["http://a"])
+    assert client.get("/health").json()["backends"]["http://a"]["queued"] == 7
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the structured logging subsystem
+"""
+
+import io
+import json
+import logging
+import sys
+
+import pytest
+
+from tts_logging import SampleFilter, fields, get_logger, setup_logging, shutdown_logging
+
+
+def _capture(**kwargs) -> io.StringIO:
+    stream = io.StringIO()
+    setup_logging(stream=stream, **kwargs)
+    return stream
+
+
+def test_text_format_keeps_level_tags_and_fields():
+    stream = _capture(level="INFO", fmt="text")
+    log = get_logger("test")
+    log.info("Pinned voice: %s", "alice.wav", extra=fields(seconds=7.5))
+    log.debug("hidden")
+    shutdown_logging()
+    assert stream.getvalue() == "[INFO] Pinned voice: alice.wav seconds=7.5\n"
+
+
+def test_json_format_one_object_per_line():
+    stream = _capture(level="DEBUG", fmt="json")
+    log = get_logger("test")
+    log.debug("TTS request", extra=fields(voice="alice.wav", chars=12))
+    log.warning("busy")
+    shutdown_logging()
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["level"] == "DEBUG" and first["logger"] == "tts.test"
+    assert first["voice"] == "alice.wav" and first["chars"] == 12
+    assert second["msg"] == "busy"
+
+
+def test_disabled_level_never_formats_arguments():
+    class Exploding:
+        def __str__(self):
+            raise AssertionError("formatted")
+
+    _capture(level="INFO")
+    get_logger("test").debug("value %s", Exploding())
+    shutdown_logging()
+
+
+def test_sampling_only_thins_low_levels():
+    sampler = SampleFilter(every=4)
+
+    def record(level):
+        return logging.LogRecord("tts", level, __file__, 1, "msg", None, None)
+
+    assert sum(sampler.filter(record(logging.DEBUG)) for _ in range(100)) == 25
+    assert all(sampler.filter(record(logging.WARNING)) for _ in range(10))
+
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        setup_logging(fmt="xml")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Tests for the priority job scheduler and the short-lived audio cache
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from audio_cache import AudioCache, make_cache_key
+from tts_scheduler import (
+    PRIORITY_INTERACTIVE,
+    PRIORITY_BATCH,
+    PRIORITY_SPECULATIVE,
+    CostModel,
+    Deadline,
+    DeadlineExceeded,
+    JobCancelled,
+    JobScheduler,
+)
+
+
+def _block_worker(scheduler: JobScheduler) -> threading.Event:
+    """Occupy the single worker until the returned event is set."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    scheduler.submit(hold)
+    assert started.wait(5)
+    return release
+
+
+def test_interactive_jobs_run_before_speculative():
+    scheduler = JobScheduler(workers=1)
+    release = _block_worker(scheduler)
+    order = []
+    spec = scheduler.submit(lambda: order.append("spec"), PRIORITY_SPECULATIVE)
+    real = scheduler.submit(lambda: order.append("real"), PRIORITY_INTERACTIVE)
+    release.set()
+    spec.future.result(5)
+    real.future.result(5)
+    assert order == ["real", "spec"]
+
+
+def test_session_supersedes_queued_speculation():
+    scheduler = JobScheduler(workers=1)
+    release = _block_worker(scheduler)
+    old = scheduler.submit(lambda: "old", PRIORITY_SPECULATIVE, key="a", session="s")
+    new = scheduler.submit(lambda: "new", PRIORITY_SPECULATIVE, key="b", session="s")
+    assert scheduler.cancel_session("s", keep=new.id) == 1
+    assert scheduler.find("a") is None
+    release.set()
+    assert new.future.result(5) == "new"
+    try:
+        old.future.result(5)
+    except JobCancelled:
+        pass
+    else:
+        raise AssertionError("superseded job should be cancelled")
+
+
+def test_promoted_job_is_joined_and_not_superseded():
+    scheduler = JobScheduler(workers=1)
+    release = _block_worker(scheduler)
+    order = []
+    other = scheduler.submit(lambda: order.append("other"), PRIORITY_SPECULATIVE + 1)
+    spec = scheduler.submit(lambda: order.append("spec") or "audio", PRIORITY_SPECULATIVE, key="k", session="s")
+    joined = scheduler.find("k")
+    assert joined is spec
+    scheduler.promote(joined, PRIORITY_INTERACTIVE)
+    assert scheduler.cancel_session("s") == 0
+    release.set()
+    assert spec.future.result(5) == "audio"
+    other.future.result(5)
+    assert order == ["spec", "other"]
+
+
+def test_cancel_running_job_is_refused():
+    scheduler = JobScheduler(workers=1)
+    release = threading.Event()
+    job = scheduler.submit(lambda: release.wait(5))
+    time.sleep(0.05)
+    assert scheduler.cancel(job.id) is False
+    release.set()
+    assert job.future.result(5) is True
+
+
+def test_shorter_jobs_run_first_within_a_priority():
+    scheduler = JobScheduler(workers=1, aging=1.0)
+    release = _block_worker(scheduler)
+    order = []
+    essay = scheduler.submit(lambda: order.append("essay"), cost=30.0)
+    chat = scheduler.submit(lambda: order.append("chat"), cost=0.5)
+    batch = scheduler.submit(lambda: order.append("batch"), PRIORITY_BATCH, cost=0.1)
+    release.set()
+    for job in (essay, chat, batch):
+        job.future.result(5)
+    assert order == ["chat", "essay", "batch"]
+
+
+def test_aging_lets_long_jobs_overtake_newer_short_ones():
+    scheduler = JobScheduler(workers=1, aging=1000.0)
+    release = _block_worker(scheduler)
+    order = []
+    essay = scheduler.submit(lambda: order.append("essay"), cost=5.0)
+    time.sleep(0.02)  # 20 s of aging credit at this rate
+    chat = scheduler.submit(lambda: order.append("chat"), cost=0.5)
+    release.set()
+    essay.future.result(5)
+    chat.future.result(5)
+    assert order == ["essay", "chat"]
+
+
+def test_fair_share_interleaves_a_flooding_client():
+    scheduler = JobScheduler(workers=1, aging=1.0, fair_share=1.0)
+    release = _block_worker(scheduler)
+    order = []
+    jobs = [scheduler.submit(lambda i=i: order.append(f"bot{i}"), cost=2.0, client="bot") for i in range(3)]
+    jobs.append(scheduler.submit(lambda: order.append("user"), cost=2.0, client="user"))
+    # A heavier weight shrinks the handicap: 2 s of backlog at weight 4 counts as 0.5 s.
+    jobs += [scheduler.submit(lambda i=i: order.append(f"studio{i}"), cost=2.0, client="studio", weight=4.0)
+             for i in range(2)]
+    assert scheduler.stats()["client_backlog_s"]["bot"] == 6.0
+    release.set()
+    for job in jobs:
+        job.future.result(5)
+    assert order == ["bot0", "user", "studio0", "studio1", "bot1", "bot2"]
+    assert scheduler.stats()["client_backlog_s"] == {}
+
+
+def test_predicted_wait_counts_work_ahead():
+    scheduler = JobScheduler(workers=1)
+    release = _block_worker(scheduler)
+    scheduler.submit(lambda: None, cost=2.0)
+    scheduler.submit(lambda: None, PRIORITY_SPECULATIVE, cost=50.0)
+    assert 1.9 < scheduler.predict_wait(PRIORITY_INTERACTIVE, cost=3.0) < 2.1
+    short = scheduler.submit(lambda: None, cost=1.0)
+    assert short.predicted_wait < 0.1
+    # Depth counts waiting jobs only (the running one is not), optionally above a priority.
+    assert scheduler.depth() == 3 and scheduler.depth(PRIORITY_BATCH) == 2
+    release.set()
+    short.future.result(5)
+
+
+def test_compatible_jobs_of_similar_length_share_one_call():
+    scheduler = JobScheduler(workers=1, max_batch=3, length_ratio=2.0)
+    release = _block_worker(scheduler)
+    calls = []
+
+    def batch_fn(payloads):
+        calls.append(sorted(payloads))
+        return [p.upper() for p in payloads]
+
+    def submit(payload, cost, group="alice"):
+        return scheduler.submit(lambda: calls.append([payload]) or payload, cost=cost,
+                                batch_key=group, batch_fn=batch_fn, payload=payload)
+
+    jobs = [submit("a", 1.0), submit("b", 1.5), submit("long", 9.0), submit("other", 1.0, "bob"), submit("c", 1.2)]
+    release.set()
+    results = [job.future.result(5) for job in jobs]
+    assert results == ["A", "B", "long", "other", "C"]
+    assert ["a", "b", "c"] in calls
+    assert scheduler.stats()["batches"] == 1 and scheduler.stats()["batched_jobs"] == 3
+
+
+def test_failed_batch_falls_back_to_single_runs():
+    scheduler = JobScheduler(workers=1, max_batch=4)
+    release = _block_worker(scheduler)
+
+    def batch_fn(payloads):
+        raise RuntimeError("batched call failed")
+
+    def single(payload):
+        if payload == "bad":
+            raise ValueError(payload)
+        return payload
+
+    jobs = [scheduler.submit(lambda p=p: single(p), cost=1.0, batch_key="g", batch_fn=batch_fn, payload=p)
+            for p in ("ok", "bad")]
+    release.set()
+    assert jobs[0].future.result(5) == "ok"
+    with pytest.raises(ValueError):
+        jobs[1].future.result(5)
+
+
+def test_job_returning_future_frees_worker_and_stays_joinable():
+    scheduler = JobScheduler(workers=1)
+    later = Future()
+    first = scheduler.submit(lambda: later, PRIORITY_INTERACTIVE, key="k")
+    second = scheduler.submit(lambda: "next", PRIORITY_INTERACTIVE)
+    # The worker moved on while the first job's later stage is still running.
+    assert second.future.result(5) == "next"
+    assert not first.future.done()
+    assert scheduler.find("k") is first
+    later.set_result("audio")
+    assert first.future.result(5) == "audio"
+    assert scheduler.find("k") is None
+
+
+def test_expired_jobs_are_dropped_from_the_queue():
+    scheduler = JobScheduler(workers=1)
+    release = _block_worker(scheduler)
+    expired = scheduler.submit(lambda: "late", deadline=Deadline.after(10))
+    kept = scheduler.submit(lambda: "ok", deadline=Deadline.after(5000))
+    time.sleep(0.05)
+    release.set()
+    with pytest.raises(DeadlineExceeded):
+        expired.future.result(5)
+    assert kept.future.result(5) == "ok"
+    scheduler.record_wasted(0.5)
+    stats = scheduler.stats()
+    assert stats["expired"] == 1 and stats["aborted"] == 1 and stats["wasted_s"] == 0.5
+
+
+def test_deadline_is_abandoned_when_last_waiter_leaves():
+    deadline = Deadline.after(10_000)
+    deadline.join(Deadline.after(20_000))
+    assert deadline.remaining() > 15
+    deadline.leave()
+    assert not deadline.expired()
+    deadline.leave()
+    assert deadline.expired()
+    # A waiter without a deadline makes the shared one unbounded.
+    unbounded = Deadline.after(10)
+    unbounded.join(Deadline.after(None))
+    time.sleep(0.02)
+    assert unbounded.remaining() is None and not unbounded.expired()
+
+
+def test_cost_model_learns_rtf_per_voice():
+    model = CostModel(default_rtf=1.0, overhead=0.0)
+    assert model.estimate(100, "English") == model.estimate(100, "English", "alice.wav")
+    assert model.estimate(100, "Chinese") > model.estimate(100, "English")
+    model.observe(100, "English", "alice.wav", elapsed=1.0, audio_seconds=5.0)
+    assert abs(model.rtf("alice.wav") - 0.2) < 1e-9
+    assert abs(model.estimate(100, "English", "alice.wav") - 1.0) < 1e-9
+    assert model.stats()["observations"] == 1
+
+
+def test_audio_cache_expiry_and_byte_budget():
+    cache = AudioCache(max_bytes=10, default_ttl=60)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") == b"12345"
+    cache.put("c", b"12345")  # evicts least recently used ("b")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
+    cache.put("d", b"1", ttl=0)
+    assert cache.get("d") is None
+    assert cache.stats()["bytes"] <= 10
+
+
+def test_cache_key_is_order_independent():
+    assert make_cache_key(a=1, b="x") == make_cache_key(b="x", a=1)
+    assert make_cache_key(a=1) != make_cache_key(a=2)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
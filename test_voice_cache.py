@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the resident voice cache (LRU eviction and pinning)
+"""
+
+import sys
+from pathlib import Path
+
+from voice_cache import VoiceCache, VoiceEntry
+
+
+def _entry(name: str) -> VoiceEntry:
+    return VoiceEntry(name, Path(f"/refs/{name}"), 6.0)
+
+
+def test_unpinned_voices_are_evicted_lru():
+    cache = VoiceCache(max_unpinned=2)
+    cache.put(_entry("a.wav"))
+    cache.put(_entry("b.wav"))
+    cache.get("a.wav")
+    cache.put(_entry("c.wav"))
+    assert cache.get("b.wav") is None
+    assert cache.get("a.wav") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_pinned_voices_survive_eviction_and_reload_pinned():
+    cache = VoiceCache(max_unpinned=1)
+    cache.pin("keep.wav")
+    cache.put(_entry("keep.wav"))
+    cache.put(_entry("x.wav"))
+    cache.put(_entry("y.wav"))
+    assert cache.get("keep.wav").pinned is True
+    assert cache.get("x.wav") is None
+
+    # The pin applies to future loads after invalidation.
+    assert cache.invalidate() == ["keep.wav"]
+    assert cache.put(_entry("keep.wav")).pinned is True
+
+
+def test_unpin_makes_voice_evictable():
+    cache = VoiceCache(max_unpinned=0)
+    cache.pin("a.wav")
+    cache.put(_entry("a.wav"))
+    assert cache.unpin("a.wav") is True
+    assert cache.get("a.wav") is None
+    assert cache.unpin("a.wav") is False
+
+
+def test_put_keeps_existing_entry():
+    cache = VoiceCache()
+    first = cache.put(_entry("a.wav"))
+    first.prompt = object()
+    assert cache.put(_entry("a.wav")) is first
+    assert cache.residency()["a.wav"]["embedding"] is True
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk voice index and the precompute helpers
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from tts_backends import FakeBackend
+from voice_store import VoiceStore, embed_batch, embedder_key, find_voices, probe_voice
+
+
+def _clip(path, seconds=6.0, sr=16000):
+    t = np.arange(int(seconds * sr)) / sr
+    sf.write(str(path), (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32), sr)
+    return path
+
+
+def test_save_and_lookup_until_source_changes(tmp_path):
+    source = _clip(tmp_path / "alice.wav")
+    store = VoiceStore(tmp_path / ".voice_store")
+    audio = np.zeros(16000, dtype=np.float32)
+    store.save(source, source, 6.0, audio, 16000, prompt={"x": 1}, embedder="torch:m@cpu/fp32")
+
+    record = VoiceStore(store.root).lookup(source)
+    assert record["duration"] == 6.0
+    assert np.array_equal(store.load_audio(record), audio)
+    assert store.load_prompt(record, "torch:m@cpu/fp32") == {"x": 1}
+    # Same model at another precision or device: the prompt is recomputed.
+    assert store.load_prompt(record, "torch:m@cpu/int8") is None
+    assert store.load_prompt(record, "torch:m@cuda:0/bf16") is None
+
+    _clip(source, seconds=7.0)
+    os.utime(source, ns=(0, 1))
+    assert store.lookup(source) is None
+
+
+def test_converted_sibling_resolves_to_original(tmp_path):
+    original = _clip(tmp_path / "bob.flac")
+    store = VoiceStore(tmp_path / "store")
+    store.save(original, tmp_path / "bob.wav", 6.0, None, None)
+    assert store.lookup(tmp_path / "bob.wav")["source"] == "bob.flac"
+
+
+def test_probe_converts_and_rejects_short_clips(tmp_path):
+    ok = probe_voice(str(_clip(tmp_path / "long.flac")))
+    assert ok["ok"] and ok["sample_rate"] == 16000 and (tmp_path / "long.wav").exists()
+    short = probe_voice(str(_clip(tmp_path / "short.wav", seconds=2.0)))
+    assert not short["ok"] and "too short" in short["error"]
+
+
+def test_find_voices_skips_converted_siblings(tmp_path):
+    for name in ("a.flac", "a.wav", "b.wav", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert [p.name for p in find_voices(tmp_path)] == ["a.flac", "b.wav"]
+
+
+def test_embed_batch_uses_one_call_and_falls_back():
+    class Batched:
+        calls = 0
+
+        def embed_speaker(self, ref_audio):
+            Batched.calls += 1
+            return [sr for _, sr in ref_audio] if isinstance(ref_audio, list) else [ref_audio[1]]
+
+    class SingleOnly:
+        def embed_speaker(self, ref_audio):
+            if isinstance(ref_audio, list):
+                raise TypeError("one reference at a time")
+            return [ref_audio[1]]
+
+    probes = [{"audio": np.zeros(4), "sample_rate": sr} for sr in (16000, 24000)]
+    assert embed_batch(Batched(), probes) == [[16000], [24000]] and Batched.calls == 1
+    assert embed_batch(SingleOnly(), probes) == [[16000], [24000]]
+
+
+
+def test_embedder_key_names_backend_model_device_and_precision():
+    backend = FakeBackend()
+    assert embedder_key(backend) == "fake:fake@cpu/fp32"
+    backend.precision = "int8"
+    assert embedder_key(backend) == "fake:fake@cpu/int8"
+    # The fake backend embeds one reference per call, so a batch falls back to single calls.
+    probes = [{"audio": np.full(4, v, dtype=np.float32), "sample_rate": 16000} for v in (0.1, 0.2)]
+    assert [len(p) for p in embed_batch(backend, probes)] == [1, 1]
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Tests for the /ws session protocol framing
+"""
+
+import sys
+
+import pytest
+
+from ws_protocol import decode_audio_frame, encode_audio_frame, parse_client_message
+
+
+def test_bare_text_is_a_tts_request():
+    assert parse_client_message("gg everyone") == {"type": "tts", "text": "gg everyone"}
+    assert parse_client_message("42") == {"type": "tts", "text": "42"}
+
+
+def test_json_messages_default_to_tts():
+    assert parse_client_message('{"id": "a", "text": "hi"}') == {"type": "tts", "id": "a", "text": "hi"}
+    assert parse_client_message('{"type": "cancel", "id": "a"}')["type"] == "cancel"
+
+
+def test_audio_frame_roundtrip():
+    frame = encode_audio_frame({"id": "m1", "media_type": "audio/wav"}, b"RIFF....")
+    header, audio = decode_audio_frame(frame)
+    assert header == {"id": "m1", "media_type": "audio/wav"}
+    assert bytes(audio) == b"RIFF...."
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
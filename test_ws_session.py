@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the /ws session protocol (pipelining, cancel, flow control, config) on the fake backend
+"""
+
+import json
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ws_protocol import decode_audio_frame
+
+
+@pytest.fixture
+def session(server):
+    with TestClient(server.app) as client, client.websocket_connect("/ws") as ws:
+        ready = ws.receive_json()
+        assert ready["type"] == "ready"
+        yield ws, ready
+
+
+def _receive(ws) -> dict:
+    """Next server message; binary frames come back as {"type": "audio", header..., "audio": bytes}."""
+    message = ws.receive()
+    if message.get("bytes") is not None:
+        header, audio = decode_audio_frame(message["bytes"])
+        return {"type": "audio", **header, "audio": bytes(audio)}
+    return json.loads(message["text"])
+
+
+def test_config_is_validated_and_merged(session):
+    ws, ready = session
+    assert "voice" in ready["settings"] and "text" not in ready["settings"]
+    ws.send_json({"type": "config", "colour": "blue"})
+    assert _receive(ws)["status"] == 400
+    ws.send_json({"type": "config", "voice": "nobody.wav"})
+    assert _receive(ws)["status"] == 404
+    ws.send_json({"type": "config", "output_format": "wav", "sample_rate": 7})
+    assert _receive(ws)["type"] == "error"
+    ws.send_json({"type": "config", "voice": "alice.wav"})
+    assert _receive(ws) == {"type": "config_ok", "defaults": {"voice": "alice.wav"}}
+    ws.send_json({"type": "config", "language": "English"})
+    assert _receive(ws)["defaults"] == {"voice": "alice.wav", "language": "English"}
+
+
+def test_pipelined_requests_come_back_tagged(session, hold_worker):
+    ws, _ = session
+    ws.send_json({"type": "config", "voice": "alice.wav"})
+    assert _receive(ws)["type"] == "config_ok"
+    release = hold_worker()
+    ws.send_json({"type": "tts", "id": "a", "text": "Pipelined request number one."})
+    ws.send_text("Pipelined request number two.")  # bare text uses the session defaults
+    queued = [_receive(ws), _receive(ws)]
+    assert sorted(m["id"] for m in queued) == ["a", "r2"] and {m["type"] for m in queued} == {"queued"}
+    release.set()
+    results = [_receive(ws), _receive(ws)]
+    assert sorted(m["id"] for m in results) == ["a", "r2"]
+    for result in results:
+        assert result["type"] == "audio" and result["audio"][:4] == b"RIFF" and result["cache"] == "miss"
+
+
+def test_cancel_drops_a_queued_request(session, hold_worker):
+    ws, _ = session
+    release = hold_worker()
+    ws.send_json({"type": "tts", "id": "c", "voice": "alice.wav", "text": "This one is cancelled."})
+    assert _receive(ws)["type"] == "queued"
+    ws.send_json({"type": "cancel", "id": "c"})
+    assert _receive(ws) == {"type": "cancelled", "id": "c", "state": "queued"}
+    ws.send_json({"type": "cancel", "id": "c"})
+    assert _receive(ws)["status"] == 404
+    release.set()
+    # Nothing else arrives for the cancelled request.
+    ws.send_json({"type": "ping", "id": "p"})
+    assert _receive(ws) == {"type": "pong", "id": "p"}
+
+
+def test_flow_control_window_rejects_extra_requests(server, monkeypatch, hold_worker):
+    monkeypatch.setattr(server, "WS_MAX_INFLIGHT", 2)
+    with TestClient(server.app) as client, client.websocket_connect("/ws") as ws:
+        assert ws.receive_json()["window"] == 2
+        release = hold_worker()
+        for i in range(3):
+            ws.send_json({"type": "tts", "id": f"w{i}", "voice": "alice.wav", "text": f"Window test {i}."})
+        ws.send_json({"type": "tts", "id": "w0", "voice": "alice.wav", "text": "Duplicate id."})
+        messages = [_receive(ws) for _ in range(4)]
+        errors = {m["id"]: m["status"] for m in messages if m["type"] == "error"}
+        assert errors == {"w2": 429, "w0": 409}
+        release.set()
+        audio = [m for m in messages if m["type"] == "audio"]
+        while len(audio) < 2:
+            message = _receive(ws)
+            if message["type"] == "audio":
+                audio.append(message)
+        assert sorted(m["id"] for m in audio) == ["w0", "w1"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
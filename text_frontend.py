@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+text_frontend.py
+Text normalization and fast language detection for the Qwen3-TTS server
+Turns raw Discord chat text into short, speakable input before generation
+"""
+
+import re
+
+# Hard cap on characters sent to the model (matches the server's prior limit).
+MAX_TEXT_CHARS = 600
+MAX_DESCRIPTION_CHARS = 200
+
+# =======================
+# PRECOMPILED RULES
+# =======================
+
+_CONTROL_CHARS_RE = re.compile(r"[\x00-\x1f\x7f]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Discord markup
+_CODE_BLOCK_RE = re.compile(r"```.*?```", re.DOTALL)
+_INLINE_CODE_RE = re.compile(r"`([^`]*)`")
+_CUSTOM_EMOJI_RE = re.compile(r"<a?:\w+:\d+>")
+_USER_MENTION_RE = re.compile(r"<@!?\d+>")
+_ROLE_MENTION_RE = re.compile(r"<@&\d+>")
+_CHANNEL_MENTION_RE = re.compile(r"<#\d+>")
+_TIMESTAMP_RE = re.compile(r"<t:-?\d+(?::[tTdDfFR])?>")
+_SLASH_COMMAND_RE = re.compile(r"</[\w -]+:\d+>")
+_URL_RE = re.compile(r"<?https?://[^\s>]+>?", re.IGNORECASE)
+_EVERYONE_RE = re.compile(r"@(everyone|here)\b")
+_SPOILER_RE = re.compile(r"\|\|")
+_EMPHASIS_RE = re.compile(r"(\*{1,3}|_{2,3}|~~)")
+_SINGLE_UNDERSCORE_RE = re.compile(r"(?<!\w)_|_(?!\w)")
+_LINE_PREFIX_RE = re.compile(r"^\s*(?:>{1,3}|#{1,3}|-#)\s+", re.MULTILINE)
+_UNICODE_EMOJI_RE = re.compile(
+    "["
+    "\U0001F000-\U0001FAFF"  # pictographs, emoticons, transport, symbols
+    "\U0001F1E6-\U0001F1FF"  # regional indicators (flags)
+    "\u2600-\u27BF"          # misc symbols and dingbats
+    "\u2B00-\u2BFF"          # arrows and stars
+    "\uFE0E\uFE0F\u200D"     # variation selectors and ZWJ
+    "]+"
+)
+
+# Repetition ("loooool", "!!!!!", "hahahaha", "gg gg gg gg")
+_REPEATED_LETTER_RE = re.compile(r"([^\W\d_])\1{2,}")
+_REPEATED_UNIT_RE = re.compile(r"\b([^\W\d_]{2,3}?)\1{2,}\b", re.IGNORECASE)
+_REPEATED_WORD_RE = re.compile(r"\b(\w+)(?:\s+\1\b){2,}", re.IGNORECASE)
+_REPEATED_BANG_RE = re.compile(r"([!?])\1+")
+_ELLIPSIS_RE = re.compile(r"\.{3,}")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([,.!?;:])")
+
+# English numbers and abbreviations
+_ORDINAL_RE = re.compile(r"\b(\d{1,9})(st|nd|rd|th)\b", re.IGNORECASE)
+# Plain numbers stand alone: tokens glued to other symbols ("555-1234", "1/2", "v2") are left as written.
+_NUMBER_RE = re.compile(
+    r"(?<![^\s(\[\"'])(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d+))?(%?)(?![^\s,.!?;:)\]\"'])(?![,.:;][^\s)\]\"'])"
+)
+# Clock times ("5:30pm", "10:05", "7 a.m."), prices ("$5", "€1.50") and "#1".
+_CLOCK_RE = re.compile(r"(?<![\w.:])(\d{1,2}):([0-5]\d)(?:\s*([ap])\.?m\b)?(?![\w:])", re.IGNORECASE)
+_AMPM_RE = re.compile(r"(?<![\w.:])(\d{1,2})\s*([ap])\.?m\b", re.IGNORECASE)
+_CURRENCY_RE = re.compile(r"(?<![\w$€£])([$€£])(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?(?![\w%]|[.,]\d)")
+_HASH_NUMBER_RE = re.compile(r"(?<![\w#])#(\d+)(?!\w)")
+_CURRENCIES = {"$": ("dollar", "dollars", "cent", "cents"), "€": ("euro", "euros", "cent", "cents"),
+               "£": ("pound", "pounds", "penny", "pence")}
+
+_ABBREVIATIONS: dict[str, str] = {
+    "e.g.": "for example",
+    "i.e.": "that is",
+    "etc.": "et cetera",
+    "vs.": "versus",
+    "vs": "versus",
+    "mr.": "mister",
+    "mrs.": "missus",
+    "dr.": "doctor",
+    "approx.": "approximately",
+    "w/": "with",
+    "w/o": "without",
+    "&": "and",
+    "btw": "by the way",
+    "idk": "I don't know",
+    "imo": "in my opinion",
+    "tbh": "to be honest",
+    "brb": "be right back",
+    "afk": "away from keyboard",
+    "gg": "good game",
+    "np": "no problem",
+    "ty": "thank you",
+    "thx": "thanks",
+    "pls": "please",
+    "plz": "please",
+}
+_ABBREVIATION_RE = re.compile(
+    r"(?<![\w/])("
+    + "|".join(re.escape(k) for k in sorted(_ABBREVIATIONS, key=len, reverse=True))
+    + r")(?![\w/])",
+    re.IGNORECASE,
+)
+
+# Language detection
+_WORD_RE = re.compile(r"[^\W\d_]+")
+_SCRIPT_RES: tuple[tuple[str, re.Pattern], ...] = (
+    ("Japanese", re.compile(r"[\u3040-\u30ff]")),
+    ("Korean", re.compile(r"[\uac00-\ud7af\u1100-\u11ff]")),
+    ("Chinese", re.compile(r"[\u4e00-\u9fff]")),
+    ("Russian", re.compile(r"[\u0400-\u04ff]")),
+)
+_STOPWORD_LISTS: dict[str, str] = {
+    "English": "the and is are you to of it that this what for with was have not be on my your",
+    "German": "der die das und ist nicht ich du ein eine zu mit auf für sie wir was auch sehr",
+    "French": "le la les et est je tu un une des du pas que qui pour avec mais vous nous",
+    "Spanish": "el la los las y es que de no un una por para con pero muy qué yo estás está del",
+    "Italian": "il lo la gli le e è che di non un una per con sono ma molto io sei questo",
+    "Portuguese": "o a os as e é que de não um uma por para com mas muito eu você está isso também",
+}
+# Single letters, words shared between the lists, and words that are also everyday
+# English ("no way", "a dog") say nothing about the language.
+_AMBIGUOUS_WORDS = frozenset("no die con per son as".split())
+_SHARED_WORDS = frozenset(
+    word
+    for language, words in _STOPWORD_LISTS.items()
+    for word in words.split()
+    if any(word in other.split() for name, other in _STOPWORD_LISTS.items() if name != language)
+)
+_STOPWORDS: dict[str, frozenset[str]] = {
+    language: frozenset(
+        word for word in words.split()
+        if len(word) > 1 and word not in _SHARED_WORDS and word not in _AMBIGUOUS_WORDS
+    )
+    for language, words in _STOPWORD_LISTS.items()
+}
+# A language is only picked with this many stopword hits and this lead over the runner-up
+# (an explicit language overrides the model's own detection, so guessing wrong is worse than "Auto").
+_MIN_STOPWORD_HITS = 2
+_MIN_MARGIN = 2
+_DIACRITIC_HINTS: tuple[tuple[str, re.Pattern], ...] = (
+    ("German", re.compile(r"[äöüß]", re.IGNORECASE)),
+    ("Spanish", re.compile(r"[ñ¿¡]", re.IGNORECASE)),
+    ("French", re.compile(r"[çœêëîôû]", re.IGNORECASE)),  # è is Italian too
+    ("Portuguese", re.compile(r"[ãõ]", re.IGNORECASE)),
+    ("Italian", re.compile(r"[ìò]", re.IGNORECASE)),
+)
+
+# =======================
+# NUMBER EXPANSION (ENGLISH)
+# =======================
+
+_ONES = (
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen "
+    "fourteen fifteen sixteen seventeen eighteen nineteen"
+).split()
+_TENS = "_ _ twenty thirty forty fifty sixty seventy eighty ninety".split()
+_SCALES = ((10**9, "billion"), (10**6, "million"), (1000, "thousand"))
+_ORDINAL_IRREGULAR = {
+    "one": "first", "two": "second", "three": "third", "five": "fifth",
+    "eight": "eighth", "nine": "ninth", "twelve": "twelfth",
+}
+
+
+def _int_to_words(n: int) -> str:
+    """Spell out a non-negative integer below one trillion in English."""
+    if n < 20:
+        return _ONES[n]
+    if n < 100:
+        tens, ones = divmod(n, 10)
+        return _TENS[tens] + (f"-{_ONES[ones]}" if ones else "")
+    if n < 1000:
+        hundreds, rest = divmod(n, 100)
+        return f"{_ONES[hundreds]} hundred" + (f" {_int_to_words(rest)}" if rest else "")
+    for scale, name in _SCALES:
+        if n >= scale:
+            head, rest = divmod(n, scale)
+            return f"{_int_to_words(head)} {name}" + (f" {_int_to_words(rest)}" if rest else "")
+    return str(n)
+
+
+def _ordinal_words(n: int) -> str:
+    words = _int_to_words(n)
+    head, sep, last = words.rpartition(" ")
+    if "-" in last:
+        prefix, _, last = last.rpartition("-")
+        head, sep = f"{head}{sep}{prefix}".strip(), "-"
+    if last in _ORDINAL_IRREGULAR:
+        last = _ORDINAL_IRREGULAR[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return f"{head}{sep}{last}" if head else last
+
+
+def _number_words(integer: str) -> str:
+    value = int(integer.replace(",", ""))
+    if value >= 10**12 or (len(integer) > 1 and integer.startswith("0")):
+        # IDs, phone numbers, zero-padded codes: read digit by digit.
+        return " ".join(_ONES[int(d)] for d in integer if d.isdigit())
+    return _int_to_words(value)
+
+
+def _expand_number(match: re.Match) -> str:
+    integer, fraction, percent = match.group(1), match.group(2), match.group(3)
+    words = _number_words(integer)
+    if fraction:
+        words += " point " + " ".join(_ONES[int(d)] for d in fraction)
+    if percent:
+        words += " percent"
+    return words
+
+
+def _clock_words(hour: int, minute: int, meridiem: str | None) -> str:
+    words = _int_to_words(hour)
+    if minute:
+        words += (" oh " if minute < 10 else " ") + _int_to_words(minute)
+    elif not meridiem:
+        words += " o'clock"
+    return words + (f" {meridiem.lower()} m" if meridiem else "")
+
+
+def _expand_clock(match: re.Match) -> str:
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if hour > 24:
+        return match.group(0)
+    return _clock_words(hour, minute, match.group(3))
+
+
+def _expand_ampm(match: re.Match) -> str:
+    hour = int(match.group(1))
+    if not 1 <= hour <= 12:
+        return match.group(0)
+    return _clock_words(hour, 0, match.group(2))
+
+
+def _expand_currency(match: re.Match) -> str:
+    one, many, cent, cents = _CURRENCIES[match.group(1)]
+    amount = int(match.group(2).replace(",", ""))
+    words = f"{_number_words(match.group(2))} {one if amount == 1 else many}"
+    if match.group(3):
+        fraction = int(match.group(3).ljust(2, "0"))
+        if fraction:
+            words += f" {_int_to_words(fraction)} {cent if fraction == 1 else cents}"
+    return words
+
+
+def _expand_hash_number(match: re.Match) -> str:
+    return "number " + _number_words(match.group(1))
+
+
+def _expand_ordinal(match: re.Match) -> str:
+    return _ordinal_words(int(match.group(1)))
+
+
+def _expand_abbreviation(match: re.Match) -> str:
+    return _ABBREVIATIONS[match.group(1).lower()]
+
+# =======================
+# PUBLIC API
+# =======================
+
+
+def strip_control_chars(text: str) -> str:
+    """Remove control chars (0x00-0x1f, 0x7f) and surrounding whitespace."""
+    return _CONTROL_CHARS_RE.sub("", (text or "").strip())
+
+
+def clean_description(text: str, max_chars: int = MAX_DESCRIPTION_CHARS) -> str:
+    """Sanitize a short style prompt (control chars removed, bounded length)."""
+    return strip_control_chars(text)[:max_chars]
+
+
+def strip_discord_markup(text: str) -> str:
+    """Drop mentions, emoji, URLs and markdown, and collapse repeated characters."""
+    text = _CODE_BLOCK_RE.sub(" code block ", text)
+    text = _INLINE_CODE_RE.sub(r"\1", text)
+    text = _CUSTOM_EMOJI_RE.sub(" ", text)
+    text = _USER_MENTION_RE.sub(" ", text)
+    text = _ROLE_MENTION_RE.sub(" ", text)
+    text = _CHANNEL_MENTION_RE.sub(" ", text)
+    text = _TIMESTAMP_RE.sub(" ", text)
+    text = _SLASH_COMMAND_RE.sub(" ", text)
+    text = _URL_RE.sub(" link ", text)
+    text = _EVERYONE_RE.sub(r"\1", text)
+    text = _LINE_PREFIX_RE.sub("", text)
+    text = _SPOILER_RE.sub("", text)
+    text = _EMPHASIS_RE.sub("", text)
+    text = _SINGLE_UNDERSCORE_RE.sub("", text)
+    text = _UNICODE_EMOJI_RE.sub(" ", text)
+    text = _REPEATED_UNIT_RE.sub(r"\1\1", text)
+    text = _REPEATED_LETTER_RE.sub(r"\1\1", text)
+    text = _REPEATED_WORD_RE.sub(r"\1 \1", text)
+    text = _REPEATED_BANG_RE.sub(r"\1", text)
+    text = _ELLIPSIS_RE.sub("...", text)
+    text = _CONTROL_CHARS_RE.sub(" ", text)
+    text = _WHITESPACE_RE.sub(" ", text)
+    return _SPACE_BEFORE_PUNCT_RE.sub(r"\1", text).strip()
+
+
+def expand_english(text: str) -> str:
+    """Expand times, prices, ordinals, numbers, percentages and common chat abbreviations."""
+    text = _ABBREVIATION_RE.sub(_expand_abbreviation, text)
+    text = _CLOCK_RE.sub(_expand_clock, text)
+    text = _AMPM_RE.sub(_expand_ampm, text)
+    text = _CURRENCY_RE.sub(_expand_currency, text)
+    text = _HASH_NUMBER_RE.sub(_expand_hash_number, text)
+    text = _ORDINAL_RE.sub(_expand_ordinal, text)
+    return _NUMBER_RE.sub(_expand_number, text)
+
+
+def detect_language(text: str) -> str | None:
+    """Guess the language of `text` from script ranges and stopwords.
+
+    Returns a canonical Qwen3-TTS language name, or None when the text is too
+    short or ambiguous to call (the caller then keeps "Auto"). A call needs
+    two stopword hits and a clear lead over the next language.
+    """
+    for language, pattern in _SCRIPT_RES:
+        if pattern.search(text):
+            return language
+
+    hits = dict.fromkeys(_STOPWORDS, 0)
+    for word in _WORD_RE.findall(text.lower()):
+        for language, stopwords in _STOPWORDS.items():
+            if word in stopwords:
+                hits[language] += 1
+    scores = dict(hits)
+    for language, pattern in _DIACRITIC_HINTS:
+        if pattern.search(text):
+            scores[language] += 2
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best, best_score = ranked[0]
+    if hits[best] < _MIN_STOPWORD_HITS or best_score - ranked[1][1] < _MIN_MARGIN:
+        return None
+    return best
+
+
+def prepare_text(
+    text: str,
+    language: str = "Auto",
+    max_chars: int = MAX_TEXT_CHARS,
+) -> tuple[str, str]:
+    """Normalize chat text for synthesis and resolve "Auto" to a detected language.
+
+    Returns (normalized_text, language). `language` is the requested value, or
+    the detected language name when "Auto" was requested and detection succeeded.
+    """
+    text = strip_discord_markup(text or "")
+
+    resolved = (language or "").strip() or "Auto"
+    if resolved.lower() == "auto":
+        resolved = detect_language(text) or "Auto"
+
+    if resolved.lower() == "english":
+        text = expand_english(text)
+
+    return text[:max_chars].strip(), resolved
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+tts_backends.py
+Inference backends behind the TTS endpoints
+A backend loads an engine, embeds reference speakers, generates waveforms and
+reports the languages it supports. TTS_BACKEND picks one per deployment:
+    torch  Qwen3-TTS on PyTorch (default)
+    onnx   Qwen3-TTS with exported submodules (codec decoder, LM blocks) run by
+           ONNX Runtime on CPU; parts that did not export stay on PyTorch
+    fake   deterministic synthetic speech without a model (tests, load tests)
+
+Export submodules once, then point a CPU node at them:
+    python3 tts_backends.py list-modules
+    python3 tts_backends.py export-onnx --voice references/me.wav \
+        --module model.speech_tokenizer.decoder --out onnx/
+    TTS_BACKEND=onnx TTS_ONNX_DIR=onnx/ python3 server_chatterbox_turbo_enhanced.py
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from cpu_precision import apply_cpu_precision, cpu_load_dtype, resolve_cpu_precision
+from length_governor import DEFAULT_FRAME_RATE, speech_seconds
+from tts_logging import fields, get_logger
+
+log = get_logger("backend")
+
+DEFAULT_MODEL_ID = "Qwen/Qwen3-TTS-12Hz-1.7B-Base"
+ONNX_MANIFEST = "manifest.json"
+
+
+class TTSBackend:
+    """
+    Engine interface used by the server. generate() takes a batch of texts for
+    one speaker and style and returns (wavs, sample_rate), one wav per text.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.device = "cpu"
+        self.model_id = self.name
+        self.precision = "fp32"
+
+    @property
+    def sr(self) -> int:
+        return 24000
+
+    def load(self, device: str = "auto") -> None:
+        raise NotImplementedError
+
+    def supported_languages(self) -> list[str] | None:
+        """Language names the engine accepts (None = unknown)."""
+        return None
+
+    @property
+    def can_embed(self) -> bool:
+        """True when speakers can be embedded once and reused across calls."""
+        return False
+
+    def embed_speaker(self, ref_audio):
+        """Reusable speaker prompt from a path or (audio, sample_rate)."""
+        raise NotImplementedError
+
+    def accepts(self, option: str) -> bool:
+        """Whether generate() honours an extra option (max_new_tokens, stopping_criteria)."""
+        return False
+
+    def generate(self, texts: list[str], languages: list[str], *, speaker=None, ref_audio: str | None = None,
+                 style: str | None = None, temperature: float = 1.0, top_p: float = 1.0, top_k: int = 50,
+                 repetition_penalty: float = 1.0, **options) -> tuple[list, int]:
+        raise NotImplementedError
+
+    def info(self) -> dict:
+        return {"backend": self.name, "model_id": self.model_id, "device": self.device, "precision": self.precision}
+
+
+# =======================
+# PYTORCH (QWEN3-TTS)
+# =======================
+
+def _repeat_prompt(prompt, count: int):
+    """Broadcast a single-voice clone prompt over a batch of texts."""
+    if isinstance(prompt, list) and len(prompt) == 1 and count > 1:
+        return prompt * count
+    return prompt
+
+
+def _call_kwargs(fn) -> set[str] | None:
+    """Keyword arguments a callable takes (None = any)."""
+    try:
+        params = inspect.signature(fn).parameters.values()
+    except (TypeError, ValueError):
+        return set()
+    if any(p.kind is p.VAR_KEYWORD for p in params):
+        return None
+    return {p.name for p in params}
+
+
+class TorchBackend(TTSBackend):
+    """Qwen3-TTS through qwen-tts on PyTorch (CUDA, or CPU at TTS_CPU_PRECISION)."""
+
+    name = "torch"
+
+    def __init__(self, model_id: str | None = None):
+        super().__init__()
+        self.model_id = model_id or os.environ.get("QWEN_TTS_MODEL", DEFAULT_MODEL_ID).strip()
+        self.model = None
+        self._kwargs: set[str] | None = set()
+
+    @property
+    def sr(self) -> int:
+        return getattr(self.model, "sr", 24000)
+
+    def load(self, device: str = "auto") -> None:
+        """
+        Load Qwen3-TTS in offline mode after initial authentication
+        On CPU, TTS_CPU_PRECISION selects fp32 (default), bf16, int8, or int8-prequantized.
+        """
+        try:
+            from qwen_tts import Qwen3TTSModel
+        except ImportError as e:
+            raise ImportError("qwen-tts not installed. Run: pip install qwen-tts") from e
+
+        if device == "auto":
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        device_map = "cuda:0" if device == "cuda" else "cpu"
+        if device_map != "cpu":
+            dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            precision = "bf16" if dtype == torch.bfloat16 else "fp16"
+        else:
+            precision = resolve_cpu_precision(os.environ.get("TTS_CPU_PRECISION", "fp32"))
+            dtype = cpu_load_dtype(precision)
+            cpu_threads = os.environ.get("TTS_CPU_THREADS", "").strip()
+            if cpu_threads:
+                torch.set_num_threads(int(cpu_threads))
+
+        log.info("Loading Qwen3-TTS in offline mode",
+                 extra=fields(model=self.model_id, device=device_map, precision=precision))
+
+        # Set environment variables for offline mode
+        os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+        os.environ.setdefault('HF_DATASETS_OFFLINE', '1')
+        os.environ.setdefault('HF_HUB_OFFLINE', '1')
+        os.environ.setdefault('HF_HUB_DISABLE_SYMLINKS_WARNING', '1')
+
+        try:
+            # First, try to load with offline settings
+            model = Qwen3TTSModel.from_pretrained(
+                self.model_id,
+                device_map=device_map,
+                dtype=dtype,
+                local_files_only=True,
+            )
+            log.info("Model loaded in offline mode")
+
+        except Exception as e:
+            log.warning("Offline loading failed: %s", e)
+            log.info("Trying standard loading (may require internet)...")
+
+            try:
+                model = Qwen3TTSModel.from_pretrained(
+                    self.model_id,
+                    device_map=device_map,
+                    dtype=dtype,
+                )
+                log.info("Model loaded successfully")
+            except Exception as e2:
+                log.error("Failed to load model: %s", e2)
+                log.info("Make sure you ran the setup script first: ./setup.sh <your-hf-token> [model-id]")
+                raise
+
+        if device_map == "cpu":
+            precision = apply_cpu_precision(model, precision, os.environ.get("TTS_QUANTIZED_WEIGHTS"))
+        self.model, self.device, self.precision = model, device_map, precision
+        self._kwargs = _call_kwargs(model.generate_voice_clone)
+
+    def supported_languages(self) -> list[str] | None:
+        return self.model.get_supported_languages()
+
+    @property
+    def can_embed(self) -> bool:
+        return hasattr(self.model, "create_voice_clone_prompt")
+
+    def embed_speaker(self, ref_audio):
+        return self.model.create_voice_clone_prompt(ref_audio=ref_audio, x_vector_only_mode=True)
+
+    def accepts(self, option: str) -> bool:
+        return self._kwargs is None or option in self._kwargs
+
+    def generate(self, texts, languages, *, speaker=None, ref_audio=None, style=None, temperature=1.0,
+                 top_p=1.0, top_k=50, repetition_penalty=1.0, **options):
+        single = len(texts) == 1
+        if speaker is not None:
+            clone_kwargs = {"voice_clone_prompt": _repeat_prompt(speaker, len(texts))}
+        else:
+            # Use x_vector_only_mode to avoid requiring reference transcripts.
+            clone_kwargs = {"ref_audio": ref_audio, "x_vector_only_mode": True}
+        wavs, sample_rate = self.model.generate_voice_clone(
+            text=texts[0] if single else texts,
+            language=languages[0] if single else languages,
+            voice_description=style,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            repetition_penalty=repetition_penalty,
+            **clone_kwargs,
+            **options,
+        )
+        return list(wavs or []), sample_rate
+
+
+# =======================
+# ONNX RUNTIME (CPU)
+# =======================
+
+def resolve_module(root, path: str) -> tuple[object, str]:
+    """(parent, attribute) for a dotted path such as "model.speech_tokenizer.decoder"."""
+    *parents, attr = path.split(".")
+    parent = root
+    for part in parents:
+        parent = getattr(parent, part)
+    if not isinstance(getattr(parent, attr, None), torch.nn.Module):
+        raise ValueError(f"'{path}' is not a torch module")
+    return parent, attr
+
+
+def onnx_session(path: Path, threads: int = 0):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+
+class OrtModule(torch.nn.Module):
+    """
+    Drop-in replacement for an exported submodule: tensors in, ONNX Runtime
+    run, tensors out (cast back to the dtype and device of the first input).
+    Non-tensor arguments were fixed at export time and are ignored here.
+    """
+
+    def __init__(self, session, inputs: list[dict], outputs: int):
+        super().__init__()
+        self.session = session
+        self.inputs = inputs
+        self.outputs = outputs
+
+    def forward(self, *args, **kwargs):
+        feeds, like = {}, None
+        for spec in self.inputs:
+            position = spec.get("position")
+            value = args[position] if position is not None and position < len(args) else kwargs[spec["name"]]
+            like = like if like is not None else value
+            if value.is_floating_point():
+                value = value.float()
+            feeds[spec["name"]] = value.detach().cpu().numpy()
+        results = [torch.from_numpy(r) for r in self.session.run(None, feeds)]
+        if like is not None:
+            results = [
+                r.to(device=like.device, dtype=like.dtype if r.is_floating_point() and like.is_floating_point() else r.dtype)
+                for r in results
+            ]
+        return results[0] if self.outputs == 1 else tuple(results)
+
+
+class OnnxBackend(TorchBackend):
+    """
+    Qwen3-TTS on CPU with the submodules listed in TTS_ONNX_DIR/manifest.json
+    swapped for ONNX Runtime sessions. Text processing, sampling and anything
+    that did not export keep running on PyTorch.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_id: str | None = None, onnx_dir: str | None = None, threads: int | None = None):
+        super().__init__(model_id)
+        self.onnx_dir = Path(onnx_dir or os.environ.get("TTS_ONNX_DIR", "onnx")).expanduser()
+        self.threads = int(threads if threads is not None else os.environ.get("TTS_ONNX_THREADS", "0"))
+        self.onnx_modules: list[str] = []
+
+    def load(self, device: str = "auto") -> None:
+        super().load("cpu")
+        manifest_path = self.onnx_dir / ONNX_MANIFEST
+        if not manifest_path.exists():
+            raise FileNotFoundError(
+                f"No ONNX export at {manifest_path} (run: python3 tts_backends.py export-onnx --out {self.onnx_dir})"
+            )
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("model_id") != self.model_id:
+            raise ValueError(f"ONNX export is for {manifest.get('model_id')}, not {self.model_id}")
+        for path, spec in manifest["modules"].items():
+            parent, attr = resolve_module(self.model, path)
+            session = onnx_session(self.onnx_dir / spec["file"], self.threads)
+            setattr(parent, attr, OrtModule(session, spec["inputs"], spec["outputs"]))
+            self.onnx_modules.append(path)
+        log.info("ONNX Runtime modules: %s", ", ".join(self.onnx_modules) or "none",
+                 extra=fields(onnx_dir=str(self.onnx_dir), threads=self.threads))
+        self.precision = f"{self.precision}+onnx"
+
+    def info(self) -> dict:
+        return {**super().info(), "onnx_modules": self.onnx_modules}
+
+
+class _BoundCall(torch.nn.Module):
+    """A captured module call with its tensor arguments as the only inputs (for export)."""
+
+    def __init__(self, module: torch.nn.Module, args: tuple, kwargs: dict, inputs: list[dict]):
+        super().__init__()
+        self.module = module
+        self.args = list(args)
+        self.kwargs = dict(kwargs)
+        self.specs = inputs
+
+    def forward(self, *tensors):
+        args, kwargs = list(self.args), dict(self.kwargs)
+        for spec, tensor in zip(self.specs, tensors):
+            if spec["position"] is not None:
+                args[spec["position"]] = tensor
+            else:
+                kwargs[spec["name"]] = tensor
+        return self.module(*args, **kwargs)
+
+
+def _tensor_inputs(module: torch.nn.Module, args: tuple, kwargs: dict) -> tuple[list[dict], list]:
+    try:
+        names = list(inspect.signature(module.forward).parameters)
+    except (TypeError, ValueError):
+        names = []
+    specs, tensors = [], []
+    for position, value in enumerate(args):
+        if torch.is_tensor(value):
+            name = names[position] if position < len(names) else f"input_{position}"
+            specs.append({"name": name, "position": position})
+            tensors.append(value)
+    for name, value in kwargs.items():
+        if torch.is_tensor(value):
+            specs.append({"name": name, "position": None})
+            tensors.append(value)
+    return specs, tensors
+
+
+def export_onnx(backend: TorchBackend, paths: list[str], out_dir: Path, voice: str,
+                text: str = "Hello there, this is a short export sample.", language: str = "English",
+                opset: int = 17) -> dict:
+    """
+    Export submodules of a loaded model to ONNX: one sample generation records
+    each module's first call, which is then traced with every axis dynamic.
+    Modules that fail to export (e.g. KV-cache decoders) are reported and skipped.
+    Returns {path: {"ok": bool, ...}}; the manifest lists the exported ones.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    calls, hooks = {}, []
+    for path in paths:
+        module = getattr(*resolve_module(backend.model, path))
+
+        def record(mod, args, kwargs, output, path=path):
+            calls.setdefault(path, (args, kwargs, output))
+
+        hooks.append(module.register_forward_hook(record, with_kwargs=True))
+    try:
+        with torch.inference_mode():
+            backend.generate([text], [language], ref_audio=voice, temperature=0.9, top_p=0.9, top_k=50)
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+    report, modules = {}, {}
+    for path in paths:
+        if path not in calls:
+            report[path] = {"ok": False, "error": "not called during generation"}
+            continue
+        args, kwargs, output = calls[path]
+        outputs = output if isinstance(output, tuple) else (output,)
+        if not all(torch.is_tensor(o) for o in outputs):
+            report[path] = {"ok": False, "error": f"returns {type(output).__name__}, not tensors"}
+            continue
+        module = getattr(*resolve_module(backend.model, path))
+        inputs, tensors = _tensor_inputs(module, args, kwargs)
+        output_names = [f"output_{i}" for i in range(len(outputs))]
+        dynamic = {spec["name"]: dict(enumerate(t.shape)) for spec, t in zip(inputs, tensors)}
+        dynamic.update({name: dict(enumerate(o.shape)) for name, o in zip(output_names, outputs)})
+        dynamic = {name: {axis: f"{name}_{axis}" for axis in axes} for name, axes in dynamic.items()}
+        file = path.replace(".", "_") + ".onnx"
+        try:
+            torch.onnx.export(
+                _BoundCall(module, args, kwargs, inputs).eval(),
+                tuple(tensors),
+                str(out_dir / file),
+                input_names=[spec["name"] for spec in inputs],
+                output_names=output_names,
+                dynamic_axes=dynamic,
+                opset_version=opset,
+            )
+        except Exception as e:
+            report[path] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            continue
+        modules[path] = {"file": file, "inputs": inputs, "outputs": len(outputs)}
+        report[path] = {"ok": True, "file": file}
+        try:
+            ort_out = OrtModule(onnx_session(out_dir / file), inputs, len(outputs))(*args, **kwargs)
+            ort_out = ort_out if isinstance(ort_out, tuple) else (ort_out,)
+            report[path]["max_abs_diff"] = max(
+                float((a.float() - b.float()).abs().max()) for a, b in zip(ort_out, outputs)
+            )
+        except ImportError:
+            pass
+
+    manifest = {"model_id": backend.model_id, "opset": opset, "modules": modules}
+    (out_dir / ONNX_MANIFEST).write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    return report
+
+
+def list_modules(model, depth: int = 3) -> list[tuple[str, int]]:
+    """(dotted path, parameter count) of torch submodules reachable from a model wrapper."""
+    roots = [("", model)] if isinstance(model, torch.nn.Module) else [
+        (f"{name}.", value) for name, value in vars(model).items() if isinstance(value, torch.nn.Module)
+    ]
+    found = []
+    for prefix, root in roots:
+        for name, module in root.named_modules():
+            if name and name.count(".") < depth:
+                found.append((prefix + name, sum(p.numel() for p in module.parameters())))
+    return found
+
+
+# =======================
+# FAKE (TESTS)
+# =======================
+
+class FakeBackend(TTSBackend):
+    """
+    Deterministic synthetic speech: the same text, speaker, style and sampling
+    always give the same waveform, whose length follows the text's expected
+    speaking time (and max_new_tokens). Seeds have no effect. TTS_FAKE_RTF adds
+    simulated compute time.
+    """
+
+    name = "fake"
+    LANGUAGES = ["Chinese", "English", "French", "German", "Italian", "Japanese", "Korean",
+                 "Portuguese", "Russian", "Spanish"]
+
+    def __init__(self, model_id: str | None = None, rtf: float | None = None,
+                 frame_rate: float = DEFAULT_FRAME_RATE):
+        super().__init__()
+        self.model_id = model_id or self.name
+        self.rtf = float(rtf if rtf is not None else os.environ.get("TTS_FAKE_RTF", "0"))
+        self.frame_rate = frame_rate
+
+    def load(self, device: str = "auto") -> None:
+        log.info("Using the fake TTS backend (synthetic audio)", extra=fields(rtf=self.rtf))
+
+    def supported_languages(self) -> list[str] | None:
+        return list(self.LANGUAGES)
+
+    @property
+    def can_embed(self) -> bool:
+        return True
+
+    def embed_speaker(self, ref_audio):
+        if isinstance(ref_audio, tuple):
+            audio, _ = ref_audio
+            digest = hashlib.sha256(np.asarray(audio, dtype=np.float32).tobytes()).digest()
+        else:
+            digest = hashlib.sha256(Path(ref_audio).read_bytes()).digest()
+        return [{"pitch": 90.0 + digest[0] % 140}]
+
+    def accepts(self, option: str) -> bool:
+        return option == "max_new_tokens"
+
+    def generate(self, texts, languages, *, speaker=None, ref_audio=None, style=None, temperature=1.0,
+                 top_p=1.0, top_k=50, repetition_penalty=1.0, max_new_tokens: int | None = None, **options):
+        if speaker is None:
+            speaker = self.embed_speaker(ref_audio)
+        pitch = speaker[0]["pitch"]
+        sampling = (style or "", round(temperature, 4), round(top_p, 4), top_k, round(repetition_penalty, 4))
+        wavs, total = [], 0.0
+        for text, language in zip(texts, languages):
+            seconds = max(speech_seconds(text, language), 0.25)
+            if max_new_tokens:
+                seconds = min(seconds, max_new_tokens / self.frame_rate)
+            key = json.dumps([text, language, pitch, sampling]).encode("utf-8")
+            rng = np.random.default_rng(int.from_bytes(hashlib.sha256(key).digest()[:8], "big"))
+            wavs.append(self._voice(int(seconds * self.sr), pitch * (1 + 0.05 * rng.standard_normal()), rng))
+            total += seconds
+        if self.rtf:
+            time.sleep(total * self.rtf)
+        return wavs, self.sr
+
+    def _voice(self, samples: int, pitch: float, rng) -> np.ndarray:
+        """Harmonic tone with a ~4 Hz syllable envelope."""
+        t = np.arange(samples, dtype=np.float32) / self.sr
+        tone = sum(np.sin(2 * np.pi * k * pitch * t) / k for k in (1, 2, 3))
+        envelope = 0.5 * (1 - np.cos(2 * np.pi * rng.uniform(3.5, 4.5) * t))
+        return (0.3 * tone * envelope).astype(np.float32)
+
+
+BACKENDS = {"torch": TorchBackend, "onnx": OnnxBackend, "fake": FakeBackend}
+
+
+def create_backend(name: str | None = None, model_id: str | None = None) -> TTSBackend:
+    """Backend by name (TTS_BACKEND), optionally for another model id; not loaded yet."""
+    key = (name or "torch").strip().lower()
+    if key not in BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}'. Supported: {sorted(BACKENDS)}")
+    return BACKENDS[key](model_id)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Inference backend tools for Qwen3-TTS")
+    parser.add_argument("--model", default=None, help="Model id (default: $QWEN_TTS_MODEL)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    listing = sub.add_parser("list-modules", help="Print exportable submodules and their sizes")
+    listing.add_argument("--depth", type=int, default=3)
+    export = sub.add_parser("export-onnx", help="Export submodules to ONNX for TTS_BACKEND=onnx")
+    export.add_argument("--voice", required=True, help="Reference clip for the sample generation")
+    export.add_argument("--module", action="append", required=True, help="Dotted module path (repeatable)")
+    export.add_argument("--out", required=True, help="Output directory (TTS_ONNX_DIR)")
+    export.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args(argv)
+
+    backend = TorchBackend(args.model)
+    print(f"[INFO] Loading {backend.model_id} (fp32, CPU)")
+    os.environ["TTS_CPU_PRECISION"] = "fp32"
+    backend.load("cpu")
+    if args.command == "list-modules":
+        for path, params in list_modules(backend.model, args.depth):
+            print(f"{path:60s} {params / 1e6:8.1f}M")
+        return 0
+
+    report = export_onnx(backend, args.module, Path(args.out), args.voice, opset=args.opset)
+    for path, result in report.items():
+        if result["ok"]:
+            diff = result.get("max_abs_diff")
+            print(f"✅ {path} -> {result['file']}" + (f" (max abs diff {diff:.2e})" if diff is not None else ""))
+        else:
+            print(f"❌ {path}: {result['error']} (stays on PyTorch)")
+    return 0 if any(r["ok"] for r in report.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+tts_gateway.py
+Routing gateway in front of several TTS servers
+Requests are routed by consistent hashing on the voice, so each voice keeps
+hitting the node whose embedding, response and phrase caches are warm; the
+gateway fails over on errors/timeouts, spills to the next node when the home
+node's reported queue is much deeper, and replicates reference uploads to every
+node. /ws sessions are not proxied: bots connect to the voice's home node
+(GET /voices/{name}/home)
+
+    python3 tts_gateway.py --backends http://gpu1:5002,http://gpu2:5002 --port 5000
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi import FastAPI, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from tts_logging import get_logger, setup_logging
+
+log = get_logger("gateway")
+
+# Hop-by-hop headers are never forwarded.
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "upgrade", "host", "proxy-connection"}
+# Client headers that matter to the TTS server (credentials and the claimed client name
+# identify the caller for quotas and fair share; the deadline lets it drop late work).
+FORWARD_REQUEST_HEADERS = (
+    "content-type", "accept", "range", "if-none-match", "if-range",
+    "x-api-key", "authorization", "x-tts-client", "x-tts-deadline-ms",
+)
+
+
+def forward_headers(request) -> dict:
+    """Headers to send upstream: the forwarded subset plus the caller's address in X-Forwarded-For."""
+    headers = {k: v for k, v in request.headers.items() if k.lower() in FORWARD_REQUEST_HEADERS}
+    if request.client is not None:
+        chain = request.headers.get("x-forwarded-for")
+        headers["x-forwarded-for"] = f"{chain}, {request.client.host}" if chain else request.client.host
+    return headers
+
+
+# Reference extensions dropped from routing keys, so "alice" and "alice.wav" share a home node.
+VOICE_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes; adding a node moves ~1/n of the keys."""
+
+    def __init__(self, nodes, replicas: int = 64):
+        self.nodes = list(nodes)
+        self._ring = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._points = [point for point, _ in self._ring]
+
+    def candidates(self, key: str) -> list[str]:
+        """All nodes in ring order starting at the key's owner (the failover order)."""
+        if not self._ring:
+            return []
+        start = bisect.bisect(self._points, _hash(key))
+        ordered = []
+        for i in range(len(self._ring)):
+            node = self._ring[(start + i) % len(self._ring)][1]
+            if node not in ordered:
+                ordered.append(node)
+                if len(ordered) == len(self.nodes):
+                    break
+        return ordered
+
+
+class Backend:
+    """One TTS server as seen through its /health endpoint."""
+
+    FAILURES_BEFORE_DOWN = 2
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.queued = 0
+        self.running = 0
+        self.workers = 1
+        self.failures = 0
+        self.last_error: str | None = None
+        self.last_check: float | None = None
+
+    @property
+    def load(self) -> float:
+        """Jobs per worker, as last reported."""
+        return (self.queued + self.running) / max(self.workers, 1)
+
+    def update(self, health: dict) -> None:
+        scheduler = health.get("scheduler") or {}
+        self.queued = int(scheduler.get("queued", 0))
+        self.running = int(scheduler.get("running", 0))
+        self.workers = int(scheduler.get("workers", 1))
+        self.healthy = health.get("status") == "ok" and health.get("model_loaded", True) is not False
+        self.failures = 0
+        self.last_error = None
+        self.last_check = time.time()
+
+    def mark_failed(self, error) -> None:
+        self.failures += 1
+        self.last_error = str(error) or type(error).__name__
+        if self.failures >= self.FAILURES_BEFORE_DOWN:
+            self.healthy = False
+
+    def status(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "queued": self.queued,
+            "running": self.running,
+            "workers": self.workers,
+            "load": round(self.load, 2),
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_check": self.last_check,
+        }
+
+
+class Gateway:
+    """Backend pool, routing policy and forwarding."""
+
+    def __init__(self, urls, spill_threshold: float = 4.0, timeout: float = 120.0,
+                 health_interval: float = 5.0, max_attempts: int = 2, transport=None):
+        if not urls:
+            raise ValueError("At least one backend URL is required")
+        self.backends = {b.url: b for b in (Backend(url) for url in urls)}
+        self.ring = HashRing(self.backends)
+        self.spill_threshold = spill_threshold
+        self.health_interval = health_interval
+        self.max_attempts = max(1, max_attempts)
+        self.client = httpx.AsyncClient(timeout=timeout, transport=transport)
+        # Cached-audio keys are per node: remember where each one lives.
+        self._audio_homes: OrderedDict[str, str] = OrderedDict()
+
+    # -----------------------
+    # Routing
+    # -----------------------
+
+    def route(self, voice: str | None) -> list[Backend]:
+        """Backends to try for a voice, best first."""
+        ordered = [self.backends[url] for url in self.ring.candidates(voice_key(voice))]
+        candidates = [b for b in ordered if b.healthy] or ordered  # all down: still try in ring order
+        # Leave the voice's home node only when it is clearly busier than the next one.
+        if len(candidates) > 1 and candidates[0].load - candidates[1].load > self.spill_threshold:
+            candidates[0], candidates[1] = candidates[1], candidates[0]
+        return candidates[:self.max_attempts]
+
+    def remember_audio(self, location: str | None, backend: Backend) -> None:
+        if not location:
+            return
+        self._audio_homes[location] = backend.url
+        self._audio_homes.move_to_end(location)
+        while len(self._audio_homes) > 4096:
+            self._audio_homes.popitem(last=False)
+
+    async def find_audio(self, path: str) -> Backend | None:
+        """Node holding a cached-audio URL: the remembered one, else the first that has it."""
+        home = self._audio_homes.get(path)
+        if home is not None:
+            return self.backends[home]
+        for backend in self.backends.values():
+            try:
+                probe = await self.client.head(f"{backend.url}{path}")
+            except httpx.HTTPError:
+                continue
+            if probe.status_code == 200:
+                self.remember_audio(path, backend)
+                return backend
+        return None
+
+    # -----------------------
+    # Health
+    # -----------------------
+
+    async def check(self, backend: Backend) -> None:
+        try:
+            response = await self.client.get(f"{backend.url}/health", timeout=5.0)
+            response.raise_for_status()
+            backend.update(response.json())
+        except Exception as e:
+            backend.mark_failed(e)
+
+    async def poll_health(self) -> None:
+        while True:
+            await asyncio.gather(*(self.check(b) for b in self.backends.values()))
+            await asyncio.sleep(self.health_interval)
+
+    # -----------------------
+    # Forwarding
+    # -----------------------
+
+    async def forward(self, request: Request, path: str, body: bytes, candidates: list[Backend]) -> Response:
+        """Send to the first candidate that answers without a 5xx; stream the reply back."""
+        headers = forward_headers(request)
+        last_error = "no backends"
+        for backend in candidates:
+            outgoing = self.client.build_request(
+                request.method, f"{backend.url}{path}", content=body, headers=headers,
+                params=request.query_params,
+            )
+            try:
+                upstream = await self.client.send(outgoing, stream=True)
+            except httpx.HTTPError as e:
+                backend.mark_failed(e)
+                last_error = f"{backend.url}: {e or type(e).__name__}"
+                log.warning("%s failed (%s); failing over", backend.url, last_error)
+                continue
+            if upstream.status_code >= 500 and backend is not candidates[-1]:
+                await upstream.aread()
+                await upstream.aclose()
+                backend.mark_failed(f"HTTP {upstream.status_code}")
+                log.warning("%s returned %d; failing over", backend.url, upstream.status_code)
+                continue
+
+            self.remember_audio(upstream.headers.get("content-location"), backend)
+            reply_headers = {k: v for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS}
+            reply_headers["X-TTS-Backend"] = backend.url
+            return StreamingResponse(
+                upstream.aiter_raw(),
+                status_code=upstream.status_code,
+                headers=reply_headers,
+                background=_Close(upstream),
+            )
+        raise HTTPException(status_code=502, detail=f"All backends failed: {last_error}")
+
+    async def broadcast(self, method: str, path: str, **kwargs) -> dict[str, httpx.Response | Exception]:
+        async def one(backend: Backend):
+            try:
+                return await self.client.request(method, f"{backend.url}{path}", **kwargs)
+            except httpx.HTTPError as e:
+                backend.mark_failed(e)
+                return e
+
+        backends = list(self.backends.values())
+        results = await asyncio.gather(*(one(b) for b in backends))
+        return {b.url: r for b, r in zip(backends, results)}
+
+
+class _Close:
+    """Background task closing the upstream response after streaming it."""
+
+    def __init__(self, upstream: httpx.Response):
+        self.upstream = upstream
+
+    async def __call__(self):
+        await self.upstream.aclose()
+
+
+def voice_key(voice: str | None) -> str:
+    """Ring key for a voice name, with or without its file extension."""
+    voice = voice or ""
+    stem, ext = os.path.splitext(voice)
+    return stem if ext.lower() in VOICE_EXTENSIONS else voice
+
+
+def _voice_of(body: bytes) -> str | None:
+    """Routing key: the request's voice (first item's for batches)."""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return None
+    if isinstance(payload, dict):
+        if isinstance(payload.get("items"), list) and payload["items"]:
+            first = payload["items"][0]
+            return first.get("voice") if isinstance(first, dict) else None
+        return payload.get("voice")
+    return None
+
+
+def create_app(gateway: Gateway, poll: bool = True) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(_app):
+        task = asyncio.create_task(gateway.poll_health()) if poll else None
+        yield
+        if task:
+            task.cancel()
+        await gateway.client.aclose()
+
+    app = FastAPI(title="Qwen3-TTS gateway", version="1.0", lifespan=lifespan)
+
+    async def by_voice(request: Request, path: str) -> Response:
+        body = await request.body()
+        return await gateway.forward(request, path, body, gateway.route(_voice_of(body)))
+
+    @app.post("/api/tts")
+    async def api_tts(request: Request):
+        return await by_voice(request, "/api/tts")
+
+    @app.post("/tts")
+    async def tts(request: Request):
+        return await by_voice(request, "/tts")
+
+    @app.post("/api/tts/batch")
+    async def api_tts_batch(request: Request):
+        return await by_voice(request, "/api/tts/batch")
+
+    @app.post("/api/tts/speculate")
+    async def api_tts_speculate(request: Request):
+        return await by_voice(request, "/api/tts/speculate")
+
+    @app.delete("/api/tts/speculate/{job_id}")
+    async def api_tts_speculate_cancel(job_id: str):
+        # Job ids are node-local; whichever node owns it cancels it.
+        results = await gateway.broadcast("DELETE", f"/api/tts/speculate/{job_id}")
+        cancelled = any(
+            isinstance(r, httpx.Response) and r.status_code == 200 and r.json().get("cancelled")
+            for r in results.values()
+        )
+        return {"job_id": job_id, "cancelled": cancelled}
+
+    @app.api_route("/api/tts/audio/{key}", methods=["GET", "HEAD"])
+    async def api_tts_audio(key: str, request: Request):
+        path = f"/api/tts/audio/{key}"
+        backend = await gateway.find_audio(path)
+        if backend is None:
+            raise HTTPException(status_code=404, detail="Audio not cached on any backend")
+        return await gateway.forward(request, path, b"", [backend])
+
+    @app.post("/voices/{name}/prefetch")
+    async def prefetch_voice(name: str, request: Request):
+        return await gateway.forward(request, f"/voices/{name}/prefetch", b"", gateway.route(name))
+
+    @app.delete("/voices/{name}/pin")
+    async def unpin_voice(name: str, request: Request):
+        return await gateway.forward(request, f"/voices/{name}/pin", b"", gateway.route(name))
+
+    @app.get("/voices/{name}/home")
+    async def voice_home(name: str):
+        """The node serving a voice; /ws sessions connect there directly."""
+        backend = gateway.route(name)[0]
+        scheme, _, rest = backend.url.partition("://")
+        return {"voice": name, "backend": backend.url, "ws": f"{'wss' if scheme == 'https' else 'ws'}://{rest}/ws"}
+
+    # Phrase sets live on the node that rendered them, so they follow the voice.
+    @app.api_route("/phrases/{voice}", methods=["GET", "PUT", "DELETE"])
+    async def phrases(voice: str, request: Request):
+        return await gateway.forward(request, f"/phrases/{voice}", await request.body(), gateway.route(voice))
+
+    @app.get("/phrases/{voice}/{phrase_id}")
+    async def phrase_audio(voice: str, phrase_id: str, request: Request):
+        return await gateway.forward(request, f"/phrases/{voice}/{phrase_id}", b"", gateway.route(voice))
+
+    @app.get("/list-voices")
+    async def list_voices(request: Request):
+        return await gateway.forward(request, "/list-voices", b"", gateway.route(None))
+
+    @app.get("/info")
+    async def info(request: Request):
+        return await gateway.forward(request, "/info", b"", gateway.route(None))
+
+    @app.post("/upload-reference")
+    async def upload_reference(
+        file: UploadFile = File(...),
+        name: str | None = Form(default=None),
+        overwrite: bool = Form(default=False),
+    ):
+        """Replicate an upload to every backend so any node can serve the voice."""
+        content = await file.read()
+        data = {"overwrite": str(overwrite).lower()}
+        if name:
+            data["name"] = name
+        results = await gateway.broadcast(
+            "POST", "/upload-reference",
+            files={"file": (file.filename, content, file.content_type or "application/octet-stream")},
+            data=data,
+        )
+        report = {}
+        for url, result in results.items():
+            if isinstance(result, Exception):
+                report[url] = {"ok": False, "status": 502, "error": str(result) or type(result).__name__}
+            else:
+                report[url] = {"ok": result.status_code == 200, "status": result.status_code}
+                if result.status_code != 200:
+                    report[url]["error"] = result.text[:500]
+        replicated = sum(1 for r in report.values() if r["ok"])
+        if not replicated:
+            statuses = {r["status"] for r in report.values()}
+            status = statuses.pop() if len(statuses) == 1 else 502
+            return JSONResponse(status_code=status, content={"replicated": 0, "backends": report})
+        return {"replicated": replicated, "total": len(report), "backends": report}
+
+    @app.get("/health")
+    async def health():
+        healthy = sum(1 for b in gateway.backends.values() if b.healthy)
+        return {
+            "status": "ok" if healthy else "degraded",
+            "mode": "gateway",
+            "healthy_backends": healthy,
+            "backends": {url: b.status() for url, b in gateway.backends.items()},
+        }
+
+    return app
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Routing gateway for several TTS servers")
+    parser.add_argument("--backends", default=os.environ.get("TTS_GATEWAY_BACKENDS", ""),
+                        help="Comma-separated backend URLs (default: $TTS_GATEWAY_BACKENDS)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("TTS_GATEWAY_PORT", "5000")))
+    parser.add_argument("--spill-threshold", type=float, default=float(os.environ.get("TTS_GATEWAY_SPILL", "4")),
+                        help="Jobs per worker the home node may lead the next node by before spilling")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--health-interval", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    urls = [u.strip() for u in args.backends.split(",") if u.strip()]
+    if not urls:
+        parser.error("no backends given (use --backends or TTS_GATEWAY_BACKENDS)")
+
+    import uvicorn
+    gateway = Gateway(urls, spill_threshold=args.spill_threshold, timeout=args.timeout,
+                      health_interval=args.health_interval)
+    setup_logging()
+    log.info("Gateway on port %d for %d backends: %s", args.port, len(urls), ", ".join(urls))
+    uvicorn.run(create_app(gateway), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+tts_logging.py
+Structured, low-overhead logging for the TTS server
+Request threads only enqueue records; a background listener formats and writes
+them, as "[LEVEL] message key=value" text or one JSON object per line.
+Below-INFO records can be sampled, and expensive values are guarded with
+log.isEnabledFor(...), so a disabled level costs one integer comparison.
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMATS = ("text", "json")
+ROOT_LOGGER = "tts"
+
+_listener: QueueListener | None = None
+
+
+def fields(**values) -> dict:
+    """Structured fields for a record: log.info("msg", extra=fields(voice=v, ms=12))."""
+    return {"fields": values}
+
+
+class TextFormatter(logging.Formatter):
+    """The server's historical "[LEVEL] message" lines, with fields appended as key=value."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"[{record.levelname}] {record.getMessage()}"
+        extra = getattr(record, "fields", None)
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (journald / log shippers)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        extra = getattr(record, "fields", None)
+        if extra:
+            entry.update(extra)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """Pass every record at or above `level`; pass one in `every` below it."""
+
+    def __init__(self, every: int, level: int = logging.INFO):
+        super().__init__()
+        self.every = max(1, int(every))
+        self.level = level
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.level or next(self._counter) % self.every == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Enqueue the record untouched; message formatting happens on the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(level: str | None = None, fmt: str | None = None, sample: int | None = None,
+                  stream=None) -> logging.Logger:
+    """
+    Configure the "tts" logger from arguments or LOG_LEVEL / TTS_LOG_FORMAT / TTS_LOG_SAMPLE.
+    Safe to call again (e.g. in tests); the previous listener is stopped.
+    """
+    global _listener
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).strip().upper()
+    fmt = (fmt or os.environ.get("TTS_LOG_FORMAT", "text")).strip().lower()
+    sample = sample if sample is not None else int(os.environ.get("TTS_LOG_SAMPLE", "1"))
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"Unsupported log format '{fmt}'. Supported: {list(LOG_FORMATS)}")
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(SampleFilter(sample))
+    _listener = QueueListener(records, output)
+    _listener.start()
+
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def shutdown_logging() -> None:
+    """Flush queued records (registered at exit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Child of the "tts" logger, e.g. get_logger("server") -> "tts.server"."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
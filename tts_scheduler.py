@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+tts_scheduler.py
+Priority job queue in front of the TTS model
+Interactive requests always run before queued speculative work; within a
+priority, jobs run shortest-expected-first with aging so long ones still finish.
+Compatible queued jobs of similar length are merged into one model call
+whenever a worker frees up (dispatch-time batching: a batch is fixed once
+its call starts), and clients with a large backlog yield to the others
+(weighted fair share)
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+# Lower value runs first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 5
+PRIORITY_SPECULATIVE = 10
+
+# Seconds of speech per character when nothing has been measured yet.
+DEFAULT_SECONDS_PER_CHAR = 0.07
+# Ideographic/syllabic scripts pack more speech into each character.
+LANGUAGE_SECONDS_PER_CHAR = {"chinese": 0.22, "japanese": 0.16, "korean": 0.18}
+
+
+class JobCancelled(Exception):
+    """Raised from a job's future when it was cancelled before running."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised from a job's future when its deadline passed or every waiter left."""
+
+
+class Deadline:
+    """
+    When the callers waiting on a job stop caring: a monotonic expiry time
+    (None = never) and a count of waiters; the job is abandoned when the
+    last waiter leaves. Requests that join a job join its Deadline, so
+    joining can only extend it.
+    """
+
+    def __init__(self, at: float | None = None):
+        self.at = at
+        self.waiters = 1
+        self.abandoned = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def after(cls, ms: float | None) -> "Deadline":
+        return cls(time.monotonic() + ms / 1000.0 if ms else None)
+
+    def join(self, other: "Deadline | None") -> None:
+        with self._lock:
+            self.waiters += 1
+            if other is None or other.at is None:
+                self.at = None
+            elif self.at is not None:
+                self.at = max(self.at, other.at)
+
+    def leave(self) -> None:
+        with self._lock:
+            self.waiters -= 1
+            if self.waiters <= 0:
+                self.abandoned = True
+
+    def expired(self) -> bool:
+        return self.abandoned or (self.at is not None and time.monotonic() >= self.at)
+
+    def remaining(self) -> float | None:
+        return None if self.at is None else self.at - time.monotonic()
+
+
+class CostModel:
+    """
+    Predict how long a generation takes: audio length from text length and
+    language, times the real-time factor measured per voice (EWMA).
+    """
+
+    def __init__(self, default_rtf: float = 1.0, overhead: float = 0.3, alpha: float = 0.2):
+        self.default_rtf = default_rtf
+        self.overhead = overhead
+        self.alpha = alpha
+        self._seconds_per_char: dict[str, float] = {}
+        self._rtf: dict[str, float] = {}
+        self._observations = 0
+        self._lock = threading.Lock()
+
+    def _ewma(self, table: dict, key: str, value: float) -> None:
+        old = table.get(key)
+        table[key] = value if old is None else old + self.alpha * (value - old)
+
+    def audio_seconds(self, chars: int, language: str = "Auto") -> float:
+        lang = (language or "auto").lower()
+        with self._lock:
+            per_char = self._seconds_per_char.get(lang)
+        if per_char is None:
+            per_char = LANGUAGE_SECONDS_PER_CHAR.get(lang, DEFAULT_SECONDS_PER_CHAR)
+        return max(chars, 1) * per_char
+
+    def rtf(self, voice: str | None = None) -> float:
+        with self._lock:
+            return self._rtf.get(voice, self._rtf.get("*", self.default_rtf))
+
+    def estimate(self, chars: int, language: str = "Auto", voice: str | None = None) -> float:
+        """Expected wall-clock seconds for one generation."""
+        return self.overhead + self.audio_seconds(chars, language) * self.rtf(voice)
+
+    def observe(self, chars: int, language: str, voice: str | None, elapsed: float, audio_seconds: float) -> None:
+        """Feed back a finished generation."""
+        if chars <= 0 or audio_seconds <= 0:
+            return
+        rtf = max(elapsed - self.overhead, 0.0) / audio_seconds
+        with self._lock:
+            self._ewma(self._seconds_per_char, (language or "auto").lower(), audio_seconds / chars)
+            self._ewma(self._rtf, "*", rtf)
+            if voice:
+                self._ewma(self._rtf, voice, rtf)
+            self._observations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "observations": self._observations,
+                "rtf": {k: round(v, 3) for k, v in self._rtf.items()},
+                "seconds_per_char": {k: round(v, 4) for k, v in self._seconds_per_char.items()},
+            }
+
+
+class Job:
+    """
+    A unit of model work with a priority, an optional dedup key and a session.
+    Jobs with the same batch_key may run together: batch_fn(payloads) returns
+    one result (or exception instance) per payload. A job whose Deadline has
+    expired while queued is dropped instead of run.
+    """
+
+    def __init__(self, fn, priority: int, key: str | None = None, session: str | None = None,
+                 cost: float = 0.0, batch_key=None, batch_fn=None, payload=None,
+                 deadline: Deadline | None = None, client: str | None = None):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.priority = priority
+        self.key = key
+        self.session = session
+        self.cost = cost  # predicted run time in seconds
+        self.batch_key = batch_key if batch_fn is not None else None
+        self.batch_fn = batch_fn
+        self.payload = payload
+        self.deadline = deadline
+        self.client = client
+        self.share_delay = 0.0  # fair-share handicap (seconds) fixed at submission
+        self.predicted_wait = 0.0  # predicted queueing delay at submission
+        self.future: Future = Future()
+        self.created = time.monotonic()
+        self.started: float | None = None
+        self.cancelled = False
+
+    @property
+    def state(self) -> str:
+        if self.cancelled:
+            return "cancelled"
+        if self.future.done():
+            return "done"
+        if self.started is not None:
+            return "running"
+        return "queued"
+
+
+class JobScheduler:
+    """
+    Run jobs on a fixed pool of worker threads, highest priority first.
+    Within a priority, the job with the smallest created * aging + cost runs
+    first: shortest-expected-first, where every second waited forgives `aging`
+    seconds of predicted cost. aging=0 is pure SJF; a large value is FIFO.
+    Queued jobs can be cancelled or promoted, and are dropped once their
+    Deadline expires; running jobs complete (the work itself may check it).
+
+    When a worker takes a batchable job it also takes up to max_batch - 1
+    queued jobs with the same priority and batch_key whose predicted cost is
+    within length_ratio of it, so batchmates finish at about the same time.
+
+    Fair share: a client's job is ranked as if submitted fair_share * (that
+    client's queued and running cost) / weight seconds later, so a client
+    flooding the queue interleaves with others instead of starving them.
+    """
+
+    def __init__(self, workers: int = 1, name: str = "tts", aging: float = 1.0,
+                 max_batch: int = 1, length_ratio: float = 2.0, fair_share: float = 1.0):
+        self.aging = aging
+        self.fair_share = fair_share
+        self.max_batch = max(1, max_batch)
+        self.length_ratio = max(1.0, length_ratio)
+        self._heap: list[tuple[int, float, int, Job]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._jobs: dict[str, Job] = {}
+        self._by_key: dict[str, Job] = {}
+        self._backlog: dict[str, float] = {}  # client -> cost of its queued and running jobs
+        self._completed = 0
+        self._cancelled = 0
+        self._expired = 0
+        self._aborted = 0
+        self._wasted = 0.0
+        self._batches = 0
+        self._batched_jobs = 0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    # -----------------------
+    # Submission
+    # -----------------------
+
+    def _rank(self, job: Job) -> float:
+        return job.created * self.aging + job.cost + job.share_delay
+
+    def _share_delay_locked(self, client: str | None, weight: float) -> float:
+        if client is None or not self.fair_share:
+            return 0.0
+        return self.fair_share * self._backlog.get(client, 0.0) / max(weight, 0.01)
+
+    def submit(self, fn, priority: int = PRIORITY_INTERACTIVE, key: str | None = None,
+               session: str | None = None, cost: float = 0.0, batch_key=None, batch_fn=None,
+               payload=None, deadline: Deadline | None = None, client: str | None = None,
+               weight: float = 1.0) -> Job:
+        """
+        Queue fn() and return its Job; the result is delivered on job.future.
+        With batch_key/batch_fn/payload the job may instead run inside a batch.
+        client/weight place it in fair-share order against other clients' jobs.
+        """
+        job = Job(fn, priority, key=key, session=session, cost=cost, batch_key=batch_key,
+                  batch_fn=batch_fn, payload=payload, deadline=deadline, client=client)
+        with self._cond:
+            job.share_delay = self._share_delay_locked(client, weight)
+            if client is not None:
+                self._backlog[client] = self._backlog.get(client, 0.0) + cost
+            job.predicted_wait = self._predict_wait_locked(priority, self._rank(job))
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job
+            heapq.heappush(self._heap, (priority, self._rank(job), next(self._seq), job))
+            self._cond.notify()
+        return job
+
+    def run(self, fn, priority: int = PRIORITY_INTERACTIVE, key: str | None = None, cost: float = 0.0,
+            client: str | None = None, weight: float = 1.0):
+        """Submit fn() and block until it finishes, returning its result."""
+        return self.submit(fn, priority, key=key, cost=cost, client=client, weight=weight).future.result()
+
+    def predict_wait(self, priority: int = PRIORITY_INTERACTIVE, cost: float = 0.0,
+                     client: str | None = None, weight: float = 1.0) -> float:
+        """Predicted seconds before a job submitted now would start."""
+        with self._cond:
+            rank = time.monotonic() * self.aging + cost + self._share_delay_locked(client, weight)
+            return self._predict_wait_locked(priority, rank)
+
+    def _predict_wait_locked(self, priority: int, rank: float) -> float:
+        now = time.monotonic()
+        ahead = 0.0
+        for job in self._jobs.values():
+            if job.started is not None:
+                ahead += max(job.cost - (now - job.started), 0.0)
+            elif (job.priority, self._rank(job)) <= (priority, rank):
+                ahead += job.cost
+        return ahead / len(self._threads)
+
+    def depth(self, max_priority: int = PRIORITY_SPECULATIVE) -> int:
+        """Jobs waiting to start at max_priority or more urgent."""
+        with self._cond:
+            return sum(1 for job in self._jobs.values() if job.started is None and job.priority <= max_priority)
+
+    def find(self, key: str) -> Job | None:
+        """Return the queued or running job for a dedup key, if any."""
+        with self._cond:
+            job = self._by_key.get(key)
+            if job is None or job.cancelled or job.future.done():
+                return None
+            return job
+
+    def promote(self, job: Job, priority: int) -> None:
+        """Raise a queued job's priority (e.g. a real request joined a speculative job)."""
+        with self._cond:
+            # A promoted job now serves a real request: session supersession no longer applies.
+            job.session = None
+            if job.started is not None or job.cancelled or priority >= job.priority:
+                return
+            job.priority = priority
+            # The old heap entry becomes stale and is skipped by the workers.
+            heapq.heappush(self._heap, (priority, self._rank(job), next(self._seq), job))
+            self._cond.notify()
+
+    # -----------------------
+    # Cancellation
+    # -----------------------
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job. Returns False if it is unknown, running, or finished."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            return self._cancel_locked(job)
+
+    def cancel_session(self, session: str, keep: str | None = None) -> int:
+        """Cancel every queued job of a session except `keep`; returns the count."""
+        with self._cond:
+            victims = [
+                job for job in self._jobs.values()
+                if job.session == session and job.id != keep
+            ]
+            return sum(1 for job in victims if self._cancel_locked(job))
+
+    def _cancel_locked(self, job: Job) -> bool:
+        if job.started is not None or job.cancelled:
+            return False
+        job.cancelled = True
+        self._cancelled += 1
+        self._forget_locked(job)
+        job.future.set_exception(JobCancelled(f"Job {job.id} was cancelled"))
+        return True
+
+    def _expire_locked(self, job: Job) -> bool:
+        """Drop a queued job whose deadline has passed; True if it was dropped."""
+        if job.deadline is None or not job.deadline.expired():
+            return False
+        job.cancelled = True
+        self._expired += 1
+        self._forget_locked(job)
+        job.future.set_exception(DeadlineExceeded(f"Job {job.id} expired before it ran"))
+        return True
+
+    def record_wasted(self, seconds: float, jobs: int = 1) -> None:
+        """Account model time spent on jobs whose result was no longer wanted."""
+        with self._cond:
+            self._aborted += jobs
+            self._wasted += seconds
+
+    def _forget_locked(self, job: Job) -> None:
+        if self._jobs.pop(job.id, None) is not None and job.client is not None:
+            backlog = self._backlog.get(job.client, 0.0) - job.cost
+            if backlog > 1e-9:
+                self._backlog[job.client] = backlog
+            else:
+                self._backlog.pop(job.client, None)
+        if job.key is not None and self._by_key.get(job.key) is job:
+            del self._by_key[job.key]
+
+    # -----------------------
+    # Workers
+    # -----------------------
+
+    @staticmethod
+    def _live(entry) -> bool:
+        priority, _, _, job = entry
+        return not job.cancelled and job.started is None and priority == job.priority
+
+    def _next_jobs(self) -> list[Job]:
+        with self._cond:
+            while True:
+                while self._heap:
+                    entry = heapq.heappop(self._heap)
+                    if not self._live(entry) or self._expire_locked(entry[3]):
+                        continue
+                    lead = entry[3]
+                    lead.started = time.monotonic()
+                    batch = [lead]
+                    if lead.batch_key is not None and self.max_batch > 1:
+                        batch += self._take_batchmates_locked(lead)
+                    return batch
+                self._cond.wait()
+
+    def _take_batchmates_locked(self, lead: Job) -> list[Job]:
+        mates = []
+        for entry in sorted(self._heap):
+            if len(mates) >= self.max_batch - 1:
+                break
+            job = entry[3]
+            if not self._live(entry) or job.priority != lead.priority or job.batch_key != lead.batch_key:
+                continue
+            if self._expire_locked(job):
+                continue
+            if max(job.cost, lead.cost) > self.length_ratio * max(min(job.cost, lead.cost), 1e-3):
+                continue
+            job.started = lead.started
+            mates.append(job)
+        return mates
+
+    # A job may return a Future (its work continues in a later pipeline stage):
+    # the worker moves on and the job's own future completes when that one does.
+
+    def _run_one(self, job: Job) -> None:
+        try:
+            result = job.fn()
+        except BaseException as e:
+            job.future.set_exception(e)
+            return
+        if isinstance(result, Future):
+            result.add_done_callback(lambda f: self._settle([job], f, single=True))
+        else:
+            job.future.set_result(result)
+
+    def _run_batch(self, jobs: list[Job]) -> None:
+        try:
+            results = jobs[0].batch_fn([job.payload for job in jobs])
+        except Exception:
+            # One bad item must not fail its batchmates: run each on its own.
+            for job in jobs:
+                self._run_one(job)
+            return
+        if isinstance(results, Future):
+            results.add_done_callback(lambda f: self._settle(jobs, f))
+        else:
+            self._deliver(jobs, results)
+
+    def _settle(self, jobs: list[Job], future: Future, single: bool = False) -> None:
+        error = future.exception()
+        if error is None:
+            self._deliver(jobs, [future.result()] if single else future.result())
+            return
+        for job in jobs:
+            job.future.set_exception(error)
+
+    def _deliver(self, jobs: list[Job], results) -> None:
+        if len(results) != len(jobs):
+            error = RuntimeError(f"batch_fn returned {len(results)} results for {len(jobs)} jobs")
+            results = [error] * len(jobs)
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                job.future.set_exception(result)
+            else:
+                job.future.set_result(result)
+
+    def _worker(self) -> None:
+        while True:
+            jobs = self._next_jobs()
+            if len(jobs) == 1:
+                self._run_one(jobs[0])
+            else:
+                self._run_batch(jobs)
+            with self._cond:
+                self._completed += len(jobs)
+                if len(jobs) > 1:
+                    self._batches += 1
+                    self._batched_jobs += len(jobs)
+            for job in jobs:
+                # Still in a later stage: stay findable (joinable) until it finishes.
+                job.future.add_done_callback(lambda _, job=job: self._forget(job))
+
+    def _forget(self, job: Job) -> None:
+        with self._cond:
+            self._forget_locked(job)
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = [job for job in self._jobs.values() if job.started is None]
+            return {
+                "workers": len(self._threads),
+                "aging": self.aging,
+                "predicted_backlog_s": round(self._predict_wait_locked(float("inf"), float("inf")), 2),
+                "queued": len(queued),
+                "queued_by_priority": {
+                    str(p): sum(1 for job in queued if job.priority == p)
+                    for p in sorted({job.priority for job in queued})
+                },
+                "running": sum(1 for job in self._jobs.values() if job.started is not None),
+                "completed": self._completed,
+                "cancelled": self._cancelled,
+                "expired": self._expired,
+                "aborted": self._aborted,
+                "wasted_s": round(self._wasted, 3),
+                "fair_share": self.fair_share,
+                "client_backlog_s": {client: round(cost, 2) for client, cost in self._backlog.items()},
+                "max_batch": self.max_batch,
+                "batches": self._batches,
+                "batched_jobs": self._batched_jobs,
+            }
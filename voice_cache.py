@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+voice_cache.py
+Resident voice state (reference path, canonical audio, speaker prompt)
+Unpinned voices are evicted least-recently-used; pinned voices stay loaded
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class VoiceEntry:
+    """Everything the server keeps in memory for one reference voice."""
+
+    def __init__(self, name: str, path: Path, duration: float):
+        self.name = name
+        self.path = path
+        self.duration = duration
+        self.audio = None          # canonical mono float32 samples
+        self.sample_rate: int | None = None
+        self.prompt = None         # model voice clone prompt (speaker embedding)
+        self.pinned = False
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.hits = 0
+        # Serializes the expensive loads for this voice.
+        self.lock = threading.Lock()
+
+    def residency(self) -> dict:
+        return {
+            "cached": True,
+            "pinned": self.pinned,
+            "duration": self.duration,
+            "embedding": self.prompt is not None,
+            "audio": self.audio is not None,
+            "hits": self.hits,
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+        }
+
+
+class VoiceCache:
+    """LRU map of voice name -> VoiceEntry with a cap on unpinned entries."""
+
+    def __init__(self, max_unpinned: int = 32):
+        self.max_unpinned = max(0, max_unpinned)
+        self._entries: OrderedDict[str, VoiceEntry] = OrderedDict()
+        self._pins: set[str] = set()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, name: str) -> VoiceEntry | None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                entry.last_used = time.time()
+                entry.hits += 1
+            return entry
+
+    def put(self, entry: VoiceEntry) -> VoiceEntry:
+        """Insert an entry (keeping an existing one for the same name) and evict."""
+        with self._lock:
+            existing = self._entries.get(entry.name)
+            if existing is not None:
+                self._entries.move_to_end(entry.name)
+                return existing
+            entry.pinned = entry.name in self._pins
+            self._entries[entry.name] = entry
+            self._evict_locked()
+            return entry
+
+    def pin(self, name: str) -> None:
+        """Mark a voice as resident; applies now and to future loads of the name."""
+        with self._lock:
+            self._pins.add(name)
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.pinned = True
+
+    def unpin(self, name: str) -> bool:
+        with self._lock:
+            was_pinned = name in self._pins
+            self._pins.discard(name)
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.pinned = False
+            self._evict_locked()
+            return was_pinned
+
+    def pinned_names(self) -> list[str]:
+        with self._lock:
+            return sorted(self._pins)
+
+    def invalidate(self, names=None) -> list[str]:
+        """Drop entries (all when names is None). Returns dropped pinned names."""
+        with self._lock:
+            targets = list(self._entries) if names is None else [n for n in names if n in self._entries]
+            dropped_pins = []
+            for name in targets:
+                entry = self._entries.pop(name)
+                if entry.pinned:
+                    dropped_pins.append(name)
+            return dropped_pins
+
+    def _evict_locked(self) -> None:
+        unpinned = [name for name, entry in self._entries.items() if not entry.pinned]
+        while len(unpinned) > self.max_unpinned:
+            del self._entries[unpinned.pop(0)]
+            self.evictions += 1
+
+    def residency(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: entry.residency() for name, entry in self._entries.items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pinned": sorted(self._pins),
+                "max_unpinned": self.max_unpinned,
+                "evictions": self.evictions,
+                "embeddings": sum(1 for e in self._entries.values() if e.prompt is not None),
+            }
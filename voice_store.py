@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+voice_store.py
+On-disk voice index: validated duration, canonical mono audio and speaker prompt
+per reference clip, so the server can load a voice without probing, converting
+or embedding it again. Entries are keyed by source filename and invalidated
+when the file's size or mtime changes.
+
+Precompute a whole library once (process pool for decoding, batched embeddings):
+    python3 -m voice_store precompute-voices ./references --jobs 8 --batch-size 16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+VOICE_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac")
+MIN_REFERENCE_SECONDS = 5.0
+STORE_DIRNAME = ".voice_store"
+INDEX_FILE = "index.json"
+
+
+def default_store_dir(ref_dir: Path) -> Path:
+    raw = os.environ.get("TTS_VOICE_STORE", "").strip()
+    return Path(raw).expanduser().resolve() if raw else Path(ref_dir) / STORE_DIRNAME
+
+
+def fingerprint(path: Path) -> dict:
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def embedder_key(backend) -> str:
+    """
+    Engine a prompt was computed with: backend, model, device and precision.
+    Prompts hold tensors of that dtype and device, so they only load into the same engine.
+    """
+    info = backend.info()
+    return f"{info['backend']}:{info['model_id']}@{info['device']}/{info['precision']}"
+
+
+class VoiceStore:
+    """index.json plus <key>.npy (canonical audio) and <key>.pt (prompt) files."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._index: dict[str, dict] = {}
+        self._index_mtime = None
+        self._lock = threading.Lock()
+
+    def _file(self, name: str, suffix: str) -> Path:
+        return self.root / (hashlib.blake2b(name.encode("utf-8"), digest_size=8).hexdigest() + suffix)
+
+    def _load_index_locked(self) -> dict[str, dict]:
+        path = self.root / INDEX_FILE
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._index, self._index_mtime = {}, None
+            return self._index
+        if mtime != self._index_mtime:
+            self._index = json.loads(path.read_text(encoding="utf-8"))
+            self._index_mtime = mtime
+        return self._index
+
+    def records(self) -> dict[str, dict]:
+        with self._lock:
+            return dict(self._load_index_locked())
+
+    def lookup(self, source: Path) -> dict | None:
+        """Index record for a source file, or None when missing or stale."""
+        with self._lock:
+            index = self._load_index_locked()
+            record = index.get(source.name)
+            if record is None:
+                # Converted sibling WAV of an indexed MP3/OGG/FLAC: validate against the original.
+                record = next((r for r in index.values() if r["canonical"] == source.name), None)
+                if record is not None:
+                    source = source.with_name(record["source"])
+        if record is None or not source.exists() or record["fingerprint"] != fingerprint(source):
+            return None
+        return record
+
+    def load_audio(self, record: dict) -> np.ndarray | None:
+        path = self.root / record["audio"] if record.get("audio") else None
+        return np.load(path) if path is not None and path.exists() else None
+
+    def load_prompt(self, record: dict, embedder: str, map_location="cpu"):
+        """Stored prompt, or None when absent or computed by another engine (see embedder_key)."""
+        if not record.get("prompt") or record.get("embedder") != embedder:
+            return None
+        path = self.root / record["prompt"]
+        if not path.exists():
+            return None
+        import torch
+        # Written by precompute-voices (our own files): prompts are model dataclasses, not just tensors.
+        return torch.load(path, map_location=map_location, weights_only=False)
+
+    def save(self, source: Path, canonical: Path, duration: float, audio: np.ndarray | None,
+             sample_rate: int | None, prompt=None, embedder: str | None = None) -> dict:
+        """Write one voice's files, then its index record (atomically)."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        record = {
+            "source": source.name,
+            "canonical": canonical.name,
+            "fingerprint": fingerprint(source),
+            "duration": duration,
+            "sample_rate": sample_rate,
+            "audio": None,
+            "prompt": None,
+            "embedder": embedder,
+            "updated_at": time.time(),
+        }
+        if audio is not None:
+            audio_path = self._file(source.name, ".npy")
+            np.save(audio_path, np.asarray(audio, dtype=np.float32))
+            record["audio"] = audio_path.name
+        if prompt is not None:
+            import torch
+            prompt_path = self._file(source.name, ".pt")
+            torch.save(prompt, prompt_path)
+            record["prompt"] = prompt_path.name
+        with self._lock:
+            index = dict(self._load_index_locked())
+            index[source.name] = record
+            tmp = self.root / (INDEX_FILE + ".tmp")
+            tmp.write_text(json.dumps(index, indent=1, sort_keys=True), encoding="utf-8")
+            os.replace(tmp, self.root / INDEX_FILE)
+            self._index, self._index_mtime = index, (self.root / INDEX_FILE).stat().st_mtime_ns
+        return record
+
+
+# =======================
+# PRECOMPUTE (CLI)
+# =======================
+
+def decode_mono(path: Path) -> tuple[np.ndarray, int]:
+    """Decode any supported clip to mono float32 at its native rate."""
+    try:
+        audio, sr = sf.read(str(path), dtype="float32")
+    except Exception:
+        import librosa  # MP3 on libsndfile builds without it
+        audio, sr = librosa.load(str(path), sr=None, mono=False)
+        audio = audio.T
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return np.ascontiguousarray(audio, dtype=np.float32), int(sr)
+
+
+def probe_voice(path: str) -> dict:
+    """Worker: validate, decode and write the canonical WAV for one clip (no model)."""
+    start = time.perf_counter()
+    source = Path(path)
+    result = {"source": path, "ok": False}
+    try:
+        audio, sr = decode_mono(source)
+        duration = len(audio) / sr
+        if duration < MIN_REFERENCE_SECONDS:
+            raise ValueError(f"Audio too short: {duration:.1f}s. Must be at least {MIN_REFERENCE_SECONDS}s")
+        canonical = source
+        if source.suffix.lower() != ".wav":
+            # Same sibling WAV the server would create on first use.
+            canonical = source.with_suffix(".wav")
+            if not canonical.exists():
+                sf.write(str(canonical), audio, sr, subtype="PCM_16")
+        result.update(ok=True, canonical=str(canonical), duration=duration, audio=audio, sample_rate=sr)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["probe_s"] = time.perf_counter() - start
+    return result
+
+
+def find_voices(ref_dir: Path) -> list[Path]:
+    """Reference clips in ref_dir, preferring an original over its converted sibling WAV."""
+    files = sorted(p for p in Path(ref_dir).iterdir() if p.is_file() and p.suffix.lower() in VOICE_EXTENSIONS)
+    originals = {p.stem for p in files if p.suffix.lower() != ".wav"}
+    return [p for p in files if p.suffix.lower() != ".wav" or p.stem not in originals]
+
+
+def load_embedding_backend(backend_name: str | None, model_id: str | None, device: str):
+    """The engine the server would run (TTS_BACKEND, TTS_CPU_PRECISION, ...), loaded for embedding."""
+    from tts_backends import create_backend
+
+    backend = create_backend(backend_name, model_id)
+    backend.load(device)
+    if not backend.can_embed:
+        raise RuntimeError(f"The {backend.name} backend cannot compute reusable speaker prompts")
+    return backend
+
+
+def embed_batch(backend, probes: list[dict]) -> list:
+    """One clone prompt per probe; batched when the backend accepts a list of references."""
+    refs = [(p["audio"], p["sample_rate"]) for p in probes]
+    if len(refs) > 1:
+        try:
+            prompts = backend.embed_speaker(refs)
+            if isinstance(prompts, list) and len(prompts) == len(refs):
+                # Same shape as a single-voice call: a one-item list.
+                return [[prompt] for prompt in prompts]
+        except Exception:
+            pass
+    return [backend.embed_speaker(ref) for ref in refs]
+
+
+def precompute_voices(args) -> int:
+    ref_dir = Path(args.ref_dir).expanduser().resolve()
+    store = VoiceStore(Path(args.store) if args.store else default_store_dir(ref_dir))
+
+    voices = find_voices(ref_dir)
+    backend = embedder = None
+    if not args.skip_embeddings and voices:
+        # Loaded first: whether a stored prompt is still usable depends on the resolved device and precision.
+        print(f"[INFO] Loading the {args.backend} backend for speaker embeddings")
+        backend = load_embedding_backend(args.backend, args.model, args.device)
+        embedder = embedder_key(backend)
+    todo = []
+    for path in voices:
+        record = store.lookup(path)
+        if record is not None and not args.force and (backend is None or record.get("embedder") == embedder):
+            continue
+        todo.append(path)
+    print(f"[INFO] {len(voices)} voices in {ref_dir}; {len(todo)} to precompute -> {store.root}"
+          + (f" (prompts for {embedder})" if embedder else ""))
+    if not todo:
+        return 0
+
+    started = time.perf_counter()
+    probes, failures = [], []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for future in as_completed([pool.submit(probe_voice, str(path)) for path in todo]):
+            result = future.result()
+            (probes if result["ok"] else failures).append(result)
+    probes.sort(key=lambda r: r["source"])
+
+    for i in range(0, len(probes), args.batch_size):
+        batch = probes[i:i + args.batch_size]
+        prompts, embed_s = [None] * len(batch), 0.0
+        if backend is not None:
+            start = time.perf_counter()
+            try:
+                prompts = embed_batch(backend, batch)
+            except Exception as e:
+                for probe in batch:
+                    probe["ok"], probe["error"] = False, f"embedding failed: {type(e).__name__}: {e}"
+                failures.extend(batch)
+                continue
+            embed_s = (time.perf_counter() - start) / len(batch)
+        for probe, prompt in zip(batch, prompts):
+            store.save(Path(probe["source"]), Path(probe["canonical"]), probe["duration"], probe["audio"],
+                       probe["sample_rate"], prompt, embedder if prompt is not None else None)
+            print(f"✅ {Path(probe['source']).name}: {probe['duration']:.1f}s "
+                  f"(probe {probe['probe_s'] * 1000:.0f} ms, embed {embed_s * 1000:.0f} ms)")
+
+    for failure in sorted(failures, key=lambda r: r["source"]):
+        print(f"❌ {Path(failure['source']).name}: {failure['error']}")
+    done = len(todo) - len(failures)
+    print(f"[INFO] Precomputed {done}/{len(todo)} voices in {time.perf_counter() - started:.1f}s "
+          f"({len(failures)} failed)")
+    return 1 if failures else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Persistent voice index tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pre = sub.add_parser("precompute-voices", help="Validate, convert and embed every voice in a directory")
+    pre.add_argument("ref_dir", nargs="?", default=os.environ.get("TTS_REFERENCES_DIR", "references"))
+    pre.add_argument("--store", default=None, help="Index directory (default: $TTS_VOICE_STORE or <ref_dir>/.voice_store)")
+    pre.add_argument("--model", default=None, help="Model id (default: $QWEN_TTS_MODEL)")
+    pre.add_argument("--backend", default=os.environ.get("TTS_BACKEND", "torch"),
+                     help="Engine to embed with; match the server's (default: $TTS_BACKEND)")
+    pre.add_argument("--device", default="auto", help="auto, cpu, cuda (as the server resolves it)")
+    pre.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Decoder processes")
+    pre.add_argument("--batch-size", type=int, default=8, help="Voices per embedding call")
+    pre.add_argument("--skip-embeddings", action="store_true", help="Only probe and convert (no model)")
+    pre.add_argument("--force", action="store_true", help="Recompute voices that are already up to date")
+    args = parser.parse_args(argv)
+    args.batch_size = max(1, args.batch_size)
+    return precompute_voices(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+ws_protocol.py
+Framing for the /ws TTS session protocol
+
+Client -> server (text frames, JSON; a non-JSON frame is shorthand for {"type": "tts", "text": frame}):
+    {"type": "config", "voice": "alice.wav", "language": "English", "output_format": "opus"}
+    {"type": "tts", "id": "m1", "text": "hello"}            (any TTSRequest field overrides the defaults)
+    {"type": "cancel", "id": "m1"}
+    {"type": "ping"}
+
+Server -> client:
+    text frames:   ready, config_ok, queued, cancelled, error, pong (JSON with "type" and usually "id")
+    binary frames: 2-byte big-endian header length, JSON header {"id", "media_type", ...}, audio bytes
+"""
+
+import json
+
+MESSAGE_TYPES = ("config", "tts", "cancel", "ping")
+
+
+def parse_client_message(raw: str) -> dict:
+    """Decode a client text frame; bare text becomes a tts request."""
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        message = None
+    if not isinstance(message, dict):
+        return {"type": "tts", "text": raw}
+    message.setdefault("type", "tts")
+    return message
+
+
+def encode_audio_frame(header: dict, audio) -> bytes:
+    """Binary result frame: header length, JSON header, audio."""
+    head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    if len(head) > 0xFFFF:
+        raise ValueError("Frame header too large")
+    return b"".join((len(head).to_bytes(2, "big"), head, audio))
+
+
+def decode_audio_frame(frame: bytes) -> tuple[dict, memoryview]:
+    """Split a binary result frame into (header, audio) without copying the audio."""
+    view = memoryview(frame)
+    size = int.from_bytes(view[:2], "big")
+    return json.loads(bytes(view[2:2 + size])), view[2 + size:]